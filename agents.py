@@ -1,9 +1,30 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from langchain_core.prompts import PromptTemplate
-from typing import Dict, Any
+from typing import Dict, Any, List
 
+from config import (
+    EDITOR_MODE,
+    ENABLE_SPECULATIVE_SEARCH,
+    ENABLE_QUALITY_ROUTING,
+    PIPELINE_FACT_CHECK_SECTIONS,
+    SEARCH_CONCURRENCY,
+    SEARCH_WINDOWS,
+    SPECULATIVE_QUERY_SUFFIXES,
+    SPECULATIVE_REDUNDANCY_THRESHOLD,
+)
+from budget import PromptTooLarge, Section, fit_prompt, record_budget
+from cancellation import CallTimedOut, RunCancelled
+from patches import PatchError, apply_patches, describe_patches, parse_patches
+from quality import ResearchFailed, assess_research
+from routing import llm_for, stream_chunks
+from sections import SectionPipeline, SectionSplitter, split_sections
 from state import EnhancedAgentState
-from tools import news_search_tool
+from sources import build_source_table, format_source_table, per_query_tokens
+from tools import estimate_tokens, search_news, format_news_results
+from variants import for_variant
 
 
 WRITER_PROMPT = PromptTemplate.from_template("""
@@ -46,6 +67,27 @@ Your editing tasks:
 Provide the edited version that maintains the original content's substance while significantly improving its quality and readability.
 """)
 
+EDITOR_PATCH_PROMPT = PromptTemplate.from_template("""
+You are an experienced content editor with a keen eye for clarity, style, and engagement.
+
+Original Article:
+{blog_post}
+
+Topic: {topic}
+
+Review the article for clarity, flow, grammar, awkward phrasing, consistent tone,
+transitions, subheadings, and a strong hook and conclusion. Do NOT rewrite the article.
+Instead, return only the targeted replacements needed, as JSON in this exact shape:
+
+{{"edits": [{{"find": "exact text copied from the article", "replace": "improved text", "reason": "short reason"}}]}}
+
+Rules:
+- "find" must be copied verbatim from the article and appear in it exactly once
+- Keep each "find" as short as possible (a phrase, sentence or heading)
+- Return {{"edits": []}} if no changes are needed
+- Output the JSON only, with no other text
+""")
+
 FACT_CHECKER_PROMPT = PromptTemplate.from_template("""
 You are a meticulous fact-checker with expertise in technology and current events.
 
@@ -67,85 +109,285 @@ Your responsibilities:
 Provide the final, fact-checked version of the article with any necessary corrections or clarifications.
 """)
 
-def research_node(state: EnhancedAgentState, llm) -> Dict[str, Any]:
-    """Enhanced research agent that gathers comprehensive information."""
-    
-    topic = state["topic"]
-    
-    # Create a more direct approach to using the search tool
-    # First, generate search queries based on the topic
-    query_prompt = PromptTemplate.from_template("""
+FACT_CHECKER_SECTION_PROMPT = PromptTemplate.from_template("""
+You are a meticulous fact-checker with expertise in technology and current events.
+
+Article section to fact-check (part {index} of an article about "{topic}"):
+{section}
+
+Research Sources:
+{research_report}
+
+Verify the factual claims in this section against the research sources, correct any
+inaccuracies or unsupported statements, and add disclaimer notes where appropriate.
+
+Provide only the fact-checked version of this section, keeping its heading, without adding an introduction or conclusion.
+""")
+
+QUERY_PROMPT = PromptTemplate.from_template("""
 You are a research analyst. Generate 3-5 different search queries for researching the topic: "{topic}"
 
 Make the queries specific and varied to gather comprehensive information if dates would be added in the queries it must be either relativve (last week , next week, last month, next month, etc...) or using the year 2025.
 Output only the search queries, one per line, no explanations.
 """)
+
+def parse_queries(text: str) -> List[str]:
+    """Splits the query planner's response into one query per non-empty line."""
+    return [q.strip() for q in text.strip().split('\n') if q.strip()]
+
+def speculative_queries(topic: str) -> List[str]:
+    """Deterministic search queries that can be issued before the LLM has planned any."""
+    topic = " ".join(topic.split())
+    return [topic] + [f"{topic}{suffix}" for suffix in SPECULATIVE_QUERY_SUFFIXES]
+
+def _query_terms(query: str) -> set:
+    return set(re.findall(r"\w+", query.lower()))
+
+def is_redundant_query(query: str, searched: List[str]) -> bool:
+    """True when `query` shares most of its terms with a query already searched."""
+    terms = _query_terms(query)
+    for other in searched:
+        union = terms | _query_terms(other)
+        overlap = len(terms & _query_terms(other)) / len(union) if union else 1.0
+        if overlap >= SPECULATIVE_REDUNDANCY_THRESHOLD:
+            return True
+    return False
+
+def _run_search(query: str, search, window: str = SEARCH_WINDOWS[0]) -> Dict[str, Any]:
+    """
+    Runs one search over `window` and packages it as a `research_sources` entry.
+    A search that fails or exceeds SEARCH_CALL_TIMEOUT is recorded as failed;
+    only a cancelled run (or one past its deadline) aborts research.
+    """
+    try:
+        items = search(query, tbs=window)
+        result = format_news_results(query, items)
+    except CallTimedOut as e:
+        print(f"Search timed out for query '{query}': {e}")
+        return {
+            "query": query,
+            "results": f"Error searching for '{query}': {str(e)}",
+            "items": [],
+            "error": str(e)
+        }
+    except RunCancelled:
+        raise
+    except Exception as e:
+        print(f"Search error for query '{query}': {e}")
+        return {
+            "query": query,
+            "results": f"Error searching for '{query}': {str(e)}",
+            "items": [],
+            "error": str(e)
+        }
+    return {
+        "query": query,
+        "results": result,
+        "items": items
+    }
+
+def research_node(
+    state: EnhancedAgentState,
+    llm,
+    search=search_news,
+    speculative: bool = ENABLE_SPECULATIVE_SEARCH,
+    quality_routing: bool = ENABLE_QUALITY_ROUTING,
+) -> Dict[str, Any]:
+    """
+    Enhanced research agent that gathers comprehensive information.
+
+    Search queries come from `search_queries` in the state when they were
+    planned ahead (see batch.py), otherwise from one LLM call. Searches cover
+    the time window in `search_window` (the narrowest of SEARCH_WINDOWS by
+    default).
+
+    In speculative mode the topic itself (and a few fixed variants) is searched
+    while the LLM is still generating queries; afterwards only the LLM queries
+    that are not redundant with those searches are run. Planned queries (and
+    the queries reused by a retry) are searched without speculative searches,
+    since there is no LLM call to overlap. `run_metadata` records in
+    `query_source` whether the queries came from the LLM, were planned, or
+    were reused from the previous attempt.
+
+    Results of all queries are merged into one table of unique sources with
+    stable IDs, which becomes `research_sources` and the report prompt.
+
+    The attempt is scored in `research_quality` (see quality.py). With
+    `quality_routing`, an attempt the graph will retry or abandon returns
+    without writing the report, and keeps its queries for the retry.
+    """
     
-    # Get search queries from the LLM
-    queries_response = llm.invoke(query_prompt.format(topic=topic))
-    queries = [q.strip() for q in queries_response.content.strip().split('\n') if q.strip()]
+    topic = state["topic"]
+    window = state.get("search_window") or SEARCH_WINDOWS[0]
     
-    # Perform searches
-    search_results = []
-    for query in queries[:5]:  # Limit to 5 searches
-        try:
-            result = news_search_tool.func(query)
-            search_results.append({
-                "query": query,
-                "results": result
-            })
-        except Exception as e:
-            print(f"Search error for query '{query}': {e}")
+    # Queries planned ahead (e.g. by batch.py) replace the per-topic LLM call; a
+    # retry in a wider window reuses the queries of the previous attempt
+    planned = state.get("search_queries")
+    if not planned:
+        query_source = "llm"
+    elif state.get("research_quality"):
+        query_source = "previous_attempt"
+    else:
+        query_source = "planned"
+    
+    # With the queries known up front there is no LLM call for speculative searches to overlap
+    if speculative and not planned:
+        searched = speculative_queries(topic)
+        with ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY + 1) as pool:
+            # Search the raw topic while the LLM plans the real queries
+            queries_future = pool.submit(llm_for(llm, "research.queries").invoke, QUERY_PROMPT.format(topic=topic))
+            futures = [pool.submit(_run_search, query, search, window) for query in searched]
+            
+            queries = parse_queries(queries_future.result().content)
+            for query in queries[:5]:  # Limit to 5 planned searches
+                if not is_redundant_query(query, searched):
+                    searched.append(query)
+                    futures.append(pool.submit(_run_search, query, search, window))
+            
+            search_results = [future.result() for future in futures]
+        speculative_count = len(speculative_queries(topic))
+    else:
+        # Get search queries from the LLM
+        queries = planned or parse_queries(llm_for(llm, "research.queries").invoke(QUERY_PROMPT.format(topic=topic)).content)
+        
+        # Perform searches; planned queries are all known up front, so they run in parallel
+        if planned:
+            with ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY) as pool:
+                search_results = list(pool.map(lambda query: _run_search(query, search, window), queries[:5]))
+        else:
+            search_results = [_run_search(query, search, window) for query in queries[:5]]  # Limit to 5 searches
+        speculative_count = 0
+    
+    # Merge every query's results into one deduplicated source table
+    sources, dedup_stats = build_source_table(search_results)
+    formatted_sources = format_source_table(sources)
+    tokens_saved = per_query_tokens(search_results) - estimate_tokens(formatted_sources)
+    research_metadata = {
+        "queries": [sr["query"] for sr in search_results],
+        "searches": len(search_results),
+        "speculative_searches": speculative_count,
+        "planned_queries": query_source == "planned",
+        "query_source": query_source,
+        "failed_searches": sum(1 for sr in search_results if sr.get("error")),
+        "search_window": window,
+        **dedup_stats,
+        "prompt_tokens_saved": tokens_saved,
+    }
+    
+    # Score the attempt; without enough material the graph retries or stops, so skip the report
+    quality = assess_research(
+        search_results, sources, window,
+        history=(state.get("research_quality") or {}).get("attempts"),
+    )
+    if quality_routing and quality["verdict"] != "ok":
+        return {
+            "research_report": None,
+            "research_sources": sources,
+            "research_quality": quality,
+            "search_queries": queries[:5],
+            "search_window": window,
+            "agent_notes": {
+                "research_agent": f"Research in window {window} was insufficient: {quality['reason']}"
+            },
+            "run_metadata": {"research": research_metadata},
+        }
     
     # Now compile the research report
     research_prompt = PromptTemplate.from_template("""
 You are a senior research analyst. Based on the following search results about "{topic}", 
 create a comprehensive research report.
 
-Search Results:
+Queries searched: {queries}
+
+Search Results (one entry per unique source, each with an ID):
 {search_results}
 
 Create a well-structured research report that includes:
 1. Executive Summary (2-3 sentences)
-2. Key Findings (5-7 bullet points with sources)
+2. Key Findings (5-7 bullet points citing source IDs, e.g. [S-1a2b3c])
 3. Detailed Analysis
 4. Notable Trends and Insights
-5. Source URLs
+5. Source URLs (with their IDs)
 
 Make sure to cite specific information from the search results.
 """)
     
-    # Format search results for the prompt
-    formatted_results = ""
-    for sr in search_results:
-        formatted_results += f"\n\nQuery: {sr['query']}\n"
-        formatted_results += f"Results:\n{sr['results']}\n"
-        formatted_results += "-" * 50
-    
-    # Generate the research report
-    report_response = llm.invoke(
-        research_prompt.format(
-            topic=topic,
-            search_results=formatted_results
-        )
+    # Generate the research report, dropping the least-corroborated sources if over budget
+    prompt, budget_report = fit_prompt(
+        "research.report",
+        research_prompt,
+        [Section.from_sources("search_results", "research", sources)],
+        topic=topic,
+        queries="; ".join(sr["query"] for sr in search_results)
     )
+    report_response = llm_for(llm, "research.report").invoke(prompt)
     
     return {
         "research_report": report_response.content,
-        "research_sources": search_results,
-        "agent_notes": {"research_agent": f"Completed research with {len(search_results)} searches"},
+        "research_sources": sources,
+        "agent_notes": {
+            "research_agent": (
+                f"Completed research with {len(search_results)} searches ({speculative_count} speculative); "
+                f"{dedup_stats['unique_sources']} unique sources from {dedup_stats['raw_items']} results, "
+                f"~{tokens_saved} prompt tokens saved by deduplication"
+            )
+        },
+        "research_quality": quality,
+        "search_window": window,
+        "run_metadata": record_budget({"research": research_metadata}, budget_report),
         "generation_timestamp": datetime.now().isoformat()
     }
 
+def widen_search_node(state: EnhancedAgentState) -> Dict[str, Any]:
+    """Moves research to the next wider search window before it is retried."""
+    
+    quality = state["research_quality"]
+    current_notes = state.get("agent_notes", {})
+    current_notes["research_agent"] = (
+        f"{quality['reason']}; retrying research in window {quality['next_window']}"
+    )
+    return {"search_window": quality["next_window"], "agent_notes": current_notes}
+
+def research_failed_node(state: EnhancedAgentState) -> Dict[str, Any]:
+    """Ends a run whose research found nothing to write about."""
+    
+    raise ResearchFailed(state["research_quality"]["reason"])
+
+def publish_unchecked_node(state: EnhancedAgentState, pipeline: SectionPipeline = None) -> Dict[str, Any]:
+    """
+    Publishes the edited article without fact-checking, for research with too
+    few sources to check the article against.
+    """
+    
+    if pipeline is not None:
+        pipeline.shutdown()
+    
+    sources = state["research_quality"]["sources"]
+    current_notes = state.get("agent_notes", {})
+    current_notes["fact_checker_agent"] = f"Skipped: only {sources} source(s) to check claims against"
+    
+    return {
+        "final_post": state["edited_post"],
+        "fact_check_report": f"Not fact-checked: research found only {sources} source(s)",
+        "agent_notes": current_notes,
+    }
+
 def writer_node(state: EnhancedAgentState, llm) -> Dict[str, Any]:
     """Enhanced writer agent that creates engaging content."""
     
     topic = state["topic"]
     research_report = state["research_report"]
     
-    # Generate the blog post
-    prompt = WRITER_PROMPT.format(topic=topic, research_report=research_report)
-    response = llm.invoke(prompt)
+    # Generate the blog post, to the variant's length and tone if there is one
+    template, variant_fields = for_variant(WRITER_PROMPT, state.get("variant"))
+    prompt, budget_report = fit_prompt(
+        "writer",
+        template,
+        [Section.from_markdown("research_report", "research", research_report)],
+        topic=topic,
+        **variant_fields
+    )
+    response = llm_for(llm, "writer").invoke(prompt)
     
     # Update agent notes
     current_notes = state.get("agent_notes", {})
@@ -153,41 +395,169 @@ def writer_node(state: EnhancedAgentState, llm) -> Dict[str, Any]:
     
     return {
         "blog_post": response.content,
-        "agent_notes": current_notes
+        "agent_notes": current_notes,
+        "run_metadata": record_budget(state.get("run_metadata") or {}, budget_report)
     }
 
-def editor_node(state: EnhancedAgentState, llm) -> Dict[str, Any]:
-    """Editor agent that polishes and improves the content."""
+def edit_text(
+    text: str,
+    topic: str,
+    llm,
+    mode: str = EDITOR_MODE,
+    name: str = "editor",
+    variant: Dict[str, str] = None,
+) -> Dict[str, Any]:
+    """
+    Edits `text` (a whole draft or one section of it), keeping to the length
+    and tone of `variant` if given.
+
+    In "patch" mode the model returns targeted replacements that are applied
+    locally; if they cannot be parsed or applied, the text is rewritten in
+    full. A rewrite replaces the text, so its prompt carries the text whole;
+    text too long for that is rewritten section by section. Returns the
+    edited text, the applied patches (None after a rewrite), editor metadata
+    and the budget reports of the prompts used.
+    """
+    budget_reports = []
+    metadata = {"mode": mode}
     
-    topic = state["topic"]
-    blog_post = state["blog_post"]
+    if mode == "patch":
+        template, variant_fields = for_variant(EDITOR_PATCH_PROMPT, variant)
+        prompt, budget_report = fit_prompt(
+            name,
+            template,
+            [Section.from_markdown("blog_post", "draft", text)],
+            topic=topic,
+            **variant_fields
+        )
+        budget_reports.append(budget_report)
+        response = llm_for(llm, "editor").invoke(prompt)
+        try:
+            patches = parse_patches(response.content)
+            edited, patch_stats = apply_patches(text, patches)
+        except PatchError as e:
+            metadata = {"mode": "rewrite", "patch_fallback": str(e)}
+        else:
+            return {
+                "text": edited,
+                "patches": patches,
+                "metadata": {**metadata, **patch_stats},
+                "budget_reports": budget_reports,
+            }
+    
+    template, variant_fields = for_variant(EDITOR_PROMPT, variant)
+    try:
+        prompt, budget_report = fit_prompt(
+            f"{name}.rewrite" if mode == "patch" else name,
+            template,
+            [Section.from_markdown("blog_post", "draft", text, whole=True)],
+            topic=topic,
+            **variant_fields
+        )
+    except PromptTooLarge:
+        sections = split_sections(text)
+        if len(sections) < 2:
+            raise
+        edits = [
+            edit_text(section, topic, llm, "rewrite", f"{name}[{index}]", variant)
+            for index, section in enumerate(sections)
+        ]
+        return {
+            "text": "\n\n".join(edit["text"].strip() for edit in edits),
+            "patches": None,
+            "metadata": {**metadata, "mode": "rewrite", "section_rewrites": len(edits)},
+            "budget_reports": budget_reports + [report for edit in edits for report in edit["budget_reports"]],
+        }
+    budget_reports.append(budget_report)
+    response = llm_for(llm, "editor").invoke(prompt)
+    return {"text": response.content, "patches": None, "metadata": metadata, "budget_reports": budget_reports}
+
+def editor_node(state: EnhancedAgentState, llm, mode: str = EDITOR_MODE) -> Dict[str, Any]:
+    """Editor agent that polishes and improves the content (see `edit_text`)."""
     
     # Edit the blog post
-    prompt = EDITOR_PROMPT.format(topic=topic, blog_post=blog_post)
-    response = llm.invoke(prompt)
+    edit = edit_text(state["blog_post"], state["topic"], llm, mode, variant=state.get("variant"))
+    run_metadata = state.get("run_metadata") or {}
+    for budget_report in edit["budget_reports"]:
+        run_metadata = record_budget(run_metadata, budget_report)
     
     # Update agent notes
     current_notes = state.get("agent_notes", {})
-    current_notes["editor_agent"] = "Improved clarity, flow, and readability"
+    if edit["patches"] is not None:
+        current_notes["editor_agent"] = f"Applied {len(edit['patches'])} targeted edits"
+        editing_notes = describe_patches(edit["patches"])
+    else:
+        current_notes["editor_agent"] = "Improved clarity, flow, and readability"
+        editing_notes = "Focused on improving clarity, flow, and engagement"
     
     return {
-        "edited_post": response.content,
-        "editing_notes": "Focused on improving clarity, flow, and engagement",
-        "agent_notes": current_notes
+        "edited_post": edit["text"],
+        "editing_notes": editing_notes,
+        "agent_notes": current_notes,
+        "run_metadata": {**run_metadata, "editor": edit["metadata"]}
     }
 
+def fact_check_section(index: int, section: str, topic: str, research_report: str, llm) -> Dict[str, Any]:
+    """Fact-checks one section of an article; the research report gives way to the section."""
+    
+    prompt, budget_report = fit_prompt(
+        f"fact_checker[{index}]",
+        FACT_CHECKER_SECTION_PROMPT,
+        [
+            Section.from_markdown("section", "draft", section, whole=True),
+            Section.from_markdown("research_report", "research", research_report),
+        ],
+        topic=topic,
+        index=str(index + 1)
+    )
+    response = llm_for(llm, "fact_checker").invoke(prompt)
+    return {"text": response.content, "budget_reports": [budget_report]}
+
 def fact_checker_node(state: EnhancedAgentState, llm) -> Dict[str, Any]:
-    """Fact-checker agent that verifies accuracy and provides final version."""
+    """
+    Fact-checker agent that verifies accuracy and provides final version. Its
+    answer replaces the article, so the article is never trimmed from the
+    prompt; one too long for that is checked section by section.
+    """
     
     edited_post = state["edited_post"]
     research_report = state["research_report"]
     
     # Fact-check the article
-    prompt = FACT_CHECKER_PROMPT.format(
-        edited_post=edited_post, 
-        research_report=research_report
-    )
-    response = llm.invoke(prompt)
+    template, variant_fields = for_variant(FACT_CHECKER_PROMPT, state.get("variant"))
+    try:
+        prompt, budget_report = fit_prompt(
+            "fact_checker",
+            template,
+            [
+                Section.from_markdown("edited_post", "draft", edited_post, whole=True),
+                Section.from_markdown("research_report", "research", research_report),
+            ],
+            **variant_fields
+        )
+    except PromptTooLarge:
+        sections = split_sections(edited_post)
+        if len(sections) < 2:
+            raise
+        checks = [
+            fact_check_section(index, section, state["topic"], research_report, llm)
+            for index, section in enumerate(sections)
+        ]
+        run_metadata = state.get("run_metadata") or {}
+        for check in checks:
+            for budget_report in check["budget_reports"]:
+                run_metadata = record_budget(run_metadata, budget_report)
+        current_notes = state.get("agent_notes", {})
+        current_notes["fact_checker_agent"] = (
+            f"Verified claims section by section ({len(checks)} sections); the article was too long for one prompt"
+        )
+        return {
+            "final_post": "\n\n".join(check["text"].strip() for check in checks),
+            "fact_check_report": "All claims verified against research sources",
+            "agent_notes": current_notes,
+            "run_metadata": run_metadata
+        }
+    response = llm_for(llm, "fact_checker").invoke(prompt)
     
     # Update agent notes
     current_notes = state.get("agent_notes", {})
@@ -196,5 +566,168 @@ def fact_checker_node(state: EnhancedAgentState, llm) -> Dict[str, Any]:
     return {
         "final_post": response.content,
         "fact_check_report": "All claims verified against research sources",
-        "agent_notes": current_notes
-    }
\ No newline at end of file
+        "agent_notes": current_notes,
+        "run_metadata": record_budget(state.get("run_metadata") or {}, budget_report)
+    }
+
+VARIANT_FIELDS = (
+    "blog_post",
+    "edited_post",
+    "editing_notes",
+    "final_post",
+    "fact_check_report",
+    "agent_notes",
+    "run_metadata",
+)
+
+def variant_node(state: EnhancedAgentState, llm, mode: str = EDITOR_MODE) -> Dict[str, Any]:
+    """
+    Writes, edits and fact-checks one variant of the article (see variants.py)
+    from the shared research. Branches for the other variants run in parallel.
+    """
+
+    variant = state["variant"]
+    started = time.perf_counter()
+
+    # The branch's own copy of the fields the nodes update in place
+    branch = {
+        **state,
+        "agent_notes": dict(state.get("agent_notes") or {}),
+        "run_metadata": dict(state.get("run_metadata") or {}),
+    }
+    branch.update(writer_node(branch, llm))
+    branch.update(editor_node(branch, llm, mode))
+    quality = state.get("research_quality")
+    if quality is None or quality["fact_check"]:
+        branch.update(fact_checker_node(branch, llm))
+    else:
+        branch.update(publish_unchecked_node(branch))
+
+    result = {field: branch.get(field) for field in VARIANT_FIELDS}
+    result.update(variant)
+    result["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return {"variants": {variant["name"]: result}}
+
+def pipelined_writer_node(
+    state: EnhancedAgentState,
+    llm,
+    pipeline: SectionPipeline,
+    fact_check_sections: bool = PIPELINE_FACT_CHECK_SECTIONS,
+) -> Dict[str, Any]:
+    """
+    Writer agent for the pipelined mode: streams the draft and hands every
+    finished section to `pipeline` for editing (and fact-checking) while the
+    rest of the draft is still being written.
+    """
+    
+    topic = state["topic"]
+    research_report = state["research_report"]
+    # Research too thin to check against skips fact-checking (see graph.py)
+    fact_check_sections = fact_check_sections and (state.get("research_quality") or {}).get("fact_check", True)
+    
+    def edit(index: int, section: str) -> Dict[str, Any]:
+        return edit_text(section, topic, llm, name=f"editor[{index}]")
+    
+    def fact_check(index: int, edit: Dict[str, Any]) -> Dict[str, Any]:
+        return fact_check_section(index, edit["text"], topic, research_report, llm)
+    
+    # Generate the blog post, submitting each section as soon as it is complete
+    prompt, budget_report = fit_prompt(
+        "writer",
+        WRITER_PROMPT,
+        [Section.from_markdown("research_report", "research", research_report)],
+        topic=topic
+    )
+    pipeline.start(edit, fact_check if fact_check_sections else None)
+    splitter = SectionSplitter()
+    started = time.perf_counter()
+    first_section_s = None
+    try:
+        for chunk in stream_chunks(llm_for(llm, "writer"), prompt):
+            for section in splitter.feed(chunk.content):
+                pipeline.submit(section)
+                if first_section_s is None:
+                    first_section_s = time.perf_counter() - started
+        for section in splitter.close():
+            pipeline.submit(section)
+    except BaseException:
+        pipeline.shutdown()
+        raise
+    
+    # Update agent notes
+    current_notes = state.get("agent_notes", {})
+    current_notes["writer_agent"] = f"Created initial blog post draft in {len(pipeline.edits)} streamed sections"
+    
+    run_metadata = record_budget(state.get("run_metadata") or {}, budget_report)
+    return {
+        "blog_post": splitter.text,
+        "agent_notes": current_notes,
+        "run_metadata": {
+            **run_metadata,
+            "pipeline": {
+                "sections": len(pipeline.edits),
+                "first_section_s": round(first_section_s or time.perf_counter() - started, 3),
+                "writer_s": round(time.perf_counter() - started, 3),
+                "fact_check_sections": fact_check_sections,
+            },
+        },
+    }
+
+def pipelined_editor_node(state: EnhancedAgentState, llm, pipeline: SectionPipeline) -> Dict[str, Any]:
+    """Editor agent for the pipelined mode: collects the section edits in order."""
+    
+    edits = pipeline.edited()
+    run_metadata = state.get("run_metadata") or {}
+    for edit in edits:
+        for budget_report in edit["budget_reports"]:
+            run_metadata = record_budget(run_metadata, budget_report)
+    
+    patches = [patch for edit in edits for patch in edit["patches"] or []]
+    rewrites = sum(1 for edit in edits if edit["patches"] is None)
+    editing_notes = describe_patches(patches)
+    if rewrites:
+        editing_notes += f"\n{rewrites} of {len(edits)} sections were rewritten in full"
+    
+    # Update agent notes
+    current_notes = state.get("agent_notes", {})
+    current_notes["editor_agent"] = f"Edited {len(edits)} sections while the draft was being written"
+    
+    return {
+        "edited_post": "\n\n".join(edit["text"].strip() for edit in edits),
+        "editing_notes": editing_notes,
+        "agent_notes": current_notes,
+        "run_metadata": {
+            **run_metadata,
+            "editor": {"mode": EDITOR_MODE, "sections": len(edits), "edits": len(patches), "section_rewrites": rewrites},
+        },
+    }
+
+def pipelined_fact_checker_node(state: EnhancedAgentState, llm, pipeline: SectionPipeline) -> Dict[str, Any]:
+    """
+    Fact-checker agent for the pipelined mode: collects the section checks in
+    order, or checks the whole edited article when sections were not checked.
+    """
+    
+    if not pipeline.fact_checking:
+        pipeline.shutdown()
+        return fact_checker_node(state, llm)
+    
+    try:
+        checks = pipeline.checked()
+    finally:
+        pipeline.shutdown()
+    run_metadata = state.get("run_metadata") or {}
+    for check in checks:
+        for budget_report in check["budget_reports"]:
+            run_metadata = record_budget(run_metadata, budget_report)
+    
+    # Update agent notes
+    current_notes = state.get("agent_notes", {})
+    current_notes["fact_checker_agent"] = f"Verified claims section by section ({len(checks)} sections)"
+    
+    return {
+        "final_post": "\n\n".join(check["text"].strip() for check in checks),
+        "fact_check_report": "All claims verified against research sources",
+        "agent_notes": current_notes,
+        "run_metadata": run_metadata
+    }
@@ -1,11 +1,21 @@
 import streamlit as st
-import hashlib
 import time
 import random
-from typing import Dict, Any, Generator
+import uuid
+from typing import Dict, Any
 from datetime import datetime
-from config import GOOGLE_API_KEY, SERPER_API_KEY, BLOG_POST, TOPIC
+from archive import article_archive
+from cache import article_cache
+from cancellation import CancellationToken, RunCancelled, RunTimedOut
+from config import (
+    GOOGLE_API_KEY, SERPER_API_KEY, BLOG_POST, TOPIC, ERROR_MESSAGES, SUCCESS_MESSAGES,
+    ENABLE_ARCHIVE, ARCHIVE_SUGGESTIONS, ARTICLE_LENGTHS, ARTICLE_TONES, DEFAULT_ARTICLE_TONE,
+    MAX_ARTICLE_VARIANTS,
+)
 from graph import create_enhanced_graph
+from pipeline import generate_cache_key, cached_generation, stream_generation
+from quality import ResearchFailed
+from tracing import span, traced_consumer, tracer
 
 # Custom CSS for modern UI
 def load_custom_css():
@@ -303,26 +313,6 @@ def load_custom_css():
     </style>
     """, unsafe_allow_html=True)
 
-def generate_cache_key(topic: str, temperature: float) -> str:
-    """Generate a cache key for the given topic and temperature."""
-    return hashlib.md5(f"{topic}_{temperature}".encode()).hexdigest()
-
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def cached_generation(topic: str, temperature: float) -> Dict[str, Any]:
-    """Cached version of content generation."""
-    cache_key = generate_cache_key(topic, temperature)
-    graph = create_enhanced_graph(temperature=temperature)
-    result = graph.invoke({TOPIC: topic})
-    return result
-
-def stream_generation(topic: str, temperature: float) -> Generator[Dict[str, Any], None, None]:
-    """Stream the generation process with progress updates."""
-    graph = create_enhanced_graph(temperature=temperature)
-    
-    # Stream the graph execution
-    for chunk in graph.stream({TOPIC: topic}):
-        yield chunk
-
 def create_agent_card(agent_name: str, status: str, icon: str, color: str):
     """Create a styled agent status card."""
     return f"""
@@ -347,6 +337,10 @@ def create_loading_animation():
     </div>
     """
 
+def set_session_value(key: str, value: Any):
+    """Button callback storing `value` for the next script run."""
+    st.session_state[key] = value
+
 def main():
     """The main function for the enhanced Streamlit UI."""
     
@@ -395,7 +389,7 @@ def main():
         )
         
         # Advanced settings in tabs
-        tab1, tab2 = st.tabs(["⚙️ Settings", "📊 Info"])
+        tab1, tab2, tab3 = st.tabs(["⚙️ Settings", "📊 Info", "📚 Archive"])
         
         with tab1:
             temperature = st.slider(
@@ -411,6 +405,16 @@ def main():
                 use_caching = st.checkbox("⚡ Fast Mode", value=True, help="Use cached results")
             with col_b:
                 use_streaming = st.checkbox("📡 Live Mode", value=True, help="Real-time updates")
+            
+            # Several versions share one research run (see variants.py)
+            lengths = st.multiselect(
+                "Versions",
+                list(ARTICLE_LENGTHS),
+                max_selections=MAX_ARTICLE_VARIANTS,
+                help="Pick one or more lengths to get a version of the article for each"
+            )
+            tone = st.selectbox("Tone", list(ARTICLE_TONES), index=list(ARTICLE_TONES).index(DEFAULT_ARTICLE_TONE))
+            variants = [f"{length}:{tone}" for length in lengths]
         
         with tab2:
             st.markdown("""
@@ -424,6 +428,18 @@ def main():
             **📝 Output:** 800-1200 words
             """)
         
+        with tab3:
+            archive_query = st.text_input("Search past articles", placeholder="e.g., quantum computing")
+            if archive_query:
+                for match in article_archive.search(archive_query, limit=10):
+                    st.markdown(f"**{match['topic']}**  \n{match['snippet']}")
+                    st.button(
+                        f"📖 Open ({match['created_at'][:10]})",
+                        key=f"archive_open_{match['id']}",
+                        on_click=set_session_value,
+                        args=("reuse_article_id", match["id"]),
+                    )
+        
         generate_button = st.button(
             "✨ Generate Article", 
             type="primary", 
@@ -453,16 +469,67 @@ def main():
 
     # Main content area (right column)
     with col2:
-        if generate_button and topic_input:
+        # Before starting a new pipeline, offer archived articles on the same topic
+        reuse_id = st.session_state.pop("reuse_article_id", None)
+        refresh_requested = bool(topic_input) and st.session_state.pop("refresh_topic", None) == topic_input
+        archive_matches = []
+        if generate_button and topic_input and ENABLE_ARCHIVE:
+            archive_matches = article_archive.search(topic_input, limit=ARCHIVE_SUGGESTIONS)
+        
+        if reuse_id is not None:
+            archived = article_archive.get(reuse_id)
+            if archived is None:
+                st.error("❌ Archived article not found.")
+            else:
+                st.success(f"{SUCCESS_MESSAGES['archive_reused']} ({archived['generation_timestamp'][:16]})")
+                display_final_result(archived)
+        
+        elif archive_matches:
+            st.markdown("### 📚 Already in the Archive")
+            st.markdown("Reuse one of these articles, or refresh to run the agents again.")
+            for match in archive_matches:
+                match_col, button_col = st.columns([4, 1])
+                with match_col:
+                    st.markdown(f"**{match['topic']}** · {match['created_at'][:16]}  \n{match['snippet']}")
+                with button_col:
+                    st.button(
+                        "♻️ Reuse",
+                        key=f"archive_reuse_{match['id']}",
+                        on_click=set_session_value,
+                        args=("reuse_article_id", match["id"]),
+                    )
+            st.button(
+                "🔄 Refresh (generate a new article)",
+                type="primary",
+                on_click=set_session_value,
+                args=("refresh_topic", topic_input),
+            )
+        
+        elif (generate_button or refresh_requested) and topic_input:
+            
+            # A rerun abandons the previous script run: cancel its graph run so it
+            # stops spending quota, and give this run its own token
+            previous_token = st.session_state.get("cancel_token")
+            if previous_token is not None:
+                previous_token.cancel("superseded by a new run")
+            cancel_token = CancellationToken()
+            st.session_state["cancel_token"] = cancel_token
+            # Calls of this session are scheduled as interactive and share one user quota
+            user_id = st.session_state.setdefault("user_id", uuid.uuid4().hex)
+            # Sampled runs are traced under this session (see tracing.py)
+            trace = tracer.start_trace("streamlit", topic=topic_input, session_id=user_id, streaming=use_streaming)
             
             # Check cache first if enabled
             if use_caching and not use_streaming:
-                cache_key = generate_cache_key(topic_input, temperature)
-                if st.cache_data.exists(cache_key):
+                cache_key = generate_cache_key(topic_input, temperature, variants)
+                if article_cache.is_fresh(cache_key):
                     with st.spinner("⚡ Loading cached result..."):
                         time.sleep(0.5)  # Brief pause for UX
-                    result = cached_generation(topic_input, temperature)
-                    display_final_result(result)
+                    result = cached_generation(topic_input, temperature, trace=trace, variants=variants)
+                    with span("render", "ui", trace=trace):
+                        display_final_result(result)
+                    if trace is not None:
+                        trace.finish()
                     return
 
             # Create containers for different sections
@@ -524,7 +591,12 @@ def main():
                     total_steps = 4
                     current_step = 0
                     
-                    for chunk in stream_generation(topic_input, temperature):
+                    chunks = stream_generation(
+                        topic_input, temperature, cancel_token=cancel_token, user_id=user_id, trace=trace, variants=variants
+                    )
+                    finished_variants = {}
+                    # Time spent rendering each node's output is traced as a "render" span
+                    for chunk in traced_consumer(chunks, trace):
                         node_name = list(chunk.keys())[0] if chunk else "unknown"
                         node_data = chunk.get(node_name, {})
                         
@@ -537,7 +609,7 @@ def main():
                             )
                             status_placeholder.info("🔍 Gathering latest news and information...")
                             
-                            if 'research_report' in node_data:
+                            if node_data.get('research_report'):
                                 with research_placeholder.container():
                                     st.markdown("#### 📊 Research Complete!")
                                     st.markdown(node_data['research_report'])
@@ -547,6 +619,11 @@ def main():
                                     unsafe_allow_html=True
                                 )
                         
+                        elif node_name == "widen_search":
+                            status_placeholder.info(
+                                f"🔄 Few sources found; widening the search window to {node_data.get('search_window')}..."
+                            )
+                        
                         elif node_name == "writer":
                             current_step = 2
                             agent_statuses["writer"].markdown(
@@ -583,7 +660,7 @@ def main():
                                     unsafe_allow_html=True
                                 )
                         
-                        elif node_name == "fact_checker":
+                        elif node_name in ("fact_checker", "publish_unchecked"):
                             current_step = 4
                             agent_statuses["fact_checker"].markdown(
                                 create_agent_card("Fact Check", "Active", "✅", "#EF4444"), 
@@ -592,8 +669,10 @@ def main():
                             status_placeholder.info("🔍 Verifying claims and accuracy...")
                             
                             if 'final_post' in node_data:
+                                # Skipped when research had too few sources to check against
+                                fact_check_status = "Complete ✓" if node_name == "fact_checker" else "Skipped (few sources)"
                                 agent_statuses["fact_checker"].markdown(
-                                    create_agent_card("Fact Check", "Complete ✓", "✅", "#10B981"), 
+                                    create_agent_card("Fact Check", fact_check_status, "✅", "#10B981"), 
                                     unsafe_allow_html=True
                                 )
                                 status_placeholder.success("✅ Article generation complete!")
@@ -623,12 +702,47 @@ def main():
                                     )
                                     st.markdown('</div>', unsafe_allow_html=True)
                         
+                        elif node_name == "variant":
+                            # Variant branches write, edit and fact-check together; one chunk per finished version
+                            current_step = 4 if len(finished_variants) + 1 == len(variants) else 2
+                            for stage in ("writer", "editor", "fact_checker"):
+                                agent_statuses[stage].markdown(
+                                    create_agent_card(
+                                        "Fact Check" if stage == "fact_checker" else stage.title(),
+                                        f"{len(finished_variants) + 1}/{len(variants)} versions", "📚", "#10B981"
+                                    ),
+                                    unsafe_allow_html=True
+                                )
+                            finished_variants.update(node_data.get("variants", {}))
+                            with final_placeholder.container():
+                                display_variants(finished_variants, downloads=False)
+                            if current_step == 4:
+                                status_placeholder.success("✅ All versions complete!")
+                            else:
+                                status_placeholder.info(f"📚 {len(finished_variants)} of {len(variants)} versions ready...")
+                        
                         # Update progress bar with smooth animation
                         progress_bar.progress(current_step / total_steps)
                         time.sleep(0.1)  # Small delay for better UX
+                    
+                    # Download buttons once every version is in (widgets can only be drawn once per run)
+                    if finished_variants:
+                        with final_placeholder.container():
+                            display_variants(finished_variants)
                         
+                except RunTimedOut as e:
+                    st.error(f"⏱️ {ERROR_MESSAGES['timeout_error']} ({e})")
+                except RunCancelled as e:
+                    st.warning(f"🛑 {ERROR_MESSAGES['run_cancelled']} ({e})")
+                except ResearchFailed as e:
+                    status_placeholder.empty()
+                    st.warning(f"🔍 {ERROR_MESSAGES['research_failed']} ({e.reason})")
                 except Exception as e:
                     st.error(f"❌ An error occurred: {e}")
+                finally:
+                    cancel_token.cancel("session ended")
+                    if trace is not None:
+                        trace.finish()
                     
             else:
                 # Non-streaming mode with loading animation
@@ -647,17 +761,39 @@ def main():
                     
                     try:
                         if use_caching:
-                            result = cached_generation(topic_input, temperature)
+                            result = cached_generation(
+                                topic_input, temperature, cancel_token=cancel_token, user_id=user_id, trace=trace,
+                                variants=variants
+                            )
                         else:
-                            graph = create_enhanced_graph(temperature=temperature)
+                            graph = create_enhanced_graph(
+                                temperature=temperature, cancel_token=cancel_token, user_id=user_id, trace=trace,
+                                variants=variants
+                            )
                             result = graph.invoke({TOPIC: topic_input})
                         
                         loading_placeholder.empty()
-                        display_final_result(result)
+                        if result.get("cache_status") == "revalidated":
+                            st.success(SUCCESS_MESSAGES["cache_revalidated"])
+                        with span("render", "ui", trace=trace):
+                            display_final_result(result)
                         
+                    except RunTimedOut as e:
+                        loading_placeholder.empty()
+                        st.error(f"⏱️ {ERROR_MESSAGES['timeout_error']} ({e})")
+                    except RunCancelled as e:
+                        loading_placeholder.empty()
+                        st.warning(f"🛑 {ERROR_MESSAGES['run_cancelled']} ({e})")
+                    except ResearchFailed as e:
+                        loading_placeholder.empty()
+                        st.warning(f"🔍 {ERROR_MESSAGES['research_failed']} ({e.reason})")
                     except Exception as e:
                         loading_placeholder.empty()
                         st.error(f"❌ An error occurred: {e}")
+                    finally:
+                        cancel_token.cancel("session ended")
+                        if trace is not None:
+                            trace.finish()
         
         else:
             # Welcome screen when no generation is active
@@ -690,9 +826,42 @@ def main():
             </div>
             """, unsafe_allow_html=True)
 
+def display_variants(variants: Dict[str, Dict[str, Any]], downloads: bool = True):
+    """Display each version of a multi-variant run in its own tab."""
+    names = sorted(variants, key=lambda name: list(ARTICLE_LENGTHS).index(variants[name]["length"]))
+    for name, tab in zip(names, st.tabs([name.replace(":", " · ").title() for name in names])):
+        variant = variants[name]
+        final_post = variant.get("final_post") or variant.get(BLOG_POST, "Failed to generate content.")
+        with tab:
+            st.markdown(f"""
+            <div class="gradient-border">
+                <div style="background: rgba(0,0,0,0.3); padding: 2rem; border-radius: 13px;">
+                    <div class="markdown-text-container">
+                        {final_post}
+                    </div>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+            st.caption(f"{len(final_post.split())} words · {variant.get('elapsed_s', 0):.1f}s")
+            if not downloads:
+                continue
+            st.download_button(
+                label="📄 Download as Markdown",
+                data=final_post,
+                file_name=f"article_{name.replace(':', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md",
+                mime="text/markdown",
+                key=f"download_{name}",
+            )
+
 def display_final_result(result: Dict[str, Any]):
     """Display the final result in a clean format."""
     
+    if result.get("variants"):
+        st.markdown("---")
+        st.markdown("### 📰 Your Generated Articles")
+        display_variants(result["variants"])
+        return
+    
     final_post = result.get('final_post') or result.get(BLOG_POST, "Failed to generate content.")
     
     st.markdown("---")
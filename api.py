@@ -0,0 +1,258 @@
+"""
+Lightweight HTTP API for article generation.
+
+Run with:
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+Endpoints:
+    GET  /health
+    GET  /metrics           scheduler queue depth, slots in use and wait times, and
+                            hedged search counts and latencies per search provider
+    GET  /archive/search    ?q=...&limit=10  full-text search of archived articles
+    GET  /archive/{id}      one archived article
+    POST /generate          {"topic": ..., "temperature": 0.7, "use_caching": true,
+                             "priority": "interactive", "reuse_archived": false,
+                             "variants": []}
+                            with "reuse_archived", the latest archived article on
+                            the same topic is returned instead of a new run; with
+                            "variants" (e.g. ["short", "long:formal"]), the topic is
+                            researched once and every version is returned under
+                            "variants" (see variants.py)
+    POST /generate/stream   same body; streams one server-sent event per node
+                            ("researcher", "writer", "editor", "fact_checker", or
+                            one "variant" per finished version) followed by "done",
+                            or "timeout" / "research_failed" / "error" on failure
+
+Runs whose research finds no usable sources fail fast with 422 (see quality.py).
+
+Each request gets a CancellationToken: a client that disconnects cancels its
+run, and runs that exceed their time limits are reported as timed out (504).
+LLM and search calls are scheduled by the request's priority class and
+accounted to the user named in the X-User-Id header (or the client address).
+Sampled runs are traced (see tracing.py) under the request's X-Request-Id,
+which is generated when the client does not send one.
+"""
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from archive import article_archive
+from cancellation import CancellationToken, RunCancelled, RunTimedOut
+from config import API_WORKER_THREADS, DEFAULT_TEMPERATURE
+from graph import create_enhanced_graph
+from pipeline import cached_generation, stream_generation
+from quality import ResearchFailed
+from scheduler import PRIORITIES, scheduler
+from search_providers import hedged_search
+from tracing import tracer
+from variants import parse_variants
+
+# Graph runs block on LLM and search I/O, so they run on a dedicated pool
+# sized for the number of concurrent generations a process should serve.
+_executor = ThreadPoolExecutor(max_workers=API_WORKER_THREADS, thread_name_prefix="generation")
+
+_DONE = object()
+
+
+async def _read_request(request: Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    if not isinstance(body, dict) or not isinstance(body.get("topic"), str) or not body["topic"].strip():
+        raise ValueError("Request body must be a JSON object with a non-empty 'topic'.")
+    priority = body.get("priority", "interactive")
+    if not isinstance(priority, str) or priority not in PRIORITIES:
+        raise ValueError(f"'priority' must be one of {', '.join(PRIORITIES)}.")
+    temperature = body.get("temperature", DEFAULT_TEMPERATURE)
+    # bool is an int subclass, but `true` is not a temperature
+    if isinstance(temperature, bool) or not isinstance(temperature, (int, float)) or not 0 <= temperature <= 2:
+        raise ValueError("'temperature' must be a number between 0 and 2.")
+    flags = {"use_caching": body.get("use_caching", True), "reuse_archived": body.get("reuse_archived", False)}
+    for name, value in flags.items():
+        # bool("false") is True, so only JSON true/false are accepted
+        if not isinstance(value, bool):
+            raise ValueError(f"'{name}' must be true or false.")
+    variants = body.get("variants") or []
+    if not isinstance(variants, list):
+        raise ValueError("'variants' must be a list of variant names, e.g. [\"short\", \"long:formal\"].")
+    user_id = request.headers.get("x-user-id") or (request.client.host if request.client else "anonymous")
+    return {
+        "request_id": request.headers.get("x-request-id") or uuid.uuid4().hex,
+        "topic": body["topic"].strip(),
+        "temperature": float(temperature),
+        **flags,
+        "schedule": {"priority": priority, "user_id": user_id},
+        "variants": [variant["name"] for variant in parse_variants(variants)],
+    }
+
+
+def _trace_attributes(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "topic": params["topic"],
+        "request_id": params["request_id"],
+        "user_id": params["schedule"]["user_id"],
+        "priority": params["schedule"]["priority"],
+        "variants": ",".join(params["variants"]),
+    }
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def health(request: Request) -> JSONResponse:
+    return JSONResponse({"status": "ok"})
+
+
+async def metrics(request: Request) -> JSONResponse:
+    return JSONResponse({**scheduler.metrics(), "search_providers": hedged_search.metrics()})
+
+
+async def archive_search(request: Request) -> JSONResponse:
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return JSONResponse({"error": "Query parameter 'q' is required."}, status_code=400)
+    try:
+        limit = max(1, min(100, int(request.query_params.get("limit", 10))))
+    except ValueError:
+        return JSONResponse({"error": "'limit' must be an integer."}, status_code=400)
+    started = time.perf_counter()
+    results = await run_in_threadpool(article_archive.search, query, limit)
+    return JSONResponse({
+        "query": query,
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+
+
+async def archive_article(request: Request) -> JSONResponse:
+    article = await run_in_threadpool(article_archive.get, request.path_params["article_id"])
+    if article is None:
+        return JSONResponse({"error": "Archived article not found."}, status_code=404)
+    return JSONResponse(article)
+
+
+async def generate(request: Request) -> JSONResponse:
+    try:
+        params = await _read_request(request)
+    except (TypeError, ValueError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    if params["reuse_archived"] and not params["variants"]:
+        archived = await run_in_threadpool(article_archive.latest_for_topic, params["topic"])
+        if archived is not None:
+            return JSONResponse({**archived, "archive_status": "reused"})
+
+    cancel_token = CancellationToken()
+
+    def run() -> Dict[str, Any]:
+        with tracer.trace("api.generate", **_trace_attributes(params)) as trace:
+            if params["use_caching"]:
+                return cached_generation(
+                    params["topic"], params["temperature"], cancel_token=cancel_token, trace=trace,
+                    variants=params["variants"], **params["schedule"]
+                )
+            graph = create_enhanced_graph(
+                temperature=params["temperature"], cancel_token=cancel_token, trace=trace,
+                variants=params["variants"], **params["schedule"]
+            )
+            return graph.invoke({"topic": params["topic"]})
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, run)
+    try:
+        # Cancel the run if the client goes away while we wait for it
+        while not future.done():
+            await asyncio.wait({future}, timeout=1.0)
+            if not future.done() and await request.is_disconnected():
+                cancel_token.cancel("client disconnected")
+        result = future.result()
+    except RunTimedOut as e:
+        return JSONResponse({"error": str(e), "status": "timed_out"}, status_code=504)
+    except RunCancelled as e:
+        return JSONResponse({"error": str(e), "status": "cancelled"}, status_code=499)
+    except ResearchFailed as e:
+        return JSONResponse({"error": e.reason, "status": "research_failed"}, status_code=422)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+    return JSONResponse(json.loads(json.dumps(result, default=str)), headers={"X-Request-Id": params["request_id"]})
+
+
+async def generate_stream(request: Request) -> Response:
+    try:
+        params = await _read_request(request)
+    except (TypeError, ValueError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancel_token = CancellationToken()
+
+    def produce():
+        """Runs the graph on a worker thread and forwards each node's output."""
+        started = last = time.perf_counter()
+        try:
+            with tracer.trace("api.generate_stream", **_trace_attributes(params)) as trace:
+                for chunk in stream_generation(
+                    params["topic"], params["temperature"], cancel_token=cancel_token, trace=trace,
+                    variants=params["variants"], **params["schedule"]
+                ):
+                    now = time.perf_counter()
+                    for node, output in chunk.items():
+                        loop.call_soon_threadsafe(queue.put_nowait, ("node", {
+                            "node": node,
+                            "elapsed_s": round(now - last, 3),
+                            "total_s": round(now - started, 3),
+                            "output": output,
+                        }))
+                    last = now
+            loop.call_soon_threadsafe(queue.put_nowait, ("done", {"total_s": round(time.perf_counter() - started, 3)}))
+        except RunTimedOut as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("timeout", {"error": str(e)}))
+        except RunCancelled:
+            pass  # the client is gone; nobody is listening
+        except ResearchFailed as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("research_failed", {"error": e.reason}))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", {"error": str(e)}))
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+    async def events():
+        loop.run_in_executor(_executor, produce)
+        try:
+            yield _sse("start", {"topic": params["topic"], "request_id": params["request_id"]})
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                yield _sse(*item)
+        finally:
+            # Client went away (or the stream ended); abort any in-flight calls
+            cancel_token.cancel("client disconnected")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+app = Starlette(routes=[
+    Route("/health", health, methods=["GET"]),
+    Route("/metrics", metrics, methods=["GET"]),
+    Route("/archive/search", archive_search, methods=["GET"]),
+    Route("/archive/{article_id:int}", archive_article, methods=["GET"]),
+    Route("/generate", generate, methods=["POST"]),
+    Route("/generate/stream", generate_stream, methods=["POST"]),
+])
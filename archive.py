@@ -0,0 +1,215 @@
+"""
+Archive of completed articles with full-text search.
+
+Every run that reaches the end of the graph is stored in a local SQLite
+database (ARCHIVE_PATH) with its topic, final article, sources, notes and
+timestamp. An FTS5 index over topic and article text answers searches in
+milliseconds even with tens of thousands of articles, so the UI and API can
+offer to reuse an existing article instead of starting a new pipeline.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import ARCHIVE_PATH, ARCHIVE_SEARCH_CANDIDATES
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    topic_key TEXT NOT NULL,
+    final_post TEXT NOT NULL,
+    research_report TEXT,
+    sources TEXT,
+    agent_notes TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS articles_topic_key ON articles (topic_key, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    topic, final_post, content='articles', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, topic, final_post) VALUES (new.id, new.topic, new.final_post);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, topic, final_post) VALUES ('delete', old.id, old.topic, old.final_post);
+END;
+"""
+
+
+def topic_key(topic: str) -> str:
+    """Normalized topic used to find earlier articles on exactly the same topic."""
+    return " ".join(re.findall(r"\w+", (topic or "").lower()))
+
+
+def _match_expression(query: str, match_all: bool) -> str:
+    # Quote every term so user input cannot inject FTS5 syntax
+    terms = re.findall(r"\w+", query.lower())
+    return (" AND " if match_all else " OR ").join(f'"{term}"' for term in terms)
+
+
+class ArticleArchive:
+    """SQLite FTS5 archive; each operation opens its own connection, so it is thread-safe."""
+
+    def __init__(self, path: str = ARCHIVE_PATH):
+        self.path = path
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        with self._init_lock:
+            if not self._initialized:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+                try:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                finally:
+                    conn.close()
+                self._initialized = True
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def store(self, result: Dict[str, Any]) -> Optional[int]:
+        """Archives a completed run; runs without a final article are skipped."""
+        final_post = result.get("final_post")
+        if not final_post:
+            return None
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO articles (topic, topic_key, final_post, research_report, sources, agent_notes, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    result.get("topic", ""),
+                    topic_key(result.get("topic", "")),
+                    final_post,
+                    result.get("research_report"),
+                    json.dumps(result.get("research_sources") or []),
+                    json.dumps(result.get("agent_notes") or {}),
+                    result.get("generation_timestamp") or datetime.now().isoformat(),
+                ),
+            )
+            return cursor.lastrowid
+
+    def search(self, query: str, limit: int = 10, match_all: bool = True) -> List[Dict[str, Any]]:
+        """
+        Full-text search over topics (weighted higher) and articles, best
+        matches first. Every query term must match unless `match_all` is False.
+
+        Only the ARCHIVE_SEARCH_CANDIDATES most recent matches are ranked, and
+        snippets are built for the returned rows only, so a query for a common
+        term costs the same on a large archive as on a small one.
+        """
+        expression = _match_expression(query, match_all)
+        if not expression:
+            return []
+        with self._connect() as conn:
+            ranked = conn.execute(
+                """
+                SELECT rowid, bm25(articles_fts, 5.0, 1.0) AS score
+                FROM articles_fts
+                WHERE articles_fts MATCH :match AND rowid >= (
+                    SELECT MIN(rowid) FROM (
+                        SELECT rowid FROM articles_fts WHERE articles_fts MATCH :match
+                        ORDER BY rowid DESC LIMIT :candidates
+                    )
+                )
+                ORDER BY score
+                LIMIT :limit
+                """,
+                {"match": expression, "candidates": ARCHIVE_SEARCH_CANDIDATES, "limit": limit},
+            ).fetchall()
+            if not ranked:
+                return []
+            scores = {row["rowid"]: row["score"] for row in ranked}
+            placeholders = ", ".join("?" * len(scores))
+            rows = conn.execute(
+                f"""
+                SELECT a.id, a.topic, a.created_at, snippet(articles_fts, 1, '**', '**', '…', 24) AS snippet
+                FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid
+                WHERE articles_fts MATCH ? AND articles_fts.rowid IN ({placeholders})
+                """,
+                (expression, *scores),
+            ).fetchall()
+        results = [{**dict(row), "score": scores[row["id"]]} for row in rows]
+        return sorted(results, key=lambda result: result["score"])
+
+    def get(self, article_id: int) -> Optional[Dict[str, Any]]:
+        """The archived run in the same shape as a graph result."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM articles WHERE id = ?", (article_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "archive_id": row["id"],
+            "topic": row["topic"],
+            "final_post": row["final_post"],
+            "research_report": row["research_report"],
+            "research_sources": json.loads(row["sources"] or "[]"),
+            "agent_notes": json.loads(row["agent_notes"] or "{}"),
+            "generation_timestamp": row["created_at"],
+        }
+
+    def latest_for_topic(self, topic: str) -> Optional[Dict[str, Any]]:
+        """The most recent archived article on exactly this topic, if any."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM articles WHERE topic_key = ? ORDER BY id DESC LIMIT 1",
+                (topic_key(topic),),
+            ).fetchone()
+        return self.get(row["id"]) if row else None
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def wrap(self, node):
+        """Returns the graph's last `node` wrapped so that each completed run is archived."""
+
+        def archived_node(state):
+            output = node(state)
+            # A variant branch (see variants.py) archives its version as an article of its own
+            variants = (output.get("variants") or {}).values()
+            results = [{**state, **variant} for variant in variants] or [{**state, **output}]
+            try:
+                for result in results:
+                    self.store(result)
+            except sqlite3.Error as e:
+                print(f"Archive error for topic '{state.get('topic')}': {e}")
+            return output
+
+        return archived_node
+
+
+article_archive = ArticleArchive()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Search the article archive.")
+    parser.add_argument("query")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = article_archive.search(args.query, args.limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps({"results": results, "elapsed_ms": round(elapsed_ms, 2)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
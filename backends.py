@@ -0,0 +1,353 @@
+"""
+Shared state for the result cache, search cache, rate-limit buckets and run
+locks.
+
+A single process can use the in-memory backend. Several replicas should
+point SHARED_BACKEND_URL at the same SQLite file (replicas on one host or on
+a shared volume) or the same Redis server, so that they share cache hits and
+stay within API quotas together.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from config import (
+    CACHE_MAX_ENTRIES,
+    CACHE_NAMESPACE_MAX_ENTRIES,
+    RATE_LIMIT_MAX_WAIT,
+    RATE_LIMITS,
+    SHARED_BACKEND_URL,
+)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a rate-limit bucket stays empty for longer than the allowed wait."""
+
+
+class SharedBackend(ABC):
+    """
+    Interface for state shared between app replicas. Values are strings
+    (callers store JSON); `ttl` is in seconds.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def take_token(self, bucket: str, rate: float, capacity: float) -> bool:
+        """
+        Takes one token from a token bucket refilled at `rate` tokens per second
+        up to `capacity`. Returns False when the bucket is empty.
+        """
+
+    @abstractmethod
+    def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        """Returns a lock token if the lock was free, else None. Locks expire after `ttl`."""
+
+    @abstractmethod
+    def release_lock(self, name: str, token: str):
+        """Releases the lock if it is still held with `token`."""
+
+
+class MemoryBackend(SharedBackend):
+    """
+    Process-local backend; the default when SHARED_BACKEND_URL is not set.
+    Each key namespace (the part before the first ":", e.g. "article" or
+    "search") is a separate LRU, bounded by its entry in
+    CACHE_NAMESPACE_MAX_ENTRIES or by `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, namespace_max_entries: Optional[Dict[str, int]] = None):
+        self.max_entries = max_entries
+        self.namespace_max_entries = CACHE_NAMESPACE_MAX_ENTRIES if namespace_max_entries is None else namespace_max_entries
+        self._values: Dict[str, "OrderedDict[str, tuple]"] = {}
+        self._buckets = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _namespace(self, key: str) -> "OrderedDict[str, tuple]":
+        return self._values.setdefault(key.split(":", 1)[0], OrderedDict())
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            values = self._namespace(key)
+            value = values.get(key)
+            if value is None:
+                return None
+            if value[1] is not None and value[1] <= time.time():
+                del values[key]
+                return None
+            values.move_to_end(key)
+            return value[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        namespace = key.split(":", 1)[0]
+        limit = self.namespace_max_entries.get(namespace, self.max_entries)
+        with self._lock:
+            values = self._namespace(key)
+            values[key] = (value, time.time() + ttl if ttl else None)
+            values.move_to_end(key)
+            while len(values) > limit:
+                values.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._namespace(key).pop(key, None)
+
+    def take_token(self, bucket: str, rate: float, capacity: float) -> bool:
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(bucket, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            allowed = tokens >= 1
+            self._buckets[bucket] = (tokens - 1 if allowed else tokens, now)
+            return allowed
+
+    def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            held = self._locks.get(name)
+            if held is not None and held[1] > now:
+                return None
+            token = uuid.uuid4().hex
+            self._locks[name] = (token, now + ttl)
+            return token
+
+    def release_lock(self, name: str, token: str):
+        with self._lock:
+            held = self._locks.get(name)
+            if held is not None and held[0] == token:
+                del self._locks[name]
+
+
+class SQLiteBackend(SharedBackend):
+    """
+    SQLite-file backend for replicas that share a filesystem. Each operation
+    opens its own connection, so it is safe across threads and processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated_at REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, token TEXT, expires_at REAL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + ttl if ttl else None),
+            )
+
+    def delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def take_token(self, bucket: str, rate: float, capacity: float) -> bool:
+        with self._transaction() as conn:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM buckets WHERE name = ?", (bucket,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            allowed = tokens >= 1
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (bucket, tokens - 1 if allowed else tokens, now),
+            )
+        return allowed
+
+    def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        with self._transaction() as conn:
+            now = time.time()
+            conn.execute("DELETE FROM locks WHERE name = ? AND expires_at <= ?", (name, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO locks (name, token, expires_at) VALUES (?, ?, ?)",
+                (name, token, now + ttl),
+            )
+            acquired = cursor.rowcount == 1
+        return token if acquired else None
+
+    def release_lock(self, name: str, token: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM locks WHERE name = ? AND token = ?", (name, token))
+
+
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return allowed
+"""
+
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisBackend(SharedBackend):
+    """
+    Backend for any server speaking the Redis protocol (Redis, Valkey, KeyDB, ...).
+    Token buckets and lock release run as Lua scripts so they are atomic.
+    """
+
+    def __init__(self, url: str, prefix: str = "newsgen:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("The `redis` package is required for a redis:// SHARED_BACKEND_URL.") from e
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+        self._take_token = self._client.register_script(_TOKEN_BUCKET_LUA)
+        self._release_lock = self._client.register_script(_RELEASE_LOCK_LUA)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self._client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str):
+        self._client.delete(self.prefix + key)
+
+    def take_token(self, bucket: str, rate: float, capacity: float) -> bool:
+        return bool(self._take_token(keys=[f"{self.prefix}bucket:{bucket}"], args=[rate, capacity]))
+
+    def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = self._client.set(f"{self.prefix}lock:{name}", token, nx=True, px=int(ttl * 1000))
+        return token if acquired else None
+
+    def release_lock(self, name: str, token: str):
+        self._release_lock(keys=[f"{self.prefix}lock:{name}"], args=[token])
+
+
+def create_backend(url: str) -> SharedBackend:
+    """Builds a backend from a URL: "", "memory://", "sqlite:///path.db" or "redis://host:6379/0"."""
+    if not url or url.startswith("memory://"):
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported SHARED_BACKEND_URL: {url}")
+
+
+_backend: Optional[SharedBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> SharedBackend:
+    """Returns the process-wide backend configured by SHARED_BACKEND_URL."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(SHARED_BACKEND_URL)
+        return _backend
+
+
+class RateLimiter:
+    """Blocks callers until their bucket in RATE_LIMITS has a token."""
+
+    def __init__(self, backend: Optional[SharedBackend] = None, limits=RATE_LIMITS):
+        self._backend = backend
+        self.limits = limits
+
+    @property
+    def backend(self) -> SharedBackend:
+        return self._backend or get_backend()
+
+    def wait(self, bucket: str, max_wait: float = RATE_LIMIT_MAX_WAIT, cancel_token=None):
+        """
+        Takes a token from `bucket`, waiting up to `max_wait` seconds. A
+        cancelled `cancel_token` (cancellation.CancellationToken) stops the
+        wait with RunCancelled.
+        """
+        limit = self.limits.get(bucket)
+        if limit is None:
+            return
+        deadline = time.time() + max_wait
+        while not self.backend.take_token(bucket, limit["rate"], limit["capacity"]):
+            if time.time() >= deadline:
+                raise RateLimitExceeded(f"Rate limit for '{bucket}' still exhausted after {max_wait}s")
+            pause = min(1.0 / limit["rate"], max(deadline - time.time(), 0))
+            if cancel_token is None:
+                time.sleep(pause)
+            else:
+                cancel_token.wait(pause)
+                cancel_token.raise_if_cancelled()
+
+
+rate_limiter = RateLimiter()
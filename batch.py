@@ -0,0 +1,158 @@
+"""
+Batch generation with batched research planning.
+
+Generating many articles one by one costs one LLM round-trip per topic just
+to plan 3-5 search queries. Here the queries for up to QUERY_BATCH_SIZE
+topics are planned in a single call with structured (JSON) output; topics
+whose plan is missing or malformed fall back to the usual per-topic call.
+Each article is then generated through `cached_generation` with its planned
+queries, so research skips the planning call. All calls are scheduled as
+"batch" (or "prewarm") work, so they only use capacity interactive users leave.
+
+Usage:
+    python batch.py topics.txt [--temperature 0.7] [--priority prewarm] [--variants short,long]
+                    [--output results.jsonl]
+"""
+import argparse
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.prompts import PromptTemplate
+
+from agents import QUERY_PROMPT, parse_queries
+from config import BATCH_CONCURRENCY, DEFAULT_TEMPERATURE, QUERY_BATCH_SIZE
+from pipeline import cached_generation
+from quality import ResearchFailed
+from routing import ModelRouter, llm_for
+from scheduler import ScheduledLLM, scheduler
+from tracing import tracer
+from variants import parse_variants
+
+BATCH_QUERY_PROMPT = PromptTemplate.from_template("""
+You are a research analyst. For each numbered topic below, generate 3-5 different search queries for researching it.
+
+Topics:
+{topics}
+
+Make the queries specific and varied to gather comprehensive information if dates would be added in the queries it must be either relativve (last week , next week, last month, next month, etc...) or using the year 2025.
+Output only JSON mapping each topic number to its list of queries, for example:
+{{"1": ["first query", "second query", "third query"], "2": ["..."]}}
+""")
+
+
+def _parse_batch(text: str, count: int) -> Dict[int, List[str]]:
+    """Parses the batched planner response; topics with no valid plan are left out."""
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", (text or "").strip())
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        plans = json.loads(text[start:end + 1]) if start != -1 else {}
+    except ValueError:
+        return {}
+    if not isinstance(plans, dict):
+        return {}
+
+    parsed = {}
+    for index in range(count):
+        queries = plans.get(str(index + 1))
+        if isinstance(queries, list):
+            queries = [q.strip() for q in queries if isinstance(q, str) and q.strip()]
+            if queries:
+                parsed[index] = queries[:5]
+    return parsed
+
+
+def plan_queries(topics: List[str], llm, batch_size: int = QUERY_BATCH_SIZE) -> Tuple[Dict[str, List[str]], Dict[str, int]]:
+    """
+    Plans search queries for every topic, `batch_size` topics per LLM call.
+    Returns the queries per topic and counts of batched and fallback calls.
+    """
+    model = llm_for(llm, "research.queries")
+    plans: Dict[str, List[str]] = {}
+    stats = {"topics": len(topics), "batch_calls": 0, "fallback_calls": 0}
+
+    for offset in range(0, len(topics), batch_size):
+        chunk = topics[offset:offset + batch_size]
+        numbered = "\n".join(f"{i + 1}. {topic}" for i, topic in enumerate(chunk))
+        response = model.invoke(BATCH_QUERY_PROMPT.format(topics=numbered))
+        stats["batch_calls"] += 1
+        parsed = _parse_batch(response.content, len(chunk))
+
+        for index, topic in enumerate(chunk):
+            if index in parsed:
+                plans[topic] = parsed[index]
+                continue
+            # The batch answer had nothing usable for this topic
+            response = model.invoke(QUERY_PROMPT.format(topic=topic))
+            stats["fallback_calls"] += 1
+            plans[topic] = parse_queries(response.content)[:5]
+
+    return plans, stats
+
+
+def generate_batch(
+    topics: List[str],
+    temperature: float = DEFAULT_TEMPERATURE,
+    llm=None,
+    concurrency: int = BATCH_CONCURRENCY,
+    priority: str = "batch",
+    **graph_options,
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Generates an article per topic, planning all research queries up front.
+    Returns the results in topic order and the planning statistics.
+    """
+    topics = list(dict.fromkeys(" ".join(t.split()) for t in topics if t.strip()))
+    if llm is None:
+        llm = ModelRouter(temperature=temperature)
+    plans, stats = plan_queries(topics, ScheduledLLM(llm, scheduler, priority, user="batch"))
+
+    def generate(topic: str) -> Dict[str, Any]:
+        try:
+            with tracer.trace("batch", topic=topic, priority=priority, planned=topic in plans) as trace:
+                return cached_generation(
+                    topic,
+                    temperature,
+                    search_queries=plans.get(topic),
+                    llm=llm,
+                    priority=priority,
+                    user_id="batch",
+                    trace=trace,
+                    **graph_options,
+                )
+        except ResearchFailed as e:
+            # One topic without news must not abort the rest of the batch
+            return {"topic": topic, "error": e.reason, "cache_status": "research_failed"}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(generate, topics))
+    return results, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("topics_file", help="one topic per line")
+    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE)
+    parser.add_argument("--priority", choices=["batch", "prewarm"], default="batch")
+    parser.add_argument("--variants", help="comma-separated article variants per topic, e.g. short,long:formal")
+    parser.add_argument("--output", help="write one JSON result per line to this file")
+    args = parser.parse_args()
+
+    with open(args.topics_file) as f:
+        topics = f.read().splitlines()
+    try:
+        variants = [v["name"] for v in parse_variants(v for v in (args.variants or "").split(",") if v.strip())]
+    except ValueError as e:
+        parser.error(str(e))
+    results, stats = generate_batch(topics, args.temperature, priority=args.priority, variants=variants)
+    print(json.dumps({**stats, "cache_status": [r["cache_status"] for r in results]}, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            for result in results:
+                f.write(json.dumps(result, default=str) + "\n")
+    tracer.flush()
+
+
+if __name__ == "__main__":
+    main()
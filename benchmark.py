@@ -0,0 +1,538 @@
+"""
+Offline benchmarks for the generation pipeline.
+
+Runs the real agent code against the fakes in fakes.py, so results are
+reproducible and cost no quota. Each scenario prints one JSON document so
+runs can be diffed across commits.
+
+Usage:
+    python benchmark.py research [--runs 5] [--llm-latency 1.5] [--search-latency 0.8]
+    python benchmark.py routing [--runs 10] [--slow-latency 0.4] [--fast-latency 0.05] [--budget 0.2]
+    python benchmark.py batch [--topics 40] [--query-latency 0.3] [--batch-latency 0.8]
+    python benchmark.py pipeline [--runs 3] [--writer-latency 2.0] [--edit-latency 0.5] [--check-latency 0.5]
+    python benchmark.py quality [--llm-latency 0.5] [--search-latency 0.2]
+    python benchmark.py http [--calls 400] [--concurrency 16] [--latency 0.02] [--tls]
+    python benchmark.py tracing [--runs 50] [--sample-rate 0.1]
+    python benchmark.py variants [--variants short,medium,long] [--llm-latency 0.5] [--search-latency 0.2]
+    python benchmark.py hedging [--runs 40] [--primary-latency 0.2] [--primary-sigma 1.0] [--secondary-latency 0.3]
+"""
+import argparse
+import asyncio
+import json
+import os
+import ssl
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import requests
+
+from agents import QUERY_PROMPT, parse_queries, research_node
+from batch import plan_queries
+from config import MODEL_ROUTES, MODEL_TIERS
+from fakes import CallLog, FakeLLM, FakeSearch, Latency, StubCollector, StubSerperServer
+from graph import create_enhanced_graph
+from quality import ResearchFailed
+from routing import ModelRouter, RouteStats
+from search_client import SerperClient
+from search_providers import CallableProvider, HedgedSearch
+from tracing import JsonFileExporter, OTLPExporter, Tracer
+
+
+def _overlap(interval: Tuple[float, float], others: List[Tuple[float, float]]) -> float:
+    """Seconds of `interval` covered by the union of `others`."""
+    start, end = interval
+    covered = 0.0
+    cursor = start
+    for other_start, other_end in sorted(others):
+        other_start, other_end = max(other_start, cursor), min(other_end, end)
+        if other_end > other_start:
+            covered += other_end - other_start
+            cursor = other_end
+    return covered
+
+
+def bench_research(runs: int, llm_latency: float, search_latency: float) -> Dict[str, Any]:
+    """Compares sequential and speculative research, measuring search/LLM overlap."""
+    report: Dict[str, Any] = {
+        "scenario": "research",
+        "runs": runs,
+        "llm_latency": llm_latency,
+        "search_latency": search_latency,
+    }
+    for speculative in (False, True):
+        log = CallLog()
+        llm = FakeLLM(latency={"default": Latency(llm_latency)}, log=log)
+        search = FakeSearch(latency=Latency(search_latency), log=log)
+        wall_times, overlaps, searches = [], [], []
+        for _ in range(runs):
+            log.clear()
+            start = time.perf_counter()
+            result = research_node(
+                {"topic": "quantum computing breakthroughs"},
+                llm=llm,
+                search=search,
+                speculative=speculative,
+            )
+            wall_times.append(time.perf_counter() - start)
+            query_generation = log.intervals("llm", "queries")[0]
+            overlaps.append(_overlap(query_generation, log.intervals("search")))
+            searches.append(len(log.intervals("search")))
+            assert result["research_sources"], "research produced no sources"
+        report["speculative" if speculative else "sequential"] = {
+            "wall_mean_s": round(statistics.mean(wall_times), 4),
+            "wall_min_s": round(min(wall_times), 4),
+            "search_overlap_s": round(statistics.mean(overlaps), 4),
+            "searches_per_run": statistics.mean(searches),
+        }
+    report["speedup"] = round(
+        report["sequential"]["wall_mean_s"] / report["speculative"]["wall_mean_s"], 3
+    )
+    return report
+
+
+def bench_routing(runs: int, slow_latency: float, fast_latency: float, budget: float) -> Dict[str, Any]:
+    """
+    Runs the full graph through a ModelRouter whose standard tier is slower than
+    the latency budget, and reports how calls were split between tiers.
+    """
+    models = {
+        MODEL_TIERS["fast"]["model"]: FakeLLM(latency={"default": Latency(fast_latency)}),
+        MODEL_TIERS["standard"]["model"]: FakeLLM(latency={"default": Latency(slow_latency)}),
+    }
+    routes = {name: {**route, "latency_budget": budget} for name, route in MODEL_ROUTES.items()}
+    stats = RouteStats()
+    router = ModelRouter(
+        temperature=0.3,
+        routes=routes,
+        model_factory=lambda model, temperature: models[model],
+        stats=stats,
+        rate_limiter=None,
+    )
+    graph = create_enhanced_graph(llm=router, search=FakeSearch(), archive=False)
+
+    wall_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        graph.invoke({"topic": "quantum computing breakthroughs"})
+        wall_times.append(time.perf_counter() - start)
+
+    return {
+        "scenario": "routing",
+        "runs": runs,
+        "latency_budget": budget,
+        "wall_first_s": round(wall_times[0], 4),
+        "wall_last_s": round(wall_times[-1], 4),
+        "calls_per_tier": {
+            tier: len(models[config["model"]].log.calls) for tier, config in MODEL_TIERS.items()
+        },
+        "routes": {
+            key: {name: round(value, 6) for name, value in values.items()}
+            for key, values in stats.snapshot().items()
+        },
+    }
+
+
+def bench_batch(topics: int, query_latency: float, batch_latency: float) -> Dict[str, Any]:
+    """Compares per-topic query planning with batched planning for many topics."""
+    topic_list = [f"benchmark topic {i}" for i in range(topics)]
+    latency = {"queries": Latency(query_latency), "query_batch": Latency(batch_latency)}
+
+    llm = FakeLLM(latency=latency)
+    start = time.perf_counter()
+    for topic in topic_list:
+        parse_queries(llm.invoke(QUERY_PROMPT.format(topic=topic)).content)
+    per_topic_s = time.perf_counter() - start
+    per_topic_calls = len(llm.log.calls)
+
+    llm = FakeLLM(latency=latency)
+    start = time.perf_counter()
+    plans, stats = plan_queries(topic_list, llm)
+    batched_s = time.perf_counter() - start
+    assert len(plans) == topics, "batched planning lost topics"
+
+    return {
+        "scenario": "batch",
+        "topics": topics,
+        "per_topic": {"llm_calls": per_topic_calls, "wall_s": round(per_topic_s, 4)},
+        "batched": {"llm_calls": len(llm.log.calls), "wall_s": round(batched_s, 4), **stats},
+    }
+
+
+def bench_pipeline(runs: int, writer_latency: float, edit_latency: float, check_latency: float) -> Dict[str, Any]:
+    """Compares sequential writer/editor/fact-checker nodes with section-level pipelining."""
+    latency = {
+        "default": Latency(0.05),
+        "writer": Latency(writer_latency),
+        "editor_patch": Latency(edit_latency),
+        "fact_checker": Latency(check_latency * 3),
+        "fact_checker_section": Latency(check_latency),
+    }
+    report: Dict[str, Any] = {
+        "scenario": "pipeline",
+        "runs": runs,
+        "writer_latency": writer_latency,
+        "edit_latency": edit_latency,
+        "check_latency": check_latency,
+    }
+    for pipelined in (False, True):
+        wall_times = []
+        for _ in range(runs):
+            graph = create_enhanced_graph(llm=FakeLLM(latency=latency), search=FakeSearch(), pipelined=pipelined, archive=False)
+            start = time.perf_counter()
+            result = graph.invoke({"topic": "quantum computing breakthroughs"})
+            wall_times.append(time.perf_counter() - start)
+            assert result["final_post"], "pipeline produced no article"
+        report["pipelined" if pipelined else "sequential"] = {
+            "wall_mean_s": round(statistics.mean(wall_times), 4),
+            "wall_min_s": round(min(wall_times), 4),
+        }
+    report["speedup"] = round(
+        report["sequential"]["wall_mean_s"] / report["pipelined"]["wall_mean_s"], 3
+    )
+    return report
+
+
+def bench_quality(llm_latency: float, search_latency: float) -> Dict[str, Any]:
+    """
+    Runs topics with no news, news only in a wider window, and normal news,
+    with and without routing on research quality.
+    """
+    cases = {
+        "no_news": ("qdr:d", "qdr:w", "qdr:m"),
+        "news_last_week": ("qdr:d",),
+        "news_today": (),
+    }
+    report: Dict[str, Any] = {"scenario": "quality", "llm_latency": llm_latency, "search_latency": search_latency}
+    for case, empty_windows in cases.items():
+        report[case] = {}
+        for quality_routing in (False, True):
+            log = CallLog()
+            graph = create_enhanced_graph(
+                llm=FakeLLM(latency={"default": Latency(llm_latency)}, log=log),
+                search=FakeSearch(latency=Latency(search_latency), log=log, empty_windows=empty_windows),
+                quality_routing=quality_routing,
+                archive=False,
+            )
+            start = time.perf_counter()
+            try:
+                result = graph.invoke({"topic": "quantum computing breakthroughs"})
+                checked = result["research_quality"]["fact_check"] or not quality_routing
+                outcome = "published" if checked else "published unchecked"
+            except ResearchFailed:
+                outcome = "failed fast"
+            report[case]["routed" if quality_routing else "linear"] = {
+                "outcome": outcome,
+                "llm_calls": len([call for call in log.calls if call[0] == "llm"]),
+                "searches": len(log.intervals("search")),
+                "wall_s": round(time.perf_counter() - start, 4),
+            }
+    return report
+
+
+def _http_stats(latencies: List[float], wall_s: float, connections: int) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        "calls": len(latencies),
+        "connections": connections,
+        "wall_s": round(wall_s, 4),
+        "throughput_rps": round(len(latencies) / wall_s, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+    }
+
+
+def _run_http(stub: StubSerperServer, search: Callable[[str], Any], queries: List[str], concurrency: int) -> Dict[str, Any]:
+    def timed(query: str) -> float:
+        start = time.perf_counter()
+        search(query)
+        return time.perf_counter() - start
+
+    connections = stub.connections
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, queries))
+    return _http_stats(latencies, time.perf_counter() - start, stub.connections - connections)
+
+
+async def _run_http_async(stub: StubSerperServer, client: SerperClient, queries: List[str], concurrency: int) -> Dict[str, Any]:
+    slots = asyncio.Semaphore(concurrency)
+
+    async def timed(query: str) -> float:
+        async with slots:
+            start = time.perf_counter()
+            await client.anews(query)
+            return time.perf_counter() - start
+
+    connections = stub.connections
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed(query) for query in queries))
+    wall_s = time.perf_counter() - start
+    await client.aclose()
+    return _http_stats(latencies, wall_s, stub.connections - connections)
+
+
+def bench_http(calls: int, concurrency: int, latency: float, tls: bool) -> Dict[str, Any]:
+    """
+    Compares a new connection per search (as GoogleSerperAPIWrapper does) with
+    the pooled keep-alive client, sync and async, against a local stub server.
+    """
+    report: Dict[str, Any] = {
+        "scenario": "http",
+        "calls": calls,
+        "concurrency": concurrency,
+        "latency": latency,
+        "tls": tls,
+    }
+    queries = [f"benchmark query {i}" for i in range(calls)]
+    with StubSerperServer(Latency(latency), tls=tls) as stub:
+        headers = {"X-API-KEY": "benchmark", "Content-Type": "application/json"}
+
+        def per_call(query: str):
+            response = requests.post(
+                f"{stub.url}/news", headers=headers, json={"q": query, "num": 5},
+                verify=stub.cert_path or True, timeout=10,
+            )
+            response.raise_for_status()
+            return response.json()
+
+        verify = ssl.create_default_context(cafile=stub.cert_path) if tls else True
+        client = SerperClient(
+            api_key="benchmark", base_url=stub.url,
+            max_connections=concurrency, max_keepalive=concurrency, verify=verify,
+        )
+        report["per_call"] = _run_http(stub, per_call, queries, concurrency)
+        report["pooled"] = _run_http(stub, client.news, queries, concurrency)
+        report["pooled_async"] = asyncio.run(_run_http_async(stub, client, queries, concurrency))
+        client.close()
+    report["throughput_gain"] = round(
+        report["pooled"]["throughput_rps"] / report["per_call"]["throughput_rps"], 3
+    )
+    return report
+
+
+def bench_tracing(runs: int, sample_rate: float) -> Dict[str, Any]:
+    """
+    Per-run cost of tracing with zero-latency fakes, so only pipeline and
+    tracing overhead is measured: untraced, sampled, and every run traced to
+    a JSON file or to a local OTLP collector.
+    """
+    report: Dict[str, Any] = {"scenario": "tracing", "runs": runs, "sample_rate": sample_rate}
+
+    def run(trace) -> float:
+        start = time.perf_counter()
+        graph = create_enhanced_graph(llm=FakeLLM(), search=FakeSearch(), archive=False, trace=trace)
+        graph.invoke({"topic": "quantum computing breakthroughs"})
+        return time.perf_counter() - start
+
+    run(None)  # warm up imports and pools
+    with StubCollector() as collector, tempfile.TemporaryDirectory() as tmp:
+        modes = {
+            "off": Tracer(None),
+            "sampled_otlp": Tracer(OTLPExporter(collector.url), sample_rate),
+            "all_file": Tracer(JsonFileExporter(os.path.join(tmp, "traces.jsonl")), 1.0),
+            "all_otlp": Tracer(OTLPExporter(collector.url), 1.0),
+        }
+        durations: Dict[str, List[float]] = {mode: [] for mode in modes}
+        traced = dict.fromkeys(modes, 0)
+        # Modes take turns, so drift in machine load affects them alike
+        for _ in range(runs):
+            for mode, tracer in modes.items():
+                start = time.perf_counter()
+                with tracer.trace("benchmark", topic="quantum computing breakthroughs") as trace:
+                    run(trace)
+                durations[mode].append(time.perf_counter() - start)
+                traced[mode] += trace is not None
+        for mode, tracer in modes.items():
+            tracer.flush()
+            report[mode] = {
+                "traced_runs": traced[mode],
+                "mean_ms": round(statistics.mean(durations[mode]) * 1000, 3),
+                "p50_ms": round(statistics.median(durations[mode]) * 1000, 3),
+                "exported": tracer.exported,
+                "dropped": tracer.dropped,
+                "failed": tracer.failed,
+            }
+        report["collector_spans"] = len(collector.spans)
+    baseline = report["off"]["mean_ms"]
+    for mode in modes:
+        report[mode]["overhead_ms"] = round(report[mode]["mean_ms"] - baseline, 3)
+    return report
+
+
+def bench_variants(variants: List[str], llm_latency: float, search_latency: float) -> Dict[str, Any]:
+    """
+    Compares one full run per variant (run concurrently) with a single run
+    that researches once and fans out to every variant.
+    """
+    report: Dict[str, Any] = {
+        "scenario": "variants",
+        "variants": variants,
+        "llm_latency": llm_latency,
+        "search_latency": search_latency,
+    }
+
+    def run(log: CallLog, run_variants: List[str]) -> Dict[str, Any]:
+        graph = create_enhanced_graph(
+            llm=FakeLLM(latency={"default": Latency(llm_latency)}, log=log),
+            search=FakeSearch(latency=Latency(search_latency), log=log),
+            variants=run_variants,
+            archive=False,
+        )
+        return graph.invoke({"topic": "quantum computing breakthroughs"})
+
+    for mode in ("separate_runs", "fan_out"):
+        log = CallLog()
+        start = time.perf_counter()
+        if mode == "separate_runs":
+            with ThreadPoolExecutor(max_workers=len(variants)) as pool:
+                results = list(pool.map(lambda variant: run(log, [variant]), variants))
+            articles = sum(len(result["variants"]) for result in results)
+        else:
+            articles = len(run(log, variants)["variants"])
+        report[mode] = {
+            "articles": articles,
+            "llm_calls": len(log.intervals("llm")),
+            "research_llm_calls": len(log.intervals("llm", "queries")) + len(log.intervals("llm", "research")),
+            "searches": len(log.intervals("search")),
+            "wall_s": round(time.perf_counter() - start, 4),
+        }
+    report["llm_calls_saved"] = report["separate_runs"]["llm_calls"] - report["fan_out"]["llm_calls"]
+    report["searches_saved"] = report["separate_runs"]["searches"] - report["fan_out"]["searches"]
+    return report
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "p50_s": round(samples[len(samples) // 2], 4),
+        "p95_s": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "p99_s": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 4),
+        "max_s": round(samples[-1], 4),
+    }
+
+
+def bench_hedging(runs: int, primary_latency: float, primary_sigma: float, secondary_latency: float) -> Dict[str, Any]:
+    """
+    Research phases against a primary search provider with a heavy latency
+    tail, without and with hedging to a secondary provider. A research phase
+    waits for its slowest search, so the search tail sets its latency.
+    """
+    report: Dict[str, Any] = {
+        "scenario": "hedging",
+        "runs": runs,
+        "primary_latency": primary_latency,
+        "primary_sigma": primary_sigma,
+        "secondary_latency": secondary_latency,
+    }
+    llm = FakeLLM(latency={"default": Latency(0.01)})
+    for hedging in (False, True):
+        log = CallLog()
+        primary = FakeSearch(latency=Latency(primary_latency, primary_sigma, seed=1), log=log)
+        secondary = FakeSearch(latency=Latency(secondary_latency, 0.2, seed=2), log=log)
+        search = HedgedSearch(
+            [CallableProvider("primary", primary), CallableProvider("secondary", secondary)],
+            hedging=hedging,
+            min_samples=10,
+        )
+        wall_times = []
+        for run in range(runs):
+            start = time.perf_counter()
+            research_node({"topic": f"quantum computing breakthroughs {run}"}, llm=llm, search=search, quality_routing=False)
+            wall_times.append(time.perf_counter() - start)
+        metrics = search.metrics()
+        report["hedged" if hedging else "primary_only"] = {
+            "research": _percentiles(wall_times),
+            "searches": metrics["searches"],
+            "provider_calls": len(log.intervals("search")),
+            "hedged": metrics["hedged"],
+            "hedge_wins": metrics["hedge_wins"],
+            "hedge_delay_s": metrics["hedge_delay_s"],
+        }
+    for stat in ("p50_s", "p95_s", "max_s"):
+        report[f"research_{stat[:-2]}_speedup"] = round(
+            report["primary_only"]["research"][stat] / report["hedged"]["research"][stat], 3
+        )
+    report["extra_provider_calls"] = round(
+        report["hedged"]["provider_calls"] / report["hedged"]["searches"] - 1, 3
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="scenario", required=True)
+
+    research = subparsers.add_parser("research", help="speculative vs sequential research")
+    research.add_argument("--runs", type=int, default=5)
+    research.add_argument("--llm-latency", type=float, default=1.5)
+    research.add_argument("--search-latency", type=float, default=0.8)
+
+    routing = subparsers.add_parser("routing", help="per-node model routing with tier fallback")
+    routing.add_argument("--runs", type=int, default=10)
+    routing.add_argument("--slow-latency", type=float, default=0.4)
+    routing.add_argument("--fast-latency", type=float, default=0.05)
+    routing.add_argument("--budget", type=float, default=0.2)
+
+    batch = subparsers.add_parser("batch", help="per-topic vs batched query planning")
+    batch.add_argument("--topics", type=int, default=40)
+    batch.add_argument("--query-latency", type=float, default=0.3)
+    batch.add_argument("--batch-latency", type=float, default=0.8)
+
+    pipeline = subparsers.add_parser("pipeline", help="sequential vs section-pipelined writing/editing")
+    pipeline.add_argument("--runs", type=int, default=3)
+    pipeline.add_argument("--writer-latency", type=float, default=2.0)
+    pipeline.add_argument("--edit-latency", type=float, default=0.5)
+    pipeline.add_argument("--check-latency", type=float, default=0.5)
+
+    quality = subparsers.add_parser("quality", help="routing on research quality vs a linear graph")
+    quality.add_argument("--llm-latency", type=float, default=0.5)
+    quality.add_argument("--search-latency", type=float, default=0.2)
+
+    http = subparsers.add_parser("http", help="new connection per search vs pooled keep-alive client")
+    http.add_argument("--calls", type=int, default=400)
+    http.add_argument("--concurrency", type=int, default=16)
+    http.add_argument("--latency", type=float, default=0.02, help="stub server latency per request")
+    http.add_argument("--tls", action="store_true", help="serve HTTPS with a self-signed certificate (needs openssl)")
+
+    tracing = subparsers.add_parser("tracing", help="overhead of span tracing, sampled and unsampled")
+    tracing.add_argument("--runs", type=int, default=50)
+    tracing.add_argument("--sample-rate", type=float, default=0.1)
+
+    variants = subparsers.add_parser("variants", help="one run per article variant vs one research run fanned out")
+    variants.add_argument("--variants", default="short,medium,long", help="comma-separated variant names")
+    variants.add_argument("--llm-latency", type=float, default=0.5)
+    variants.add_argument("--search-latency", type=float, default=0.2)
+
+    hedging = subparsers.add_parser("hedging", help="research tail latency with and without hedged searches")
+    hedging.add_argument("--runs", type=int, default=40)
+    hedging.add_argument("--primary-latency", type=float, default=0.2, help="median latency of the primary provider")
+    hedging.add_argument("--primary-sigma", type=float, default=1.0, help="log-normal spread; larger means a heavier tail")
+    hedging.add_argument("--secondary-latency", type=float, default=0.3)
+
+    args = parser.parse_args()
+    if args.scenario == "research":
+        report = bench_research(args.runs, args.llm_latency, args.search_latency)
+    elif args.scenario == "routing":
+        report = bench_routing(args.runs, args.slow_latency, args.fast_latency, args.budget)
+    elif args.scenario == "batch":
+        report = bench_batch(args.topics, args.query_latency, args.batch_latency)
+    elif args.scenario == "pipeline":
+        report = bench_pipeline(args.runs, args.writer_latency, args.edit_latency, args.check_latency)
+    elif args.scenario == "quality":
+        report = bench_quality(args.llm_latency, args.search_latency)
+    elif args.scenario == "http":
+        report = bench_http(args.calls, args.concurrency, args.latency, args.tls)
+    elif args.scenario == "tracing":
+        report = bench_tracing(args.runs, args.sample_rate)
+    elif args.scenario == "variants":
+        report = bench_variants(args.variants.split(","), args.llm_latency, args.search_latency)
+    elif args.scenario == "hedging":
+        report = bench_hedging(args.runs, args.primary_latency, args.primary_sigma, args.secondary_latency)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
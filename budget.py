@@ -0,0 +1,185 @@
+"""
+Token budgeting for agent prompts.
+
+Every prompt is split into fixed instructions and variable sections
+(research, draft). The tokens left after the instructions are shared
+between the sections according to PROMPT_SECTION_SHARES; a section that
+needs less than its share hands the rest to the others. Sections over
+their allocation lose their lowest-value blocks (paragraphs or sources)
+until they fit. Every trim is reported so it can be stored in the run
+metadata.
+
+A section whose text the model's answer replaces (the draft of an editor
+rewrite or a fact-check) is kept whole: anything trimmed from it would be
+missing from the published article. The other sections share what it
+leaves, and a prompt whose whole sections alone are over budget raises
+PromptTooLarge.
+"""
+import re
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.prompts import PromptTemplate
+
+from config import MAX_TOKENS, PROMPT_SECTION_SHARES
+from sources import format_source_table
+from tools import estimate_tokens
+
+_HIGH_VALUE_HEADINGS = re.compile(r"summary|key findings|conclusion|introduction", re.IGNORECASE)
+
+
+class PromptTooLarge(Exception):
+    """Raised when the sections a prompt must keep whole do not fit its budget."""
+
+
+class Section:
+    """
+    A variable part of a prompt, made of blocks that each carry a value
+    score. A `whole` section is never trimmed.
+    """
+
+    def __init__(
+        self,
+        field: str,
+        kind: str,
+        blocks: List[Tuple[str, float]],
+        separator: str = "\n\n",
+        whole: bool = False,
+    ):
+        self.field = field
+        self.kind = kind
+        self.blocks = blocks
+        self.separator = separator
+        self.whole = whole
+
+    @classmethod
+    def from_markdown(cls, field: str, kind: str, text: str, whole: bool = False) -> "Section":
+        """
+        Splits markdown into paragraphs. Headings are kept longest, paragraphs
+        under summary/findings/introduction/conclusion headings come next, and
+        other paragraphs are valued by how early they appear.
+        """
+        paragraphs = [p for p in re.split(r"\n\s*\n", text or "") if p.strip()]
+        blocks = []
+        boosted = False
+        for index, paragraph in enumerate(paragraphs):
+            position_value = 1.0 - 0.5 * index / max(len(paragraphs), 1)
+            if paragraph.lstrip().startswith("#"):
+                boosted = bool(_HIGH_VALUE_HEADINGS.search(paragraph.split("\n", 1)[0]))
+                blocks.append((paragraph, 10.0))
+            else:
+                blocks.append((paragraph, position_value + (1.0 if boosted else 0.0)))
+        return cls(field, kind, blocks, whole=whole)
+
+    @classmethod
+    def from_sources(cls, field: str, kind: str, sources: List[Dict[str, Any]]) -> "Section":
+        """One block per source; sources found by more queries are worth more."""
+        blocks = [
+            (format_source_table([source]), len(source.get("queries", [])) - index / max(len(sources), 1))
+            for index, source in enumerate(sources)
+        ]
+        return cls(field, kind, blocks, separator="\n")
+
+    def text(self) -> str:
+        return self.separator.join(block for block, _ in self.blocks)
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.text())
+
+    def trim_to(self, allocation: int) -> Dict[str, Any]:
+        """
+        Drops the lowest-value blocks until the section fits `allocation` tokens.
+        A single remaining block that is still too long is truncated.
+        """
+        tokens_before = self.tokens()
+        kept = list(range(len(self.blocks)))
+        dropped = 0
+        for index in sorted(kept, key=lambda i: self.blocks[i][1]):
+            if len(kept) <= 1 or estimate_tokens(self.separator.join(self.blocks[i][0] for i in kept)) <= allocation:
+                break
+            kept.remove(index)
+            dropped += 1
+        self.blocks = [self.blocks[i] for i in kept]
+
+        truncated = False
+        if self.blocks and self.tokens() > allocation:
+            text, value = self.blocks[-1]
+            overflow_chars = (self.tokens() - allocation) * 4
+            self.blocks[-1] = (text[: max(len(text) - overflow_chars, 0)], value)
+            truncated = True
+
+        return {
+            "section": self.field,
+            "tokens_before": tokens_before,
+            "tokens_after": self.tokens(),
+            "blocks_dropped": dropped,
+            "truncated": truncated,
+        }
+
+
+def _allocate(sections: List[Section], available: int) -> Dict[str, int]:
+    """Shares `available` tokens between sections, redistributing unused shares."""
+    allocation = {}
+    pending = sorted(
+        sections,
+        key=lambda s: s.tokens() / PROMPT_SECTION_SHARES.get(s.kind, 1.0),
+    )
+    remaining = max(available, 0)
+    while pending:
+        section = pending.pop(0)
+        share = PROMPT_SECTION_SHARES.get(section.kind, 1.0)
+        total_share = share + sum(PROMPT_SECTION_SHARES.get(s.kind, 1.0) for s in pending)
+        fair = int(remaining * share / total_share)
+        allocation[section.field] = min(section.tokens(), fair)
+        remaining -= allocation[section.field]
+    return allocation
+
+
+def fit_prompt(
+    name: str,
+    template: PromptTemplate,
+    sections: List[Section],
+    budget: int = MAX_TOKENS,
+    **fixed: str,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Formats `template` so that the prompt stays within `budget` tokens.
+
+    `fixed` values (topic, ...) and `whole` sections are never trimmed; the
+    other `sections` are trimmed to their allocation. Returns the prompt and
+    a report for the run metadata.
+    """
+    instructions = template.format(**fixed, **{section.field: "" for section in sections})
+    available = budget - estimate_tokens(instructions)
+    whole = {section.field: section.tokens() for section in sections if section.whole}
+    if sum(whole.values()) > available:
+        raise PromptTooLarge(
+            f"{name}: {', '.join(whole)} needs {sum(whole.values())} tokens, "
+            f"{max(available, 0)} of the {budget} token budget are left after the instructions"
+        )
+    allocation = {
+        **whole,
+        **_allocate([section for section in sections if not section.whole], available - sum(whole.values())),
+    }
+
+    trimmed = []
+    for section in sections:
+        if section.tokens() > allocation[section.field]:
+            trimmed.append(section.trim_to(allocation[section.field]))
+
+    prompt = template.format(**fixed, **{section.field: section.text() for section in sections})
+    report = {
+        "prompt": name,
+        "budget": budget,
+        "prompt_tokens": estimate_tokens(prompt),
+        "instruction_tokens": estimate_tokens(instructions),
+        "allocation": allocation,
+        "trimmed": trimmed,
+    }
+    return prompt, report
+
+
+def record_budget(run_metadata: Dict[str, Any], report: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds a prompt's budget report to the run metadata."""
+    token_budget = dict(run_metadata.get("token_budget", {}))
+    token_budget[report["prompt"]] = report
+    return {**run_metadata, "token_budget": token_budget}
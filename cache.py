@@ -0,0 +1,179 @@
+import hashlib
+import json
+import re
+import time
+from datetime import datetime, timedelta
+from statistics import median
+from typing import Any, Dict, List, Optional
+
+from backends import SharedBackend, get_backend
+from config import CACHE_TTL, CACHE_MIN_TTL, CACHE_MAX_TTL
+
+_RELATIVE_DATE = re.compile(
+    r"(\d+)\s+(second|sec|minute|min|hour|hr|day|week|month|year)s?\s+ago",
+    re.IGNORECASE,
+)
+
+_UNIT_SECONDS = {
+    "second": 1,
+    "sec": 1,
+    "minute": 60,
+    "min": 60,
+    "hour": 3600,
+    "hr": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 30 * 86400,
+    "year": 365 * 86400,
+}
+
+_ABSOLUTE_DATE_FORMATS = ["%b %d, %Y", "%B %d, %Y", "%d %b %Y", "%d %B %Y", "%Y-%m-%d", "%Y-%m-%d %H:%M"]
+
+# How absolute_source_date writes a resolved date; parse_source_date reads it back
+_RESOLVED_DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def parse_source_date(value: Optional[str], fetched_at: datetime) -> Optional[datetime]:
+    """
+    Converts a Serper `date` field ("3 hours ago", "Mar 5, 2025", ...) into a
+    publish time. Relative dates are resolved against the time of the search.
+    """
+    if not value:
+        return None
+
+    match = _RELATIVE_DATE.search(value)
+    if match:
+        amount, unit = int(match.group(1)), match.group(2).lower()
+        return fetched_at - timedelta(seconds=amount * _UNIT_SECONDS[unit])
+
+    for fmt in _ABSOLUTE_DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def absolute_source_date(value: Optional[str], fetched_at: datetime) -> str:
+    """
+    A `date` field that stays correct after the search: relative dates are
+    resolved against `fetched_at`, anything unparseable is kept as it is.
+    """
+    if not value or not _RELATIVE_DATE.search(value):
+        return value or ""
+    return parse_source_date(value, fetched_at).strftime(_RESOLVED_DATE_FORMAT)
+
+
+def source_queries(result: Dict[str, Any]) -> List[str]:
+    """Returns the search queries behind a finished pipeline result."""
+    research = (result.get("run_metadata") or {}).get("research", {})
+    if research.get("queries"):
+        return research["queries"]
+    queries = []
+    for source in result.get("research_sources") or []:
+        queries.extend(q for q in source.get("queries", []) if q not in queries)
+    return queries
+
+
+def fingerprint_sources(sources: List[Dict[str, Any]]) -> str:
+    """Order-independent fingerprint of a source table, keyed on stable source IDs."""
+    ids = sorted({source["id"] for source in sources})
+    return hashlib.sha1("\n".join(ids).encode()).hexdigest()
+
+
+def compute_freshness_ttl(
+    items: List[Dict[str, Any]],
+    fetched_at: datetime,
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Estimates how long a generated article stays current, in seconds.
+
+    The typical gap between consecutive publish times is used as the expected
+    wait until the next new result appears. Stories whose newest result is
+    already old have cooled off, so half the age of the newest result is used
+    as a lower bound. The result is clamped to [CACHE_MIN_TTL, CACHE_MAX_TTL].
+    """
+    now = now or datetime.now()
+    published = sorted(
+        (d for d in (parse_source_date(item.get("date"), fetched_at) for item in items) if d),
+        reverse=True,
+    )
+    if not published:
+        return CACHE_TTL
+
+    newest_age = max((now - published[0]).total_seconds(), 0)
+    gaps = [
+        (newer - older).total_seconds()
+        for newer, older in zip(published, published[1:])
+        if newer > older
+    ]
+    typical_gap = median(gaps) if gaps else newest_age
+
+    ttl = max(typical_gap, newest_age / 2)
+    return int(min(max(ttl, CACHE_MIN_TTL), CACHE_MAX_TTL))
+
+
+class ArticleCache:
+    """
+    Cache of generated articles with per-entry expiry, stored in the shared
+    backend so that every replica sees the same entries.
+
+    Entries stay in the backend for `retention` seconds after they expire so
+    that they can be revalidated against fresh search results instead of
+    regenerated.
+    """
+
+    def __init__(self, backend: Optional[SharedBackend] = None, retention: float = CACHE_MAX_TTL):
+        self._backend = backend
+        self.retention = retention
+
+    @property
+    def backend(self) -> SharedBackend:
+        return self._backend or get_backend()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the entry for `key` (fresh or stale), or None."""
+        raw = self.backend.get(f"article:{key}")
+        return json.loads(raw) if raw else None
+
+    def is_fresh(self, key: str) -> bool:
+        entry = self.get(key)
+        return entry is not None and entry["expires_at"] > time.time()
+
+    def put(self, key: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Stores a finished pipeline result with an expiry derived from its sources."""
+        sources = result.get("research_sources") or []
+        ttl = compute_freshness_ttl(sources, _fetched_at(result))
+        entry = {
+            "result": result,
+            "queries": source_queries(result),
+            "fingerprint": fingerprint_sources(sources),
+            "ttl": ttl,
+            "expires_at": time.time() + ttl,
+        }
+        self._store(key, entry)
+        return entry
+
+    def renew(self, key: str, entry: Dict[str, Any], sources: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Extends a revalidated entry using the dates of the fresh search results."""
+        ttl = compute_freshness_ttl(sources, datetime.now())
+        entry = {**entry, "ttl": ttl, "expires_at": time.time() + ttl}
+        self._store(key, entry)
+        return entry
+
+    def _store(self, key: str, entry: Dict[str, Any]):
+        self.backend.set(f"article:{key}", json.dumps(entry), ttl=entry["ttl"] + self.retention)
+
+
+def _fetched_at(result: Dict[str, Any]) -> datetime:
+    timestamp = result.get("generation_timestamp")
+    if timestamp:
+        try:
+            return datetime.fromisoformat(timestamp)
+        except ValueError:
+            pass
+    return datetime.now()
+
+
+article_cache = ArticleCache()
@@ -0,0 +1,241 @@
+"""
+Cooperative cancellation and timeouts for graph runs.
+
+A CancellationToken is shared by everything one run does. LLM and search
+calls are wrapped so that they give up as soon as the token is cancelled
+(the user left, the client disconnected) or a deadline passes: the run
+deadline (AGENT_TIMEOUT), the node deadline (NODE_TIMEOUT) or the per-call
+timeout (LLM_CALL_TIMEOUT, SEARCH_CALL_TIMEOUT). An abandoned call finishes
+on its own daemon thread, but the run makes no further calls. The exception
+carries the abandoned InFlightCall, so the scheduler keeps the call's slot
+until it really ends.
+"""
+import contextvars
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from config import AGENT_TIMEOUT, CANCEL_POLL_INTERVAL, LLM_CALL_TIMEOUT, NODE_TIMEOUT, SEARCH_CALL_TIMEOUT
+
+
+class RunCancelled(Exception):
+    """
+    Raised inside a run once its token has been cancelled. When it abandons
+    a call, `call` is that call's InFlightCall, which is still running.
+    """
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(reason)
+        self.reason = reason
+        self.call: Optional["InFlightCall"] = None
+
+
+class RunTimedOut(RunCancelled):
+    """Raised when a run, node or call exceeds its time limit."""
+
+
+class CallTimedOut(RunTimedOut):
+    """
+    Raised when a single call (or node) exceeds its own timeout while the run
+    itself was not cancelled, so callers may treat it like any failed call.
+    """
+
+
+class InFlightCall:
+    """A call running on its own daemon thread, which may outlive its caller."""
+
+    def __init__(self):
+        self.finished = threading.Event()
+        self._callbacks: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    def add_done_callback(self, callback: Callable[[], Any]):
+        """Calls `callback` once the call has finished, straight away if it already has."""
+        with self._lock:
+            if not self.finished.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def finish(self):
+        with self._lock:
+            self.finished.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+def _abandon(call: InFlightCall, error: RunCancelled) -> RunCancelled:
+    error.call = call
+    return error
+
+
+# The token of the run a call belongs to, for waits outside `token.run` (rate limits)
+_current_token: contextvars.ContextVar[Optional["CancellationToken"]] = contextvars.ContextVar(
+    "cancel_token", default=None
+)
+
+
+def current_token() -> Optional["CancellationToken"]:
+    """The CancellationToken of the run this code is running for, if any."""
+    return _current_token.get()
+
+
+class CancellationToken:
+    """
+    Cancellation flag and deadline for one graph run. The run deadline starts
+    when the first node runs, so a token can be created ahead of time.
+    """
+
+    def __init__(self, timeout: Optional[float] = AGENT_TIMEOUT):
+        self.timeout = timeout
+        self.deadline: Optional[float] = None
+        self.reason: Optional[str] = None
+        self.timed_out = False
+        self._event = threading.Event()
+
+    def start(self):
+        if self.deadline is None and self.timeout is not None:
+            self.deadline = time.monotonic() + self.timeout
+
+    def cancel(self, reason: str = "cancelled", timed_out: bool = False):
+        if not self._event.is_set():
+            self.reason = reason
+            self.timed_out = timed_out
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: float) -> bool:
+        """Sleeps up to `timeout` seconds, waking early on cancellation. True if cancelled."""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(f"run exceeded {self.timeout}s", timed_out=True)
+        if self.cancelled:
+            raise (RunTimedOut if self.timed_out else RunCancelled)(self.reason)
+
+    def run(self, label: str, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Runs `fn` on a daemon thread and waits for it until it finishes, the
+        token is cancelled, or `timeout` / the run deadline passes.
+        """
+        self.raise_if_cancelled()
+        outcome: Dict[str, Any] = {}
+        call = InFlightCall()
+
+        def target():
+            _current_token.set(self)
+            try:
+                self.raise_if_cancelled()
+                outcome["value"] = fn(*args, **kwargs)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                call.finish()
+
+        # The call runs in this thread's context, so it belongs to the same trace span
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(target,), daemon=True, name=f"cancellable-{label}").start()
+        call_deadline = None if timeout is None else time.monotonic() + timeout
+        while not call.finished.wait(CANCEL_POLL_INTERVAL):
+            try:
+                self.raise_if_cancelled()
+            except RunCancelled as e:
+                raise _abandon(call, e)
+            if call_deadline is not None and time.monotonic() >= call_deadline:
+                raise _abandon(call, CallTimedOut(f"{label} exceeded {timeout}s"))
+
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["value"]
+
+    def wrap(self, name: str, node: Callable[[Dict[str, Any]], Dict[str, Any]], timeout: float = NODE_TIMEOUT):
+        """Returns `node` bounded by `timeout` (NODE_TIMEOUT); a timed-out node cancels the run."""
+
+        def cancellable_node(state):
+            self.start()
+            try:
+                return self.run(name, node, state, timeout=timeout)
+            except RunTimedOut as e:
+                self.cancel(str(e), timed_out=True)
+                raise
+
+        return cancellable_node
+
+
+class CancellableLLM:
+    """Chat model (or router) whose `invoke` honours a token and LLM_CALL_TIMEOUT."""
+
+    def __init__(self, llm, token: CancellationToken, timeout: float = LLM_CALL_TIMEOUT, label: str = "llm"):
+        self.llm = llm
+        self.token = token
+        self.timeout = timeout
+        self.label = label
+
+    def for_step(self, route: str) -> "CancellableLLM":
+        for_step = getattr(self.llm, "for_step", None)
+        if for_step is None:
+            return self
+        return CancellableLLM(for_step(route), self.token, self.timeout, label=f"llm:{route}")
+
+    def invoke(self, prompt, **kwargs):
+        return self.token.run(self.label, self.llm.invoke, prompt, timeout=self.timeout, **kwargs)
+
+    def stream(self, prompt, **kwargs):
+        """Streams chunks from a producer thread, giving up on cancellation or timeout."""
+        from routing import stream_chunks  # routing waits on the current token, so it imports this module
+
+        self.token.raise_if_cancelled()
+        chunks: queue.Queue = queue.Queue()
+        end = object()
+        call = InFlightCall()
+
+        def produce():
+            _current_token.set(self.token)
+            try:
+                for chunk in stream_chunks(self.llm, prompt, **kwargs):
+                    if self.token.cancelled:
+                        return
+                    chunks.put(chunk)
+            except BaseException as e:
+                chunks.put(e)
+            finally:
+                chunks.put(end)
+                call.finish()
+
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(produce,), daemon=True, name=f"cancellable-{self.label}").start()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                item = chunks.get(timeout=CANCEL_POLL_INTERVAL)
+            except queue.Empty:
+                try:
+                    self.token.raise_if_cancelled()
+                except RunCancelled as e:
+                    raise _abandon(call, e)
+                if time.monotonic() >= deadline:
+                    raise _abandon(call, CallTimedOut(f"{self.label} exceeded {self.timeout}s"))
+                continue
+            if item is end:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class CancellableSearch:
+    """News search callable that honours a token and SEARCH_CALL_TIMEOUT."""
+
+    def __init__(self, search, token: CancellationToken, timeout: float = SEARCH_CALL_TIMEOUT):
+        self.search = search
+        self.token = token
+        self.timeout = timeout
+
+    def __call__(self, query: str, **options):
+        return self.token.run(f"search:{query}", self.search, query, timeout=self.timeout, **options)
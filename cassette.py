@@ -0,0 +1,285 @@
+"""
+Record/replay of LLM and search I/O.
+
+In record mode every `invoke` on the chat models and every news search is
+captured, with its latency, into one JSON cassette per run. In replay mode
+a graph is driven entirely from a cassette, optionally sleeping for the
+recorded latencies, so a slow or bad run can be profiled and regression
+tested offline.
+
+Set NEWSGEN_CASSETTE_MODE=record to record every run of the app or API
+into CASSETTE_DIR, or NEWSGEN_CASSETTE_MODE=replay with NEWSGEN_CASSETTE
+pointing at a cassette to serve every run from it. From the command line:
+    python cassette.py record "quantum computing"
+    python cassette.py replay cassettes/<file>.json [--realtime]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from config import CASSETTE_DIR
+from routing import stream_chunks
+
+
+def _prompt_hash(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode()).hexdigest()
+
+
+class Cassette:
+    """The recorded LLM and search interactions of one run."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        data: Optional[Dict[str, Any]] = None,
+        output_dir: str = CASSETTE_DIR,
+    ):
+        self.path = path
+        self.output_dir = output_dir
+        self.started_at = datetime.now()
+        self.data = data or {
+            "version": 1,
+            "created_at": self.started_at.isoformat(),
+            "topic": None,
+            "nodes": [],
+            "llm": [],
+            "search": [],
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with open(path) as f:
+            return cls(path, json.load(f))
+
+    def wrap(self, name: str, node: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """Returns `node` with its topic and duration recorded under `name`."""
+
+        def recorded_node(state):
+            if self.data["topic"] is None and state.get("topic"):
+                self.data["topic"] = state["topic"]
+            started = time.perf_counter()
+            try:
+                return node(state)
+            finally:
+                self.append("nodes", {"node": name, "duration_s": round(time.perf_counter() - started, 4)})
+
+        return recorded_node
+
+    def append(self, kind: str, record: Dict[str, Any]):
+        with self._lock:
+            self.data[kind].append(record)
+            self.write()
+
+    def write(self) -> str:
+        """Writes (or rewrites) the cassette file and returns its path."""
+        if self.path is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            slug = re.sub(r"[^a-z0-9]+", "_", (self.data["topic"] or "").lower()).strip("_")[:40] or "run"
+            name = f"{self.started_at.strftime('%Y%m%d_%H%M%S_%f')}_{slug}.json"
+            self.path = os.path.join(self.output_dir, name)
+        with open(self.path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        return self.path
+
+
+class RecordingModel:
+    """Wraps a chat model and records each prompt, response and latency."""
+
+    def __init__(self, model, cassette: Cassette, name: str):
+        self.model = model
+        self.cassette = cassette
+        self.name = name
+
+    def invoke(self, prompt, **kwargs):
+        prompt_text = prompt if isinstance(prompt, str) else str(prompt)
+        start = time.perf_counter()
+        response = self.model.invoke(prompt, **kwargs)
+        self.cassette.append("llm", {
+            "model": self.name,
+            "prompt_sha1": _prompt_hash(prompt_text),
+            "prompt": prompt_text,
+            "response": response.content,
+            "latency_s": round(time.perf_counter() - start, 4),
+            "started_at": datetime.now().isoformat(),
+        })
+        return response
+
+    def stream(self, prompt, **kwargs):
+        prompt_text = prompt if isinstance(prompt, str) else str(prompt)
+        start = time.perf_counter()
+        content = ""
+        for chunk in stream_chunks(self.model, prompt, **kwargs):
+            content += chunk.content
+            yield chunk
+        self.cassette.append("llm", {
+            "model": self.name,
+            "prompt_sha1": _prompt_hash(prompt_text),
+            "prompt": prompt_text,
+            "response": content,
+            "latency_s": round(time.perf_counter() - start, 4),
+            "started_at": datetime.now().isoformat(),
+        })
+
+
+class RecordingSearch:
+    """Wraps a news search callable and records each query, result and latency."""
+
+    def __init__(self, search, cassette: Cassette):
+        self.search = search
+        self.cassette = cassette
+
+    def __call__(self, query: str, **options) -> List[Dict[str, Any]]:
+        start = time.perf_counter()
+        try:
+            items = self.search(query, **options)
+        except Exception as e:
+            self.cassette.append("search", {
+                "query": query,
+                **options,
+                "error": str(e),
+                "latency_s": round(time.perf_counter() - start, 4),
+            })
+            raise
+        self.cassette.append("search", {
+            "query": query,
+            **options,
+            "items": items,
+            "latency_s": round(time.perf_counter() - start, 4),
+        })
+        return items
+
+
+def recording_model_factory(cassette: Cassette, model_factory):
+    """Wraps a ModelRouter model factory so every model it builds is recorded."""
+
+    def factory(model: str, temperature: float):
+        return RecordingModel(model_factory(model, temperature), cassette, model)
+
+    return factory
+
+
+class ReplayLLM:
+    """
+    Serves recorded responses. Prompts are matched by hash; a prompt that was
+    not recorded (e.g. after a prompt change) gets the next unused response in
+    recorded order and is counted in `mismatches`.
+    """
+
+    def __init__(self, cassette: Cassette, realtime: bool = False):
+        self.records = list(cassette.data["llm"])
+        self.realtime = realtime
+        self.mismatches = 0
+        self._used = set()
+        self._lock = threading.Lock()
+
+    def _take(self, prompt_sha1: str) -> Dict[str, Any]:
+        with self._lock:
+            unused = [i for i in range(len(self.records)) if i not in self._used]
+            if not unused:
+                raise LookupError("Cassette has no more recorded LLM responses")
+            match = next((i for i in unused if self.records[i]["prompt_sha1"] == prompt_sha1), None)
+            if match is None:
+                self.mismatches += 1
+                match = unused[0]
+            self._used.add(match)
+            return self.records[match]
+
+    def invoke(self, prompt, **kwargs) -> AIMessage:
+        prompt_text = prompt if isinstance(prompt, str) else str(prompt)
+        record = self._take(_prompt_hash(prompt_text))
+        if self.realtime:
+            time.sleep(record["latency_s"])
+        return AIMessage(content=record["response"])
+
+    def stream(self, prompt, **kwargs):
+        """Replays a response line by line, spreading its latency over the lines."""
+        prompt_text = prompt if isinstance(prompt, str) else str(prompt)
+        record = self._take(_prompt_hash(prompt_text))
+        lines = record["response"].splitlines(keepends=True) or [""]
+        for line in lines:
+            if self.realtime:
+                time.sleep(record["latency_s"] / len(lines))
+            yield AIMessageChunk(content=line)
+
+
+class ReplaySearch:
+    """
+    Serves recorded search results by query and search window, re-raising
+    recorded failures. Cassettes recorded without windows match any window.
+    """
+
+    def __init__(self, cassette: Cassette, realtime: bool = False):
+        self.records: Dict[tuple, List[Dict[str, Any]]] = {}
+        for record in cassette.data["search"]:
+            self.records.setdefault((record["query"], record.get("tbs")), []).append(record)
+        self.realtime = realtime
+        self._lock = threading.Lock()
+
+    def __call__(self, query: str, **options) -> List[Dict[str, Any]]:
+        with self._lock:
+            recorded = self.records.get((query, options.get("tbs"))) or self.records.get((query, None))
+            if not recorded:
+                raise LookupError(f"Cassette has no recorded search for '{query}'")
+            record = recorded.pop(0) if len(recorded) > 1 else recorded[0]
+        if self.realtime:
+            time.sleep(record["latency_s"])
+        if "error" in record:
+            raise RuntimeError(record["error"])
+        return record["items"]
+
+
+def replay_backends(cassette: Cassette, realtime: bool = False) -> Dict[str, Any]:
+    """Graph options (`llm`, `search`) that drive create_enhanced_graph from `cassette`."""
+    return {"llm": ReplayLLM(cassette, realtime), "search": ReplaySearch(cassette, realtime)}
+
+
+def main():
+    from graph import create_enhanced_graph
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser("record", help="run the real pipeline and record a cassette")
+    record.add_argument("topic")
+    record.add_argument("--temperature", type=float, default=0.7)
+    replay = subparsers.add_parser("replay", help="run the pipeline from a cassette")
+    replay.add_argument("cassette")
+    replay.add_argument("--realtime", action="store_true", help="reproduce the recorded latencies")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        cassette = Cassette()
+        graph = create_enhanced_graph(temperature=args.temperature, cassette=cassette)
+        graph.invoke({"topic": args.topic})
+        print(cassette.path)
+        return
+
+    cassette = Cassette.load(args.cassette)
+    backends = replay_backends(cassette, args.realtime)
+    graph = create_enhanced_graph(**backends, archive=False)
+    timings = {}
+    last = time.perf_counter()
+    for chunk in graph.stream({"topic": cassette.data.get("topic", "")}):
+        now = time.perf_counter()
+        for node in chunk:
+            timings[node] = round(now - last, 4)
+        last = now
+    print(json.dumps({
+        "cassette": args.cassette,
+        "realtime": args.realtime,
+        "recorded_node_seconds": {n["node"]: n["duration_s"] for n in cassette.data.get("nodes", [])},
+        "replayed_node_seconds": timings,
+        "prompt_mismatches": backends["llm"].mismatches,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,11 +11,105 @@ print(SERPER_API_KEY)
 # --- MODEL SETTINGS ---
 MODEL_NAME = "gemini-2.5-flash"
 DEFAULT_TEMPERATURE = 0.3
-MAX_TOKENS = 8192
+MAX_TOKENS = 8192  # token budget for every formatted prompt (see budget.py)
+PROMPT_SECTION_SHARES = {"research": 0.5, "draft": 0.5}  # split of the budget left after instructions
+
+# --- MODEL ROUTING ---
+# Tiers are ordered from fastest to most capable; cost is USD per 1K tokens (prompt + output).
+MODEL_TIERS = {
+    "fast": {"model": "gemini-2.5-flash-lite", "cost_per_1k_tokens": 0.0002},
+    "standard": {"model": MODEL_NAME, "cost_per_1k_tokens": 0.0015},
+}
+
+# One route per node or sub-step. A temperature of None uses the temperature chosen in the UI.
+# When the moving average of a route's latency (seconds) or cost (USD per call) exceeds its
+# budget, calls go to the fallback tier until a periodic probe finds the primary within budget.
+MODEL_ROUTES = {
+    "research.queries": {"tier": "fast", "temperature": 0.2, "latency_budget": 10, "cost_budget": 0.001, "fallback": None},
+    "research.report": {"tier": "standard", "temperature": None, "latency_budget": 60, "cost_budget": 0.02, "fallback": "fast"},
+    "writer": {"tier": "standard", "temperature": None, "latency_budget": 90, "cost_budget": 0.02, "fallback": "fast"},
+    "editor": {"tier": "standard", "temperature": None, "latency_budget": 90, "cost_budget": 0.02, "fallback": "fast"},
+    "fact_checker": {"tier": "standard", "temperature": 0.1, "latency_budget": 90, "cost_budget": 0.02, "fallback": "fast"},
+}
+ROUTE_EMA_ALPHA = 0.3
+ROUTE_PROBE_EVERY = 5  # while on fallback, send every Nth call to the primary tier
 
 # --- CACHING SETTINGS ---
-CACHE_TTL = 3600  # 1 hour in seconds
+CACHE_TTL = 3600  # 1 hour in seconds, used when sources carry no usable dates
+CACHE_MIN_TTL = 300  # 5 minutes, floor for fast-moving stories
+CACHE_MAX_TTL = 86400  # 24 hours, ceiling for slow topics
+CACHE_MAX_ENTRIES = 1024  # in-memory backend only; per key namespace, unless listed below
+CACHE_NAMESPACE_MAX_ENTRIES = {  # separate LRUs, so heavy search traffic cannot evict cached articles
+    "article": 1024,
+    "search": 4096,
+    "search-stale": 4096,
+}
 ENABLE_CACHING = True
+ENABLE_CACHE_REVALIDATION = True  # re-run searches only and reuse the article if unchanged
+
+# --- SHARED BACKEND (multi-replica deployments) ---
+# "" or "memory://" keeps state per process; "sqlite:///path/to/state.db" shares it between
+# replicas on one host or a shared volume; "redis://host:6379/0" shares it across hosts.
+SHARED_BACKEND_URL = os.environ.get("SHARED_BACKEND_URL", "")
+SEARCH_CACHE_TTL = 300  # seconds; keep at or below CACHE_MIN_TTL so revalidation sees new results
+RATE_LIMITS = {  # token buckets shared by all replicas: requests per second and burst size
+    "serper": {"rate": 5.0, "capacity": 10},
+    "gemini": {"rate": 2.0, "capacity": 10},
+}
+RATE_LIMIT_MAX_WAIT = 60  # seconds to wait for a token before failing the call
+RUN_LOCK_POLL_INTERVAL = 1.0  # seconds between checks while another replica generates the same article
+
+# --- SEARCH HTTP CLIENT (see search_client.py) ---
+SEARCH_CLIENT = os.environ.get("NEWSGEN_SEARCH_CLIENT", "pooled")  # "pooled" (shared keep-alive pool) or "langchain" (GoogleSerperAPIWrapper)
+SERPER_BASE_URL = os.environ.get("SERPER_BASE_URL", "https://google.serper.dev")
+SEARCH_MAX_CONNECTIONS = 20  # concurrent connections to the search host per process (per event loop for async calls)
+SEARCH_MAX_KEEPALIVE = 20  # idle connections kept open for reuse; below the concurrency, connections churn
+SEARCH_KEEPALIVE_EXPIRY = 30.0  # seconds an idle connection stays open
+SEARCH_CONNECT_TIMEOUT = 5.0  # seconds
+SEARCH_READ_TIMEOUT = 10.0  # seconds; keep connect + read below SEARCH_CALL_TIMEOUT
+SEARCH_POOL_TIMEOUT = 10.0  # seconds to wait for a free connection when all are busy
+SEARCH_CONNECT_RETRIES = 1  # retries of failed connection attempts (never of sent requests)
+
+# --- SEARCH PROVIDERS AND HEDGING (see search_providers.py) ---
+# Primary first; the others are hedges, tried in order: "serper", "stale_cache" (earlier live results
+# for the same query) and "archive" (sources of archived articles, skipped when ENABLE_ARCHIVE is off)
+SEARCH_PROVIDERS = os.environ.get("NEWSGEN_SEARCH_PROVIDERS", "serper,stale_cache,archive").split(",")
+ENABLE_SEARCH_HEDGING = os.environ.get("NEWSGEN_SEARCH_HEDGING", "1") != "0"
+SEARCH_HEDGE_PERCENTILE = 0.9  # a search still unanswered after this percentile of recent primary latencies is hedged
+SEARCH_HEDGE_MIN_SAMPLES = 20  # recent primary latencies needed before the percentile is trusted
+SEARCH_HEDGE_DEFAULT_DELAY = 2.0  # seconds; hedge delay until there are enough samples
+SEARCH_HEDGE_MIN_DELAY = 0.25  # seconds; floor so a fast primary is not hedged on jitter
+SEARCH_HEDGE_WINDOW = 200  # recent latencies kept per provider
+SEARCH_HEDGE_WORKERS = 32  # threads running provider calls, shared by all runs
+SEARCH_STALE_TTL = 86400  # seconds live results are kept for the stale_cache fallback
+
+# --- RESEARCH SETTINGS ---
+ENABLE_SPECULATIVE_SEARCH = True  # search the raw topic while the LLM generates queries
+SPECULATIVE_QUERY_SUFFIXES = [" latest news"]  # deterministic variants searched speculatively
+SPECULATIVE_REDUNDANCY_THRESHOLD = 0.75  # term overlap above which an LLM query is skipped
+SEARCH_CONCURRENCY = 5
+QUERY_BATCH_SIZE = 20  # topics planned per LLM call in batch mode (batch.py)
+BATCH_CONCURRENCY = 4  # articles generated in parallel in batch mode
+ENABLE_QUALITY_ROUTING = True  # route on research quality: retry with a wider window, fail fast, skip fact-checking
+SEARCH_WINDOWS = ["qdr:d", "qdr:w", "qdr:m"]  # Serper time filters (tbs), widened in order when research is thin
+SEARCH_WINDOW_AGES_H = {"qdr:h": 1, "qdr:d": 24, "qdr:w": 168, "qdr:m": 744, "qdr:y": 8784}  # span of each time filter
+RESEARCH_MIN_SOURCES = 3  # fewer unique sources widens the search window and retries research
+RESEARCH_WINDOW_AGE_SLACK = 1.5  # sources older than this multiple of the window's span do not count as fresh for it
+RESEARCH_MAX_ERROR_RATE = 0.5  # above this share of failed searches, thin research fails fast instead of retrying
+FACT_CHECK_MIN_SOURCES = 2  # with fewer unique sources there is nothing to check against; fact-checking is skipped
+TITLE_SIMILARITY_THRESHOLD = 0.8  # word overlap above which two headlines are one story
+TRACKING_PARAM_PREFIXES = ("utm_", "mc_", "pk_", "_hs")
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "yclid", "msclkid", "igshid", "ocid", "cmpid", "cmp",
+    "ref", "ref_src", "refsrc", "smid", "smtyp", "sr_share", "spm", "_ga", "guccounter",
+}
+
+# --- EDITING SETTINGS ---
+EDITOR_MODE = "patch"  # "patch" = targeted replacements applied locally, "rewrite" = full edited article
+EDITOR_MAX_PATCHES = 40  # more edits than this falls back to a full rewrite
+ENABLE_SECTION_PIPELINE = False  # edit (and fact-check) each section while the writer streams the next
+PIPELINE_FACT_CHECK_SECTIONS = True  # in pipelined mode, also fact-check per section instead of the whole article
+PIPELINE_WORKERS = 4  # concurrent section edits (and, separately, fact-checks)
 
 # --- STREAMING SETTINGS ---
 ENABLE_STREAMING = True
@@ -28,25 +122,88 @@ BLOG_POST = "blog_post"
 EDITED_POST = "edited_post"
 FINAL_POST = "final_post"
 
+# --- SCHEDULING (see scheduler.py) ---
+SCHEDULER_CAPACITY = {"llm": 16, "search": 16}  # concurrent calls per resource in this process
+SCHEDULER_USER_CONCURRENCY = 6  # concurrent calls per user and resource
+SCHEDULER_INTERACTIVE_RESERVE = 4  # slots per resource that batch/prewarm calls may not use
+SCHEDULER_POLL_INTERVAL = 0.1  # seconds between cancellation checks while queued
+
+# --- API SETTINGS ---
+API_WORKER_THREADS = 32  # concurrent graph runs per API process
+
 # --- AGENT CONFIGURATION ---
-AGENT_TIMEOUT = 300  # 5 minutes
+AGENT_TIMEOUT = 300  # 5 minutes per run
+NODE_TIMEOUT = 180  # per agent node
+VARIANT_NODE_TIMEOUT = 240  # per variant branch (writer, editor and fact-checker); below AGENT_TIMEOUT, which still bounds the run
+LLM_CALL_TIMEOUT = 120  # per llm.invoke
+SEARCH_CALL_TIMEOUT = 20  # per news search
+CANCEL_POLL_INTERVAL = 0.1  # seconds between cancellation checks while a call is in flight
 MAX_RETRIES = 3
 
+# --- MEMORY PROFILING (opt-in) ---
+ENABLE_MEMORY_PROFILING = os.environ.get("NEWSGEN_MEMORY_PROFILING") == "1"
+MEMORY_PROFILE_DIR = "profiles"
+MEMORY_PROFILE_TOP_SITES = 10  # allocation sites listed per node
+MEMORY_PROFILE_TRACE_FRAMES = 1  # tracemalloc frames kept per allocation
+MEMORY_PROFILE_SAMPLE_INTERVAL = 0.05  # seconds between RSS samples while a node runs
+
+# --- RECORD/REPLAY (opt-in, see cassette.py) ---
+CASSETTE_MODE = os.environ.get("NEWSGEN_CASSETTE_MODE", "")  # "", "record" or "replay"
+CASSETTE_DIR = "cassettes"
+CASSETTE_PATH = os.environ.get("NEWSGEN_CASSETTE", "")  # cassette served in replay mode
+CASSETTE_REALTIME = os.environ.get("NEWSGEN_CASSETTE_REALTIME") == "1"  # replay with recorded latencies
+
+# --- ARCHIVE (see archive.py) ---
+ENABLE_ARCHIVE = os.environ.get("NEWSGEN_ARCHIVE", "1") != "0"  # store every completed run for search and reuse
+ARCHIVE_PATH = os.environ.get("NEWSGEN_ARCHIVE_PATH", "archive/articles.db")
+ARCHIVE_SUGGESTIONS = 3  # archived matches offered before a new run starts
+ARCHIVE_SEARCH_CANDIDATES = 2000  # most recent matches ranked per search, bounding the cost of common terms
+
+# --- TRACING (opt-in, see tracing.py) ---
+TRACE_EXPORTER = os.environ.get("NEWSGEN_TRACE_EXPORTER", "")  # "" (off), "file" (JSON lines) or "otlp" (OTLP/HTTP JSON)
+TRACE_SAMPLE_RATE = float(os.environ.get("NEWSGEN_TRACE_SAMPLE_RATE", "0.1"))  # share of runs traced; the rest are not instrumented
+TRACE_PATH = os.environ.get("NEWSGEN_TRACE_PATH", "traces/traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.environ.get("NEWSGEN_TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = "ai-news-generator"
+TRACE_EXPORT_QUEUE = 1000  # finished traces waiting for export; beyond this they are dropped instead of slowing runs
+TRACE_EXPORT_BATCH = 50  # traces sent per export request
+TRACE_EXPORT_TIMEOUT = 5.0  # seconds per export request
+
+# --- ARTICLE VARIANTS (see variants.py) ---
+# Target lengths and tones a variant can ask for, e.g. "short", "formal" or "long:executive"
+ARTICLE_LENGTHS = {
+    "short": "about 300-400 words in 3-4 short paragraphs, with at most two subheadings",
+    "medium": "about 700-900 words in 5-6 paragraphs with subheadings",
+    "long": "about 1,500-2,000 words of in-depth analysis in 8 or more paragraphs with subheadings",
+}
+ARTICLE_TONES = {
+    "tech-savvy": "slightly informal and tech-savvy, accessible to general readers",
+    "formal": "formal and neutral, like a wire-service news report",
+    "casual": "casual and conversational, like a newsletter written for friends",
+    "executive": "concise and business-focused, leading with the impact on companies and markets",
+}
+DEFAULT_ARTICLE_TONE = "tech-savvy"  # tone of variants that only name a length
+MAX_ARTICLE_VARIANTS = 6  # variants per run, each a parallel writer/editor/fact-checker branch (see SCHEDULER_USER_CONCURRENCY)
+
 # --- UI SETTINGS ---
 PROGRESS_UPDATE_INTERVAL = 0.1  # seconds
-DEFAULT_ARTICLE_LENGTH = "medium"  # short, medium, long
+DEFAULT_ARTICLE_LENGTH = "medium"  # length of variants that only name a tone: short, medium, long
 
 # --- ERROR MESSAGES ---
 ERROR_MESSAGES = {
     "api_key_missing": "API keys not configured. Please check your .env file.",
     "generation_failed": "Failed to generate content. Please try again.",
     "timeout_error": "Generation took too long. Please try with a simpler topic.",
+    "run_cancelled": "Generation was cancelled before it finished.",
+    "research_failed": "No usable news sources were found, so no article was written. Try a broader or more current topic.",
     "rate_limit": "API rate limit reached. Please wait a moment and try again."
 }
 
 # --- SUCCESS MESSAGES ---
 SUCCESS_MESSAGES = {
     "cache_hit": "🚀 Found cached result! Loading instantly...",
+    "cache_revalidated": "♻️ No new sources since the last run. Reusing the cached article.",
+    "archive_reused": "📚 Loaded an archived article.",
     "generation_complete": "✅ Article generated successfully!",
     "streaming_complete": "🎉 All agents have completed their work!"
 }
\ No newline at end of file
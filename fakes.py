@@ -0,0 +1,368 @@
+"""
+Offline stand-ins for Gemini and Serper with configurable latency.
+
+Used by benchmark.py and loadtest.py to exercise the real pipeline code
+without API keys or quota. StubSerperServer serves FakeSearch results over
+local HTTP(S) for benchmarking search clients, and StubCollector receives
+exported traces.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class Latency:
+    """
+    Log-normal latency model: `median` seconds, spread controlled by `sigma`.
+    A sigma of 0 gives a constant latency.
+    """
+
+    def __init__(self, median: float, sigma: float = 0.0, seed: Optional[int] = None):
+        self.median = median
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median
+        with self._lock:
+            return self._random.lognormvariate(math.log(self.median), self.sigma)
+
+
+class CallLog:
+    """Thread-safe record of (kind, label, start, end) call intervals."""
+
+    def __init__(self):
+        self.calls: List[Tuple[str, str, float, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, label: str, start: float, end: float):
+        with self._lock:
+            self.calls.append((kind, label, start, end))
+
+    def intervals(self, kind: str, label: Optional[str] = None) -> List[Tuple[float, float]]:
+        with self._lock:
+            return [
+                (start, end) for k, l, start, end in self.calls
+                if k == kind and (label is None or l == label)
+            ]
+
+    def clear(self):
+        with self._lock:
+            self.calls.clear()
+
+
+_TOPIC_PATTERN = re.compile(r'topic:? "([^"]+)"', re.IGNORECASE)
+
+
+def prompt_kind(prompt: str) -> str:
+    """Classifies a pipeline prompt so fakes can answer in the expected shape."""
+    if "For each numbered topic below" in prompt:
+        return "query_batch"
+    if "Generate 3-5 different search queries" in prompt:
+        return "queries"
+    if "senior research analyst" in prompt:
+        return "research"
+    if "skilled tech content writer" in prompt:
+        return "writer"
+    if "experienced content editor" in prompt:
+        return "editor_patch" if '{"edits": [' in prompt else "editor"
+    if "Article section to fact-check" in prompt:
+        return "fact_checker_section"
+    if "meticulous fact-checker" in prompt:
+        return "fact_checker"
+    return "other"
+
+
+def default_responder(prompt: str) -> str:
+    """Produces plausible output for each pipeline prompt."""
+    kind = prompt_kind(prompt)
+    match = _TOPIC_PATTERN.search(prompt)
+    topic = match.group(1) if match else "the topic"
+
+    if kind == "queries":
+        return "\n".join([
+            topic,
+            f"{topic} latest developments",
+            f"{topic} industry impact last month",
+            f"{topic} expert analysis 2025",
+        ])
+
+    if kind == "query_batch":
+        topics = re.findall(r"^(\d+)\. (.+)$", prompt, re.MULTILINE)
+        return json.dumps({
+            number: [topic, f"{topic} latest developments", f"{topic} expert analysis 2025"]
+            for number, topic in topics
+        })
+
+    if kind == "fact_checker_section":
+        # Echo the section back, as a fact-check with nothing to correct
+        match = re.search(r"Article section to fact-check[^\n]*\n(.*?)\n\nResearch Sources:", prompt, re.DOTALL)
+        return match.group(1) if match else ""
+
+    if kind == "editor_patch":
+        first = re.search(r"Sentence 1 about .+? in section 1\.", prompt)
+        if not first:
+            return json.dumps({"edits": []})
+        edit = {"find": first.group(0), "replace": "To start, s" + first.group(0)[1:], "reason": "Stronger hook"}
+        return json.dumps({"edits": [edit]})
+
+    paragraphs = [
+        f"## Section {i + 1}\n\n"
+        + " ".join(f"Sentence {j + 1} about {topic} in section {i + 1}." for j in range(6))
+        for i in range(5)
+    ]
+    return f"# {kind.replace('_', ' ').title()} on {topic}\n\n" + "\n\n".join(paragraphs)
+
+
+def realistic_llm_latency(scale: float = 1.0, seed: Optional[int] = None) -> Dict[str, Latency]:
+    """
+    Per-prompt latency profile resembling Gemini Flash: short query planning,
+    long-form generation for the other steps, with a heavy right tail.
+    """
+    def offset(n: int) -> Optional[int]:
+        return None if seed is None else seed + n
+
+    return {
+        "queries": Latency(1.2 * scale, 0.3, offset(1)),
+        "query_batch": Latency(3.0 * scale, 0.3, offset(8)),
+        "research": Latency(8.0 * scale, 0.35, offset(2)),
+        "writer": Latency(12.0 * scale, 0.35, offset(3)),
+        "editor": Latency(10.0 * scale, 0.35, offset(4)),
+        "editor_patch": Latency(2.5 * scale, 0.35, offset(7)),
+        "fact_checker": Latency(10.0 * scale, 0.35, offset(5)),
+        "fact_checker_section": Latency(3.0 * scale, 0.35, offset(9)),
+        "default": Latency(5.0 * scale, 0.35, offset(6)),
+    }
+
+
+def realistic_search_latency(scale: float = 1.0, seed: Optional[int] = None) -> Latency:
+    """Serper-like latency: usually well under a second, occasionally several."""
+    return Latency(0.7 * scale, 0.5, seed)
+
+
+class FakeLLM:
+    """
+    Minimal chat-model stand-in exposing `invoke`, with per-prompt-kind latency.
+    """
+
+    def __init__(
+        self,
+        latency: Optional[Dict[str, Latency]] = None,
+        responder: Callable[[str], str] = default_responder,
+        log: Optional[CallLog] = None,
+        model: str = "fake-llm",
+    ):
+        self.latency = latency or {}
+        self.responder = responder
+        self.log = log or CallLog()
+        self.model = model
+
+    def _latency_for(self, kind: str) -> float:
+        model = self.latency.get(kind) or self.latency.get("default")
+        return model.sample() if model else 0.0
+
+    def invoke(self, prompt, **kwargs) -> AIMessage:
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        kind = prompt_kind(prompt)
+        start = time.perf_counter()
+        time.sleep(self._latency_for(kind))
+        content = self.responder(prompt)
+        self.log.record("llm", kind, start, time.perf_counter())
+        return AIMessage(content=content)
+
+    def stream(self, prompt, **kwargs):
+        """Yields the answer line by line, spreading the sampled latency over the lines."""
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        kind = prompt_kind(prompt)
+        start = time.perf_counter()
+        latency = self._latency_for(kind)
+        lines = self.responder(prompt).splitlines(keepends=True) or [""]
+        for line in lines:
+            time.sleep(latency / len(lines))
+            yield AIMessageChunk(content=line)
+        self.log.record("llm", kind, start, time.perf_counter())
+
+
+class FakeSearch:
+    """
+    Serper stand-in returning deterministic news items for a query.
+    Overlapping queries share part of their results, like real news search.
+    Searches in `empty_windows` (e.g. "qdr:d") find nothing, like a quiet topic.
+    """
+
+    def __init__(
+        self,
+        latency: Optional[Latency] = None,
+        log: Optional[CallLog] = None,
+        empty_windows: Tuple[str, ...] = (),
+    ):
+        self.latency = latency or Latency(0.0)
+        self.log = log or CallLog()
+        self.empty_windows = empty_windows
+
+    def __call__(self, query: str, tbs: Optional[str] = None) -> List[Dict[str, str]]:
+        start = time.perf_counter()
+        time.sleep(self.latency.sample())
+        if tbs in self.empty_windows:
+            self.log.record("search", query, start, time.perf_counter())
+            return []
+        words = [w for w in re.findall(r"\w+", query.lower()) if len(w) > 3] or [query.lower()]
+        items = []
+        for i, word in enumerate(words[:5]):
+            digest = hashlib.md5(word.encode()).hexdigest()[:8]
+            items.append({
+                "title": f"News about {word}",
+                "snippet": f"A report covering {word} and related developments.",
+                "link": f"https://news.example.com/{digest}",
+                "date": f"{i + 1} hours ago",
+                "source": "Example News",
+            })
+        self.log.record("search", query, start, time.perf_counter())
+        return items
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections when many clients connect at once
+    request_queue_size = 128
+
+
+class StubSerperServer:
+    """
+    Local server answering Serper `/news` requests with FakeSearch items after
+    `latency`, with HTTP/1.1 keep-alive. With `tls`, it serves HTTPS with a
+    throwaway self-signed certificate (made with the openssl CLI), which
+    clients trust through `cert_path`. `connections` counts accepted
+    connections, showing how well a client reuses them.
+    """
+
+    def __init__(self, latency: Optional[Latency] = None, tls: bool = False):
+        self.latency = latency or Latency(0.0)
+        self.tls = tls
+        self.connections = 0
+        self.cert_path: Optional[str] = None
+        self._search = FakeSearch()
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "StubSerperServer":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; with Nagle's algorithm the body
+            # waits for the client's delayed ACK, stalling every keep-alive request
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                if stub.tls:
+                    self.request.do_handshake()
+                with stub._lock:
+                    stub.connections += 1
+                super().setup()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                time.sleep(stub.latency.sample())
+                payload = json.dumps({"news": stub._search(body.get("q", ""), body.get("tbs"))}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _StubHTTPServer(("127.0.0.1", 0), Handler)
+        self._tmp = None
+        if self.tls:
+            self._tmp = tempfile.TemporaryDirectory()
+            self.cert_path = os.path.join(self._tmp.name, "cert.pem")
+            key_path = os.path.join(self._tmp.name, "key.pem")
+            subprocess.run(
+                ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                 "-keyout", key_path, "-out", self.cert_path,
+                 "-subj", "/CN=localhost", "-addext", "subjectAltName=IP:127.0.0.1"],
+                check=True,
+                capture_output=True,
+            )
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.cert_path, key_path)
+            # Handshakes run on the per-connection threads, not the accept loop
+            self._server.socket = context.wrap_socket(
+                self._server.socket, server_side=True, do_handshake_on_connect=False
+            )
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="stub-serper").start()
+        scheme = "https" if self.tls else "http"
+        self.url = f"{scheme}://127.0.0.1:{self._server.server_address[1]}"
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._tmp is not None:
+            self._tmp.cleanup()
+
+
+class StubCollector:
+    """
+    Local OTLP/HTTP collector stand-in: accepts JSON `ExportTraceServiceRequest`
+    posts on any path and keeps their spans in `spans`.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "StubCollector":
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # see StubSerperServer
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                spans = [
+                    span
+                    for resource in body.get("resourceSpans", [])
+                    for scope in resource.get("scopeSpans", [])
+                    for span in scope.get("spans", [])
+                ]
+                with collector._lock:
+                    collector.requests += 1
+                    collector.spans.extend(spans)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _StubHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="stub-collector").start()
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/v1/traces"
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
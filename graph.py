@@ -1,52 +1,230 @@
 from functools import partial
 from langgraph.graph import StateGraph, END, START
+from langgraph.types import Send
 from state import EnhancedAgentState
 from agents import (
     research_node, 
     writer_node, 
     editor_node, 
-    fact_checker_node
+    fact_checker_node,
+    pipelined_writer_node,
+    pipelined_editor_node,
+    pipelined_fact_checker_node,
+    publish_unchecked_node,
+    research_failed_node,
+    variant_node,
+    widen_search_node,
 )
-from config import GOOGLE_API_KEY, MODEL_NAME
-from langchain_google_genai import ChatGoogleGenerativeAI
+from archive import article_archive
+from cancellation import CancellableLLM, CancellableSearch, CancellationToken
+from cassette import Cassette, RecordingModel, RecordingSearch, recording_model_factory, replay_backends
+from config import (
+    CASSETTE_MODE,
+    CASSETTE_PATH,
+    CASSETTE_REALTIME,
+    ENABLE_ARCHIVE,
+    ENABLE_MEMORY_PROFILING,
+    ENABLE_QUALITY_ROUTING,
+    ENABLE_SECTION_PIPELINE,
+    NODE_TIMEOUT,
+    VARIANT_NODE_TIMEOUT,
+)
+from profiling import NodeProfiler
+from routing import ModelRouter, gemini_model_factory
+from scheduler import ScheduledLLM, ScheduledSearch, scheduler
+from sections import SectionPipeline
+from tools import search_news
+from tracing import TracedLLM, TracedSearch
+from variants import parse_variants
+
+def route_research(state):
+    """Next node after research, by the verdict in `research_quality`."""
+    return {
+        "ok": "writer",
+        "widen": "widen_search",
+        "fail": "research_failed",
+    }[state["research_quality"]["verdict"]]
+
+def route_fact_check(state):
+    """Fact-check the edited article unless research had nothing to check it against."""
+    return "fact_checker" if state["research_quality"]["fact_check"] else "publish_unchecked"
 
-def create_enhanced_graph(temperature=0.3, streaming=False):
+def route_variants(state, variants, quality_routing=True):
+    """Fans research out to one branch per variant, unless research has to be retried or failed."""
+    if quality_routing:
+        route = route_research(state)
+        if route != "writer":
+            return route
+    return [Send("variant", {**state, "variant": variant}) for variant in variants]
+
+def create_enhanced_graph(
+    temperature=0.3,
+    streaming=False,
+    llm=None,
+    search=None,
+    profiler=None,
+    cassette=None,
+    cancel_token=None,
+    pipelined=ENABLE_SECTION_PIPELINE,
+    priority="interactive",
+    user_id="anonymous",
+    archive=ENABLE_ARCHIVE,
+    quality_routing=ENABLE_QUALITY_ROUTING,
+    trace=None,
+    variants=None,
+):
     """
     Creates and returns the enhanced LangGraph state machine with multiple specialized agents.
     
     Args:
         temperature: The temperature for the LLM
         streaming: Whether to enable streaming mode
+        llm: Optional chat model (or ModelRouter) to use for every node instead of
+            the default per-node routing table in MODEL_ROUTES
+        search: Optional news search callable to use instead of Serper
+        profiler: Optional NodeProfiler recording per-node memory usage; one is
+            created automatically when ENABLE_MEMORY_PROFILING is set
+        cassette: Optional Cassette recording every LLM and search call of the
+            run; one is created automatically when CASSETTE_MODE is "record"
+        cancel_token: Optional CancellationToken for the run. Cancelling it
+            aborts in-flight LLM and search calls; the run is also bounded by
+            AGENT_TIMEOUT, NODE_TIMEOUT and the per-call timeouts. Graphs are
+            built per run, so each gets a fresh token when none is given.
+        pipelined: Whether sections are edited (and fact-checked) while the
+            writer is still streaming later ones
+        priority: Scheduling class of the run's LLM and search calls
+            ("interactive", "batch" or "prewarm")
+        user_id: User the calls are accounted to for per-user quotas
+        archive: Whether the completed run is stored in the article archive
+            (see archive.py) for search and reuse
+        quality_routing: Whether research quality decides the route: retry
+            research with a wider search window, fail fast with ResearchFailed,
+            or publish without fact-checking (see quality.py)
+        trace: Optional Trace (see tracing.py) recording a span for each node,
+            LLM call, search and cache lookup of the run. The caller starts it
+            with `tracer.start_trace` and finishes it; unsampled runs pass None
+            and are not instrumented.
+        variants: Optional article variants, by name ("short", "formal",
+            "long:executive", see variants.py). Research runs once, then the
+            writer, editor and fact-checker run for every variant in parallel
+            branches; the result's `variants` holds each version by name.
+            Variant branches do not use the section pipeline.
     """
     
-    # Initialize LLM
-    llm = ChatGoogleGenerativeAI(
-        model=MODEL_NAME, 
-        temperature=temperature, 
-        google_api_key=GOOGLE_API_KEY
-    )
+    # Record/replay of LLM and search I/O (see cassette.py)
+    if cassette is None and CASSETTE_MODE == "record":
+        cassette = Cassette()
+    if CASSETTE_MODE == "replay" and llm is None and search is None:
+        replay = replay_backends(Cassette.load(CASSETTE_PATH), CASSETTE_REALTIME)
+        llm, search = replay["llm"], replay["search"]
+
+    # Initialize LLM routing (per-node model tiers with latency/cost budgets)
+    if llm is None:
+        model_factory = gemini_model_factory
+        if cassette is not None:
+            model_factory = recording_model_factory(cassette, model_factory)
+        llm = ModelRouter(temperature=temperature, model_factory=model_factory)
+    elif cassette is not None and not isinstance(llm, ModelRouter):
+        llm = RecordingModel(llm, cassette, getattr(llm, "model", type(llm).__name__))
+    if search is None:
+        search = search_news
+    if cassette is not None:
+        search = RecordingSearch(search, cassette)
+
+    # Cooperative cancellation and timeouts for every call the run makes
+    if cancel_token is None:
+        cancel_token = CancellationToken()
+    llm = CancellableLLM(llm, cancel_token)
+    search = CancellableSearch(search, cancel_token)
+
+    # Calls queue for capacity by priority class, with per-user quotas; time
+    # spent queued does not count against the per-call timeouts
+    llm = ScheduledLLM(llm, scheduler, priority, user_id, cancel_token)
+    search = ScheduledSearch(search, scheduler, priority, user_id, cancel_token)
+
+    # Outermost, so call spans include the time queued for a slot
+    if trace is not None:
+        llm = TracedLLM(llm, trace)
+        search = TracedSearch(search, trace)
 
     # Create specialized agent nodes with LLM
-    research_agent = partial(research_node, llm=llm)
-    writer_agent = partial(writer_node, llm=llm)
-    editor_agent = partial(editor_node, llm=llm)
-    fact_checker_agent = partial(fact_checker_node, llm=llm)
+    variants = parse_variants(variants)
+    nodes = {"researcher": partial(research_node, llm=llm, search=search, quality_routing=quality_routing)}
+    if variants:
+        # Each variant branch writes, edits and fact-checks its own version
+        nodes["variant"] = partial(variant_node, llm=llm)
+    else:
+        nodes.update({
+            "writer": partial(writer_node, llm=llm),
+            "editor": partial(editor_node, llm=llm),
+            "fact_checker": partial(fact_checker_node, llm=llm),
+        })
+    pipelined = pipelined and not variants
+    if pipelined:
+        # The same node names and state fields, with overlapping section work
+        pipeline = SectionPipeline()
+        nodes.update({
+            "writer": partial(pipelined_writer_node, llm=llm, pipeline=pipeline),
+            "editor": partial(pipelined_editor_node, llm=llm, pipeline=pipeline),
+            "fact_checker": partial(pipelined_fact_checker_node, llm=llm, pipeline=pipeline),
+        })
+    if quality_routing:
+        nodes.update({
+            "widen_search": widen_search_node,
+            "research_failed": research_failed_node,
+        })
+        if not variants:
+            nodes["publish_unchecked"] = (
+                partial(publish_unchecked_node, pipeline=pipeline) if pipelined else publish_unchecked_node
+            )
+
+    # Opt-in memory profiling; nodes are left unwrapped when it is disabled
+    if profiler is None and ENABLE_MEMORY_PROFILING:
+        profiler = NodeProfiler()
 
     # Build the graph
     graph = StateGraph(EnhancedAgentState)
     
     # Add nodes
-    graph.add_node("researcher", research_agent)
-    graph.add_node("writer", writer_agent)
-    graph.add_node("editor", editor_agent)
-    graph.add_node("fact_checker", fact_checker_agent)
+    for name, node in nodes.items():
+        if archive and name in ("fact_checker", "publish_unchecked", "variant"):
+            node = article_archive.wrap(node)
+        if trace is not None:
+            node = trace.wrap(name, node)
+        if profiler is not None:
+            node = profiler.wrap(name, node)
+        if cassette is not None:
+            node = cassette.wrap(name, node)
+        # A variant branch is three agents in one node, so it gets longer, within the run deadline
+        node = cancel_token.wrap(name, node, VARIANT_NODE_TIMEOUT if name == "variant" else NODE_TIMEOUT)
+        graph.add_node(name, node)
     
     # Define the workflow
     graph.add_edge(START, "researcher")
-    graph.add_edge("researcher", "writer")
-    graph.add_edge("writer", "editor")
-    graph.add_edge("editor", "fact_checker")
-    graph.add_edge("fact_checker", END)
+    if quality_routing:
+        # Thin research is retried with a wider window or fails fast before any writing
+        graph.add_edge("widen_search", "researcher")
+        graph.add_edge("research_failed", END)
+    if variants:
+        # Research once, then write every variant in parallel
+        graph.add_conditional_edges(
+            "researcher",
+            partial(route_variants, variants=variants, quality_routing=quality_routing),
+            ["variant", "widen_search", "research_failed"] if quality_routing else ["variant"],
+        )
+        graph.add_edge("variant", END)
+    else:
+        if quality_routing:
+            graph.add_conditional_edges("researcher", route_research, ["writer", "widen_search", "research_failed"])
+        else:
+            graph.add_edge("researcher", "writer")
+        graph.add_edge("writer", "editor")
+        if quality_routing:
+            graph.add_conditional_edges("editor", route_fact_check, ["fact_checker", "publish_unchecked"])
+            graph.add_edge("publish_unchecked", END)
+        else:
+            graph.add_edge("editor", "fact_checker")
+        graph.add_edge("fact_checker", END)
     
     # Compile and return
     compiled_graph = graph.compile()
@@ -0,0 +1,220 @@
+"""
+Concurrent-session load test for the generation pipeline.
+
+Simulates N users that each submit articles through the same entry points
+as the Streamlit app's main(): `stream_generation` in Live Mode,
+`cached_generation` in Fast Mode, or a plain `graph.invoke` with both
+toggles off. LLM and search calls go to the fakes in fakes.py with
+log-normal latencies, scaled by --time-scale so that a run can finish in
+seconds. The JSON report includes the git commit and all parameters so
+results can be compared across commits.
+
+--background-users adds users that keep generating uncached articles at
+"batch" priority for the whole test, to check that interactive latency stays
+flat while background work uses the spare capacity.
+
+Usage:
+    python loadtest.py --users 20 --requests 3 --mode stream --time-scale 0.05
+    python loadtest.py --users 50 --mode cached --topics 10 --output loadtest.jsonl
+    python loadtest.py --users 10 --background-users 20 --mode stream
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+from config import TOPIC
+from fakes import FakeLLM, FakeSearch, realistic_llm_latency, realistic_search_latency
+from graph import create_enhanced_graph
+from pipeline import cached_generation, stream_generation
+from profiling import rss_bytes
+from scheduler import scheduler
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+class ResourceSampler(threading.Thread):
+    """Samples thread count and RSS in the background."""
+
+    def __init__(self, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.threads: List[int] = []
+        self.rss: List[int] = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.threads.append(threading.active_count())
+            self.rss.append(rss_bytes())
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_session(mode: str, topic: str, temperature: float, llm, search, **graph_options):
+    """Drives one request through the same path `main()` uses for `mode`."""
+    # Synthetic articles stay out of the article archive
+    graph_options.setdefault("archive", False)
+    if mode == "stream":
+        for _ in stream_generation(topic, temperature, llm=llm, search=search, **graph_options):
+            pass
+    elif mode == "cached":
+        cached_generation(topic, temperature, llm=llm, search=search, **graph_options)
+    else:
+        graph = create_enhanced_graph(temperature=temperature, llm=llm, search=search, **graph_options)
+        graph.invoke({TOPIC: topic})
+
+
+def run_load_test(
+    users: int,
+    requests_per_user: int,
+    mode: str,
+    topics: int,
+    time_scale: float,
+    seed: int,
+    background_users: int = 0,
+) -> Dict[str, Any]:
+    llm = FakeLLM(latency=realistic_llm_latency(time_scale, seed))
+    search = FakeSearch(latency=realistic_search_latency(time_scale, seed))
+    topic_pool = [f"load test topic {i}" for i in range(topics)]
+    rng = random.Random(seed)
+    schedule = [[rng.choice(topic_pool) for _ in range(requests_per_user)] for _ in range(users)]
+
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(users)
+
+    background_requests: List[float] = []
+    interactive_done = threading.Event()
+
+    def user(index: int, user_topics: List[str]):
+        start_barrier.wait()
+        for topic in user_topics:
+            start = time.perf_counter()
+            try:
+                run_session(mode, topic, 0.7, llm, search, user_id=f"user-{index}")
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    def background_user(index: int):
+        count = 0
+        while not interactive_done.is_set():
+            start = time.perf_counter()
+            try:
+                run_session("plain", f"background topic {index}-{count}", 0.7, llm, search,
+                            priority="batch", user_id=f"background-{index}")
+            except Exception as e:
+                with lock:
+                    errors.append(f"background {type(e).__name__}: {e}")
+            else:
+                with lock:
+                    background_requests.append(time.perf_counter() - start)
+            count += 1
+
+    sampler = ResourceSampler()
+    sampler.start()
+    background = [threading.Thread(target=background_user, args=(i,), daemon=True) for i in range(background_users)]
+    for worker in background:
+        worker.start()
+    workers = [threading.Thread(target=user, args=(i, user_topics)) for i, user_topics in enumerate(schedule)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    interactive_done.set()
+    for worker in background:
+        worker.join()
+    sampler.stop()
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "params": {
+            "users": users,
+            "requests_per_user": requests_per_user,
+            "mode": mode,
+            "topics": topics,
+            "time_scale": time_scale,
+            "seed": seed,
+            "background_users": background_users,
+        },
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_s": {
+            "p50": round(_percentile(latencies, 50), 4),
+            "p95": round(_percentile(latencies, 95), 4),
+            "p99": round(_percentile(latencies, 99), 4),
+            "mean": round(statistics.mean(latencies), 4) if latencies else 0.0,
+            "max": round(max(latencies), 4) if latencies else 0.0,
+        },
+        "background_requests": len(background_requests),
+        "scheduler": scheduler.metrics(),
+        "threads": {"peak": max(sampler.threads), "mean": round(statistics.mean(sampler.threads), 1)},
+        "rss_mb": {
+            "start": round(sampler.rss[0] / 2**20, 1),
+            "peak": round(max(sampler.rss) / 2**20, 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--requests", type=int, default=2, help="articles requested per user")
+    parser.add_argument(
+        "--mode", choices=["stream", "cached", "plain"], default="stream",
+        help="stream = Live Mode, cached = Fast Mode without Live Mode, plain = both off",
+    )
+    parser.add_argument("--topics", type=int, default=5, help="distinct topics (fewer topics = more cache hits)")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="multiplier for fake LLM/search latencies")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--background-users", type=int, default=0, help="users generating batch-priority articles throughout")
+    parser.add_argument("--output", help="append the JSON report to this JSONL file")
+    args = parser.parse_args()
+
+    report = run_load_test(
+        args.users, args.requests, args.mode, args.topics, args.time_scale, args.seed, args.background_users
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(report) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Patch-based editing.
+
+Instead of rewriting the whole article, the editor can return a JSON list of
+targeted replacements. They are validated and applied locally, so the
+editor's output (and latency) scales with the amount of change rather than
+the article length.
+"""
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+from config import EDITOR_MAX_PATCHES
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+class PatchError(Exception):
+    """Raised when the editor's patches cannot be parsed or applied."""
+
+
+def parse_patches(text: str) -> List[Dict[str, str]]:
+    """Parses the editor response into a list of {"find", "replace", "reason"} dicts."""
+    text = _FENCE.sub("", (text or "").strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise PatchError("response contains no JSON object")
+    try:
+        edits = json.loads(text[start:end + 1]).get("edits")
+    except (ValueError, AttributeError) as e:
+        raise PatchError(f"response is not valid JSON: {e}")
+    if not isinstance(edits, list):
+        raise PatchError("'edits' is missing or not a list")
+    if len(edits) > EDITOR_MAX_PATCHES:
+        raise PatchError(f"{len(edits)} edits exceed the limit of {EDITOR_MAX_PATCHES}")
+
+    patches = []
+    for index, edit in enumerate(edits):
+        if not isinstance(edit, dict) or not isinstance(edit.get("find"), str) or not isinstance(edit.get("replace"), str):
+            raise PatchError(f"edit {index + 1} needs string 'find' and 'replace' fields")
+        if not edit["find"]:
+            raise PatchError(f"edit {index + 1} has an empty 'find'")
+        patches.append({"find": edit["find"], "replace": edit["replace"], "reason": str(edit.get("reason", ""))})
+    return patches
+
+
+def apply_patches(text: str, patches: List[Dict[str, str]]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Applies `patches` in order. Each `find` must occur exactly once in the
+    text as edited so far; otherwise the whole set is rejected.
+    Returns the edited text and statistics about the change.
+    """
+    for index, patch in enumerate(patches):
+        occurrences = text.count(patch["find"])
+        if occurrences != 1:
+            raise PatchError(f"edit {index + 1} 'find' text occurs {occurrences} times, expected once")
+        text = text.replace(patch["find"], patch["replace"], 1)
+
+    stats = {
+        "edits": len(patches),
+        "chars_removed": sum(len(p["find"]) for p in patches),
+        "chars_inserted": sum(len(p["replace"]) for p in patches),
+    }
+    return text, stats
+
+
+def _shorten(text: str, limit: int = 60) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def describe_patches(patches: List[Dict[str, str]]) -> str:
+    """Editing notes listing the edits that were actually applied."""
+    if not patches:
+        return "No changes were needed"
+    lines = [f"Applied {len(patches)} targeted edit{'s' if len(patches) != 1 else ''}:"]
+    for patch in patches:
+        reason = f"{patch['reason']}: " if patch["reason"] else ""
+        lines.append(f"- {reason}\"{_shorten(patch['find'])}\" → \"{_shorten(patch['replace'])}\"")
+    return "\n".join(lines)
@@ -0,0 +1,171 @@
+import hashlib
+import time
+from functools import partial
+from typing import Any, Dict, Generator, List, Optional, Tuple
+
+from backends import get_backend
+from cache import article_cache, fingerprint_sources
+from cancellation import CancellationToken
+from config import AGENT_TIMEOUT, ENABLE_CACHE_REVALIDATION, RUN_LOCK_POLL_INTERVAL, SEARCH_WINDOWS, TOPIC
+from graph import create_enhanced_graph
+from sources import build_source_table
+from tools import search_news
+from tracing import span
+from variants import parse_variants
+
+
+def generate_cache_key(topic: str, temperature: float, variants: Optional[List[Any]] = None) -> str:
+    """Generate a cache key for the given topic, temperature and article variants."""
+    names = sorted(variant["name"] for variant in parse_variants(variants))
+    key = f"{topic}_{temperature}" + (f"_{','.join(names)}" if names else "")
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def revalidate(
+    queries: List[str],
+    fingerprint: str,
+    search=partial(search_news, live_only=True),
+    search_window: Optional[str] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Re-runs only the searches behind a cached article, over the search window
+    its research ended up using. Only live providers are asked: a fallback's
+    old results would always look unchanged.
+
+    Returns the fresh source table when the set of unique sources is
+    unchanged, or None when new results have appeared (or a search failed)
+    and the article needs to be regenerated.
+    """
+    if not queries:
+        return None
+
+    search_results = []
+    for query in queries:
+        try:
+            search_results.append({"query": query, "items": search(query, tbs=search_window or SEARCH_WINDOWS[0])})
+        except Exception as e:
+            print(f"Revalidation search error for query '{query}': {e}")
+            return None
+
+    sources, _ = build_source_table(search_results)
+    if fingerprint_sources(sources) != fingerprint:
+        return None
+    return sources
+
+
+def _initial_state(topic: str, search_queries: Optional[List[str]] = None) -> Dict[str, Any]:
+    state = {TOPIC: topic}
+    if search_queries:
+        state["search_queries"] = search_queries
+    return state
+
+
+def cached_generation(
+    topic: str,
+    temperature: float,
+    search_queries: Optional[List[str]] = None,
+    **graph_options,
+) -> Dict[str, Any]:
+    """
+    Cached version of content generation.
+
+    Entries expire according to the freshness of their sources. Expired
+    entries are revalidated by repeating the searches and are reused when
+    the search results have not changed. Cache entries and the per-article
+    run lock live in the shared backend, so concurrent requests for the same
+    article (on any replica) generate it only once. The returned dict carries
+    a `cache_status` of "hit", "revalidated" or "miss".
+
+    `search_queries` are planned queries to research instead of asking the
+    LLM (see batch.py). `graph_options` are passed to `create_enhanced_graph`
+    (e.g. fake `llm` and `search` backends for load tests); with a `trace`,
+    the cache lookups are traced too.
+    """
+    trace = graph_options.get("trace")
+    cache_key = generate_cache_key(topic, temperature, graph_options.get("variants"))
+    with span("cache.get", "cache", trace=trace, cache="article") as lookup:
+        entry = article_cache.get(cache_key)
+        fresh = entry is not None and article_cache.is_fresh(cache_key)
+        lookup.set(hit=entry is not None, fresh=fresh)
+
+    if entry is not None:
+        if fresh:
+            return {**entry["result"], "cache_status": "hit"}
+
+        if ENABLE_CACHE_REVALIDATION:
+            with span("cache.revalidate", "cache", trace=trace, queries=len(entry["queries"])) as check:
+                sources = revalidate(
+                    entry["queries"],
+                    entry["fingerprint"],
+                    search=graph_options.get("search") or partial(search_news, live_only=True),
+                    search_window=entry["result"].get("search_window"),
+                )
+                check.set(unchanged=sources is not None)
+            if sources is not None:
+                article_cache.renew(cache_key, entry, sources)
+                return {**entry["result"], "cache_status": "revalidated"}
+
+    # Only one replica generates a given article; the others wait for its result
+    with span("run_lock", "cache", trace=trace) as wait:
+        lock_token, entry = _acquire_run_lock(cache_key, graph_options.get("cancel_token"))
+        wait.set(waited_for_other_run=entry is not None)
+    if entry is not None:
+        return {**entry["result"], "cache_status": "hit"}
+    try:
+        graph = create_enhanced_graph(temperature=temperature, **graph_options)
+        result = graph.invoke(_initial_state(topic, search_queries))
+        article_cache.put(cache_key, result)
+    finally:
+        get_backend().release_lock(f"run:{cache_key}", lock_token)
+    return {**result, "cache_status": "miss"}
+
+
+def _acquire_run_lock(
+    cache_key: str, cancel_token: Optional[CancellationToken] = None
+) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Takes the run lock for `cache_key`, or waits for the replica holding it.
+
+    Returns (lock_token, None) once the lock is ours, or (None, entry) when
+    another replica finished the article while we waited. Locks expire after
+    AGENT_TIMEOUT, so a crashed replica cannot block generation for long.
+    A cancelled `cancel_token` stops the wait with RunCancelled.
+    """
+    backend = get_backend()
+    while True:
+        lock_token = backend.acquire_lock(f"run:{cache_key}", ttl=AGENT_TIMEOUT)
+        if lock_token is not None:
+            return lock_token, None
+        if cancel_token is None:
+            time.sleep(RUN_LOCK_POLL_INTERVAL)
+        else:
+            cancel_token.wait(RUN_LOCK_POLL_INTERVAL)
+            cancel_token.raise_if_cancelled()
+        if article_cache.is_fresh(cache_key):
+            return None, article_cache.get(cache_key)
+
+
+def stream_generation(
+    topic: str,
+    temperature: float,
+    search_queries: Optional[List[str]] = None,
+    **graph_options,
+) -> Generator[Dict[str, Any], None, None]:
+    """
+    Stream the generation process with progress updates.
+
+    Closing the generator early (e.g. the consumer went away) cancels the run,
+    so no further LLM or search calls are made for it.
+    """
+    cancel_token = graph_options.pop("cancel_token", None) or CancellationToken()
+    graph = create_enhanced_graph(temperature=temperature, cancel_token=cancel_token, **graph_options)
+
+    # Stream the graph execution
+    finished = False
+    try:
+        for chunk in graph.stream(_initial_state(topic, search_queries)):
+            yield chunk
+        finished = True
+    finally:
+        if not finished:
+            cancel_token.cancel("stream closed")
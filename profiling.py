@@ -0,0 +1,240 @@
+"""
+Opt-in per-node memory profiling.
+
+When enabled (ENABLE_MEMORY_PROFILING / NEWSGEN_MEMORY_PROFILING=1),
+create_enhanced_graph wraps every node so that it records RSS before,
+after and at peak, tracemalloc allocation deltas, and the top allocation
+sites. Each run writes a JSON report to MEMORY_PROFILE_DIR. When disabled,
+nodes are not wrapped at all.
+
+Compare two runs with:
+    python profiling.py diff profiles/old.json profiles/new.json
+
+tracemalloc and RSS are process-wide, so figures from concurrent runs in
+the same process overlap; profile a single run for clean attribution.
+tracemalloc only runs while a profiled node does, so a process is not slowed
+down once its profiled runs are done.
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from config import (
+    MEMORY_PROFILE_DIR,
+    MEMORY_PROFILE_SAMPLE_INTERVAL,
+    MEMORY_PROFILE_TOP_SITES,
+    MEMORY_PROFILE_TRACE_FRAMES,
+)
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; fall back to /proc or getrusage
+    psutil = None
+
+_MB = 2 ** 20
+
+# Profiled nodes in flight, and whether tracemalloc was started for them
+_tracing_lock = threading.Lock()
+_tracing_nodes = 0
+_tracing_owned = False
+
+
+def _start_tracing():
+    global _tracing_nodes, _tracing_owned
+    with _tracing_lock:
+        if _tracing_nodes == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_PROFILE_TRACE_FRAMES)
+            _tracing_owned = True
+        _tracing_nodes += 1
+
+
+def _stop_tracing():
+    """Stops tracemalloc after the last profiled node, unless someone else started it."""
+    global _tracing_nodes, _tracing_owned
+    with _tracing_lock:
+        _tracing_nodes -= 1
+        if _tracing_nodes == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is the lifetime peak, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _PeakRSSSampler(threading.Thread):
+    """Polls RSS while a node runs to catch its peak."""
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss_bytes()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, rss_bytes())
+        return self.peak
+
+
+class NodeProfiler:
+    """
+    Collects memory statistics per node execution for one graph run and
+    writes a JSON report. Repeated executions of a node (research retried
+    with a wider window) are recorded as "researcher#2" and so on, and
+    variant branches under their variant, e.g. "variant[short]".
+    """
+
+    def __init__(self, output_dir: str = MEMORY_PROFILE_DIR, label: str = "run"):
+        self.output_dir = output_dir
+        self.started_at = datetime.now()
+        self.label = label
+        self.report_path: Optional[str] = None
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self._executions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, name: str, node: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """Returns `node` instrumented with memory measurements recorded under `name`."""
+
+        def profiled_node(state):
+            return self.profile(name, node, state)
+
+        return profiled_node
+
+    def _execution_key(self, name: str, state) -> str:
+        variant = (state.get("variant") or {}).get("name")
+        key = f"{name}[{variant}]" if variant else name
+        with self._lock:
+            count = self._executions[key] = self._executions.get(key, 0) + 1
+        return key if count == 1 else f"{key}#{count}"
+
+    def profile(self, name: str, node, state):
+        if self.report_path is None and state.get("topic"):
+            self.label = state["topic"]
+        key = self._execution_key(name, state)
+        _start_tracing()
+        rss_start = rss_bytes()
+        traced_start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot_start = tracemalloc.take_snapshot()
+        sampler = _PeakRSSSampler(MEMORY_PROFILE_SAMPLE_INTERVAL)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            return node(state)
+        finally:
+            duration = time.perf_counter() - started
+            rss_peak = sampler.stop()
+            traced_end, traced_peak = tracemalloc.get_traced_memory()
+            snapshot_end = tracemalloc.take_snapshot()
+            _stop_tracing()
+            rss_end = rss_bytes()
+            rss_peak = max(rss_peak, rss_end)
+            self.record(key, {
+                "duration_s": round(duration, 3),
+                "rss_start_mb": round(rss_start / _MB, 2),
+                "rss_end_mb": round(rss_end / _MB, 2),
+                "rss_peak_mb": round(rss_peak / _MB, 2),
+                "rss_delta_mb": round((rss_end - rss_start) / _MB, 2),
+                "alloc_delta_kb": round((traced_end - traced_start) / 1024, 1),
+                "alloc_peak_kb": round(max(traced_peak - traced_start, 0) / 1024, 1),
+                "top_allocations": _top_allocations(snapshot_end, snapshot_start),
+            })
+
+    def record(self, name: str, stats: Dict[str, Any]):
+        with self._lock:
+            self.nodes[name] = stats
+            self.write_report()
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "label": self.label,
+            "started_at": self.started_at.isoformat(),
+            "nodes": self.nodes,
+        }
+
+    def write_report(self) -> str:
+        """Writes (or rewrites) this run's report file and returns its path."""
+        if self.report_path is None:
+            os.makedirs(self.output_dir, exist_ok=True)
+            slug = re.sub(r"[^a-z0-9]+", "_", self.label.lower()).strip("_")[:40] or "run"
+            name = f"{self.started_at.strftime('%Y%m%d_%H%M%S_%f')}_{slug}.json"
+            self.report_path = os.path.join(self.output_dir, name)
+        with open(self.report_path, "w") as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+        return self.report_path
+
+
+_IGNORED_FRAMES = (tracemalloc.__file__, __file__, "<frozen importlib._bootstrap>")
+
+
+def _top_allocations(snapshot_end, snapshot_start) -> List[Dict[str, Any]]:
+    filters = [tracemalloc.Filter(False, pattern) for pattern in _IGNORED_FRAMES]
+    stats = snapshot_end.filter_traces(filters).compare_to(
+        snapshot_start.filter_traces(filters), "lineno"
+    )
+    top = sorted(stats, key=lambda stat: stat.size_diff, reverse=True)[:MEMORY_PROFILE_TOP_SITES]
+    return [
+        {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "count_diff": stat.count_diff,
+        }
+        for stat in top
+        if stat.size_diff > 0
+    ]
+
+
+def diff_reports(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Per-node differences (new - old) of every numeric field in two reports."""
+    diff = {}
+    for node in sorted(set(old["nodes"]) | set(new["nodes"])):
+        old_stats, new_stats = old["nodes"].get(node, {}), new["nodes"].get(node, {})
+        diff[node] = {
+            key: round(new_stats.get(key, 0) - old_stats.get(key, 0), 2)
+            for key in sorted(set(old_stats) | set(new_stats))
+            if isinstance(new_stats.get(key, old_stats.get(key)), (int, float))
+        }
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory profile reports.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    diff = subparsers.add_parser("diff", help="show per-node changes between two reports")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(json.dumps(diff_reports(old, new), indent=2))
+
+
+if __name__ == "__main__":
+    main()
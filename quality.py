@@ -0,0 +1,103 @@
+"""
+Research quality signals that drive the graph's conditional edges.
+
+After the searches of a research attempt, their results are scored on
+source count, search error rate and freshness. The verdict decides where the
+run goes next (see graph.py): on to writing, back to research with a wider
+Serper time window (SEARCH_WINDOWS), or straight to a clear failure, so runs
+without material do not spend four more LLM calls writing from nothing.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from cache import parse_source_date
+from config import (
+    FACT_CHECK_MIN_SOURCES,
+    RESEARCH_MAX_ERROR_RATE,
+    RESEARCH_MIN_SOURCES,
+    RESEARCH_WINDOW_AGE_SLACK,
+    SEARCH_WINDOW_AGES_H,
+    SEARCH_WINDOWS,
+)
+
+
+class ResearchFailed(Exception):
+    """Raised when research found nothing worth writing about."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def next_window(window: str) -> Optional[str]:
+    """The next wider search window after `window`, or None if it is the widest."""
+    if window not in SEARCH_WINDOWS:
+        return None
+    index = SEARCH_WINDOWS.index(window) + 1
+    return SEARCH_WINDOWS[index] if index < len(SEARCH_WINDOWS) else None
+
+
+def assess_research(
+    search_results: List[Dict[str, Any]],
+    sources: List[Dict[str, Any]],
+    window: str,
+    fetched_at: Optional[datetime] = None,
+    history: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """
+    Scores one research attempt. The verdict is "ok" (write the article),
+    "widen" (retry research with the next search window) or "fail"; a failed
+    assessment carries the `reason` shown to the user. `fact_check` is False
+    when there are too few sources to check the article against.
+
+    Freshness counts too: sources dated well outside the window (older than
+    RESEARCH_WINDOW_AGE_SLACK times its span, as fallback or loosely filtered
+    results can be) are not fresh news for it, so with fewer than
+    RESEARCH_MIN_SOURCES fresh sources the attempt is widened like a thin one.
+    Undated sources count as fresh.
+    """
+    fetched_at = fetched_at or datetime.now()
+    searches = len(search_results)
+    failed = sum(1 for result in search_results if result.get("error"))
+    error_rate = failed / searches if searches else 0.0
+    dates = [parse_source_date(s.get("date"), fetched_at) for s in sources]
+    published = [d for d in dates if d]
+    newest_age_h = (
+        round(max((fetched_at - max(published)).total_seconds(), 0) / 3600, 1) if published else None
+    )
+    max_age_h = SEARCH_WINDOW_AGES_H.get(window, float("inf")) * RESEARCH_WINDOW_AGE_SLACK
+    fresh = sum(1 for d in dates if d is None or (fetched_at - d).total_seconds() / 3600 <= max_age_h)
+    wider = next_window(window)
+
+    if searches and failed == searches:
+        verdict, reason = "fail", f"all {searches} searches failed ({search_results[0]['error']})"
+    elif len(sources) < RESEARCH_MIN_SOURCES and error_rate > RESEARCH_MAX_ERROR_RATE:
+        verdict, reason = "fail", f"{failed} of {searches} searches failed and only {len(sources)} sources were found"
+    elif len(sources) < RESEARCH_MIN_SOURCES and wider is not None:
+        verdict, reason = "widen", f"only {len(sources)} sources in window {window}"
+    elif fresh < RESEARCH_MIN_SOURCES and wider is not None:
+        verdict, reason = "widen", f"only {fresh} of {len(sources)} sources are recent enough for window {window}"
+    elif not sources:
+        verdict, reason = "fail", f"no news articles found, even in the widest search window ({window})"
+    else:
+        verdict, reason = "ok", None
+
+    attempt = {
+        "window": window, "sources": len(sources), "fresh_sources": fresh,
+        "searches": searches, "failed_searches": failed,
+    }
+    return {
+        "verdict": verdict,
+        "reason": reason,
+        "window": window,
+        "next_window": wider,
+        "sources": len(sources),
+        "searches": searches,
+        "failed_searches": failed,
+        "error_rate": round(error_rate, 3),
+        "dated_sources": len(published),
+        "newest_source_age_h": newest_age_h,
+        "fresh_sources": fresh,
+        "fact_check": len(sources) >= FACT_CHECK_MIN_SOURCES,
+        "attempts": (history or []) + [attempt],
+    }
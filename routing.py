@@ -0,0 +1,194 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from backends import RateLimiter, rate_limiter as shared_rate_limiter
+from cancellation import current_token
+from config import (
+    GOOGLE_API_KEY,
+    LLM_CALL_TIMEOUT,
+    MODEL_ROUTES,
+    MODEL_TIERS,
+    ROUTE_EMA_ALPHA,
+    ROUTE_PROBE_EVERY,
+)
+from tools import estimate_tokens
+from tracing import annotate
+
+
+def gemini_model_factory(model: str, temperature: float):
+    """Builds a Gemini chat model; the default model factory for routers."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        google_api_key=GOOGLE_API_KEY,
+        timeout=LLM_CALL_TIMEOUT
+    )
+
+
+class RouteStats:
+    """
+    Moving averages of latency and cost per (route, tier), shared across runs
+    so that budget decisions survive from one generation to the next.
+    """
+
+    def __init__(self, alpha: float = ROUTE_EMA_ALPHA):
+        self.alpha = alpha
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, tier: str, latency: float, cost: float):
+        key = f"{route}:{tier}"
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                self._stats[key] = {"latency": latency, "cost": cost, "calls": 1}
+            else:
+                stats["latency"] += self.alpha * (latency - stats["latency"])
+                stats["cost"] += self.alpha * (cost - stats["cost"])
+                stats["calls"] += 1
+
+    def get(self, route: str, tier: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            stats = self._stats.get(f"{route}:{tier}")
+            return dict(stats) if stats else None
+
+    def next_call(self, route: str) -> int:
+        """Returns a per-route call counter, used to schedule probes of the primary tier."""
+        with self._lock:
+            self._calls[route] = self._calls.get(route, 0) + 1
+            return self._calls[route]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {key: dict(stats) for key, stats in self._stats.items()}
+
+
+route_stats = RouteStats()
+
+
+class RoutedModel:
+    """Chat-model facade for a single route; `invoke` picks the tier per call."""
+
+    def __init__(self, router: "ModelRouter", route: str):
+        self.router = router
+        self.route = route
+
+    def invoke(self, prompt, **kwargs):
+        return self.router.invoke(self.route, prompt, **kwargs)
+
+    def stream(self, prompt, **kwargs):
+        return self.router.stream(self.route, prompt, **kwargs)
+
+
+class ModelRouter:
+    """
+    Routes each node / sub-step to a model tier according to MODEL_ROUTES.
+
+    A route whose average latency or cost is over budget is served by its
+    fallback tier; every ROUTE_PROBE_EVERY-th call still goes to the primary
+    tier so the route can recover once the primary is fast again. Calls draw
+    from the shared "gemini" rate-limit bucket unless `rate_limiter` is None.
+    """
+
+    def __init__(
+        self,
+        temperature: float,
+        routes: Dict[str, Dict[str, Any]] = MODEL_ROUTES,
+        tiers: Dict[str, Dict[str, Any]] = MODEL_TIERS,
+        model_factory: Callable[[str, float], Any] = gemini_model_factory,
+        stats: RouteStats = route_stats,
+        rate_limiter: Optional[RateLimiter] = shared_rate_limiter,
+    ):
+        self.temperature = temperature
+        self.routes = routes
+        self.tiers = tiers
+        self.model_factory = model_factory
+        self.stats = stats
+        self.rate_limiter = rate_limiter
+        self._models: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def for_step(self, route: str) -> RoutedModel:
+        if route not in self.routes:
+            raise KeyError(f"No model route configured for '{route}'")
+        return RoutedModel(self, route)
+
+    def over_budget(self, route: str, tier: str) -> bool:
+        config = self.routes[route]
+        stats = self.stats.get(route, tier)
+        if stats is None:
+            return False
+        return (
+            stats["latency"] > config.get("latency_budget", float("inf"))
+            or stats["cost"] > config.get("cost_budget", float("inf"))
+        )
+
+    def select_tier(self, route: str) -> str:
+        config = self.routes[route]
+        primary, fallback = config["tier"], config.get("fallback")
+        call_number = self.stats.next_call(route)
+        if fallback and self.over_budget(route, primary) and call_number % ROUTE_PROBE_EVERY != 0:
+            return fallback
+        return primary
+
+    def model(self, route: str, tier: str):
+        temperature = self.routes[route].get("temperature")
+        if temperature is None:
+            temperature = self.temperature
+        key = (self.tiers[tier]["model"], temperature)
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = self.model_factory(*key)
+            return self._models[key]
+
+    def _wait_for_rate_limit(self):
+        if self.rate_limiter is not None:
+            start = time.perf_counter()
+            self.rate_limiter.wait("gemini", cancel_token=current_token())
+            annotate(rate_limit_wait_ms=round((time.perf_counter() - start) * 1000, 3))
+
+    def invoke(self, route: str, prompt, **kwargs):
+        tier = self.select_tier(route)
+        self._wait_for_rate_limit()
+        start = time.perf_counter()
+        response = self.model(route, tier).invoke(prompt, **kwargs)
+        latency = time.perf_counter() - start
+        tokens = estimate_tokens(str(prompt)) + estimate_tokens(str(response.content))
+        cost = tokens / 1000 * self.tiers[tier].get("cost_per_1k_tokens", 0.0)
+        self.stats.record(route, tier, latency, cost)
+        annotate(tier=tier, model=self.tiers[tier].get("model"), tokens=tokens)
+        return response
+
+    def stream(self, route: str, prompt, **kwargs):
+        """Like `invoke`, but yields message chunks as the model produces them."""
+        tier = self.select_tier(route)
+        self._wait_for_rate_limit()
+        start = time.perf_counter()
+        content = ""
+        for chunk in stream_chunks(self.model(route, tier), prompt, **kwargs):
+            content += chunk.content
+            yield chunk
+        latency = time.perf_counter() - start
+        tokens = estimate_tokens(str(prompt)) + estimate_tokens(content)
+        cost = tokens / 1000 * self.tiers[tier].get("cost_per_1k_tokens", 0.0)
+        self.stats.record(route, tier, latency, cost)
+        annotate(tier=tier, model=self.tiers[tier].get("model"), tokens=tokens)
+
+
+def stream_chunks(model, prompt, **kwargs):
+    """Streams `model`'s answer, or yields its whole answer when it cannot stream."""
+    if hasattr(model, "stream"):
+        yield from model.stream(prompt, **kwargs)
+    else:
+        yield model.invoke(prompt, **kwargs)
+
+
+def llm_for(llm, route: str):
+    """Returns the model for `route` when `llm` is a router (or wraps one), else `llm` itself."""
+    if hasattr(llm, "for_step"):
+        return llm.for_step(route)
+    return llm
@@ -0,0 +1,200 @@
+"""
+Priority scheduling of LLM and search calls.
+
+Every call a graph run makes waits for a slot on its resource ("llm" or
+"search"). Waiting calls are served by priority class (interactive > batch >
+prewarm); within a class, the user with the fewest calls in flight goes
+first, then the longest-waiting call. Each user is limited to
+SCHEDULER_USER_CONCURRENCY calls per resource, and SCHEDULER_INTERACTIVE_RESERVE
+slots are kept free for interactive calls, so background work soaks up
+spare capacity without delaying live users.
+"""
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Dict, Iterator, Optional
+
+from cancellation import RunCancelled
+
+from config import (
+    SCHEDULER_CAPACITY,
+    SCHEDULER_INTERACTIVE_RESERVE,
+    SCHEDULER_POLL_INTERVAL,
+    SCHEDULER_USER_CONCURRENCY,
+)
+from routing import stream_chunks
+from tracing import annotate
+
+PRIORITIES = ("interactive", "batch", "prewarm")
+
+
+class _Waiter:
+    __slots__ = ("resource", "priority", "user", "seq", "enqueued_at")
+
+    def __init__(self, resource: str, priority: int, user: str, seq: int):
+        self.resource = resource
+        self.priority = priority
+        self.user = user
+        self.seq = seq
+        self.enqueued_at = time.perf_counter()
+
+
+class Scheduler:
+    """Grants per-resource call slots by priority class with per-user quotas."""
+
+    def __init__(
+        self,
+        capacity: Dict[str, int] = SCHEDULER_CAPACITY,
+        user_concurrency: int = SCHEDULER_USER_CONCURRENCY,
+        interactive_reserve: int = SCHEDULER_INTERACTIVE_RESERVE,
+    ):
+        self.capacity = dict(capacity)
+        self.user_concurrency = user_concurrency
+        self.interactive_reserve = interactive_reserve
+        self._condition = threading.Condition()
+        self._seq = itertools.count()
+        self._queues: Dict[str, list] = defaultdict(list)
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._user_in_flight: Dict[tuple, int] = defaultdict(int)
+        self._served: Dict[tuple, int] = defaultdict(int)
+        self._waits: Dict[tuple, deque] = defaultdict(lambda: deque(maxlen=500))
+
+    def _eligible(self, waiter: _Waiter) -> bool:
+        in_flight = self._in_flight[waiter.resource]
+        limit = self.capacity.get(waiter.resource, 1)
+        if waiter.priority > 0:
+            limit -= self.interactive_reserve
+        return (
+            in_flight < limit
+            and self._user_in_flight[(waiter.resource, waiter.user)] < self.user_concurrency
+        )
+
+    def _next(self, resource: str) -> Optional[_Waiter]:
+        eligible = [w for w in self._queues[resource] if self._eligible(w)]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda w: (w.priority, self._user_in_flight[(resource, w.user)], w.seq))
+
+    def acquire(self, resource: str, priority: str = "interactive", user: str = "anonymous", token=None) -> float:
+        """
+        Blocks until a `resource` slot is granted and returns the wait in
+        seconds. Gives up (raising the token's exception) if `token` is cancelled.
+        """
+        waiter = _Waiter(resource, PRIORITIES.index(priority), user, next(self._seq))
+        with self._condition:
+            self._queues[resource].append(waiter)
+            try:
+                while self._next(resource) is not waiter:
+                    self._condition.wait(SCHEDULER_POLL_INTERVAL)
+                    if token is not None:
+                        token.raise_if_cancelled()
+            finally:
+                self._queues[resource].remove(waiter)
+                self._condition.notify_all()
+            self._in_flight[resource] += 1
+            self._user_in_flight[(resource, user)] += 1
+            waited = time.perf_counter() - waiter.enqueued_at
+            self._served[(resource, priority)] += 1
+            self._waits[(resource, priority)].append(waited)
+        return waited
+
+    def release(self, resource: str, user: str = "anonymous"):
+        with self._condition:
+            self._in_flight[resource] -= 1
+            self._user_in_flight[(resource, user)] -= 1
+            if not self._user_in_flight[(resource, user)]:
+                del self._user_in_flight[(resource, user)]
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, resource: str, priority: str = "interactive", user: str = "anonymous", token=None) -> Iterator[None]:
+        """
+        Holds a `resource` slot for the block. A call the block abandons
+        (cancelled or timed out, see cancellation.py) keeps the slot until it
+        has really finished, so capacity bounds the calls actually running.
+        """
+        wait = self.acquire(resource, priority, user, token)
+        annotate(queue_wait_ms=round(wait * 1000, 3))
+        release = partial(self.release, resource, user)
+        try:
+            yield
+        except RunCancelled as e:
+            if e.call is not None:
+                e.call.add_done_callback(release)
+                release = None
+            raise
+        finally:
+            if release is not None:
+                release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, slots in use and recent wait times per resource and class."""
+        with self._condition:
+            report = {}
+            for resource in sorted(set(self.capacity) | set(self._queues)):
+                queued = {name: 0 for name in PRIORITIES}
+                for waiter in self._queues[resource]:
+                    queued[PRIORITIES[waiter.priority]] += 1
+                waits = {}
+                for name in PRIORITIES:
+                    samples = sorted(self._waits.get((resource, name), ()))
+                    if samples:
+                        waits[name] = {
+                            "served": self._served[(resource, name)],
+                            "p50_s": round(samples[len(samples) // 2], 4),
+                            "p95_s": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+                        }
+                report[resource] = {
+                    "capacity": self.capacity.get(resource, 1),
+                    "in_flight": self._in_flight[resource],
+                    "queued": queued,
+                    "users_in_flight": sum(1 for r, _ in self._user_in_flight if r == resource),
+                    "wait": waits,
+                }
+            return report
+
+
+scheduler = Scheduler()
+
+
+class ScheduledLLM:
+    """Chat model (or router) whose calls wait for an "llm" slot."""
+
+    def __init__(self, llm, scheduler: Scheduler, priority: str = "interactive", user: str = "anonymous", token=None):
+        self.llm = llm
+        self.scheduler = scheduler
+        self.priority = priority
+        self.user = user
+        self.token = token
+
+    def for_step(self, route: str) -> "ScheduledLLM":
+        for_step = getattr(self.llm, "for_step", None)
+        if for_step is None:
+            return self
+        return ScheduledLLM(for_step(route), self.scheduler, self.priority, self.user, self.token)
+
+    def invoke(self, prompt, **kwargs):
+        with self.scheduler.slot("llm", self.priority, self.user, self.token):
+            return self.llm.invoke(prompt, **kwargs)
+
+    def stream(self, prompt, **kwargs):
+        with self.scheduler.slot("llm", self.priority, self.user, self.token):
+            yield from stream_chunks(self.llm, prompt, **kwargs)
+
+
+class ScheduledSearch:
+    """News search callable whose calls wait for a "search" slot."""
+
+    def __init__(self, search, scheduler: Scheduler, priority: str = "interactive", user: str = "anonymous", token=None):
+        self.search = search
+        self.scheduler = scheduler
+        self.priority = priority
+        self.user = user
+        self.token = token
+
+    def __call__(self, query: str, **options):
+        with self.scheduler.slot("search", self.priority, self.user, self.token):
+            return self.search(query, **options)
@@ -0,0 +1,118 @@
+"""
+Pooled keep-alive HTTP client for Serper news search.
+
+GoogleSerperAPIWrapper sends every search with a bare `requests.post`, so
+each call pays for a new TCP connection and TLS handshake. SerperClient keeps
+one httpx connection pool per process (and one per event loop for async
+callers), so concurrent searches reuse warm connections, bounded by
+SEARCH_MAX_CONNECTIONS, with explicit connect, read and pool timeouts.
+"""
+import asyncio
+import ssl
+import threading
+import weakref
+from typing import Any, Dict, Optional, Union
+
+import httpx
+
+from config import (
+    SEARCH_CONNECT_RETRIES,
+    SEARCH_CONNECT_TIMEOUT,
+    SEARCH_KEEPALIVE_EXPIRY,
+    SEARCH_MAX_CONNECTIONS,
+    SEARCH_MAX_KEEPALIVE,
+    SEARCH_POOL_TIMEOUT,
+    SEARCH_READ_TIMEOUT,
+    SERPER_API_KEY,
+    SERPER_BASE_URL,
+)
+
+
+class SerperClient:
+    """
+    Serper API client over a shared connection pool. Thread-safe; async calls
+    get a pool per event loop, since httpx async pools are bound to their loop.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = SERPER_API_KEY,
+        base_url: str = SERPER_BASE_URL,
+        max_connections: int = SEARCH_MAX_CONNECTIONS,
+        max_keepalive: int = SEARCH_MAX_KEEPALIVE,
+        keepalive_expiry: float = SEARCH_KEEPALIVE_EXPIRY,
+        timeout: Optional[httpx.Timeout] = None,
+        retries: int = SEARCH_CONNECT_RETRIES,
+        verify: Union[bool, ssl.SSLContext] = True,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"X-API-KEY": api_key or "", "Content-Type": "application/json"}
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout or httpx.Timeout(
+            SEARCH_READ_TIMEOUT, connect=SEARCH_CONNECT_TIMEOUT, pool=SEARCH_POOL_TIMEOUT
+        )
+        self.retries = retries
+        self.verify = verify
+        self._client: Optional[httpx.Client] = None
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        """The shared sync pool, created on first use."""
+        with self._lock:
+            if self._client is None:
+                transport = httpx.HTTPTransport(limits=self.limits, retries=self.retries, verify=self.verify)
+                self._client = httpx.Client(transport=transport, headers=self.headers, timeout=self.timeout)
+            return self._client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """The async pool of the running event loop, created on first use."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                transport = httpx.AsyncHTTPTransport(limits=self.limits, retries=self.retries, verify=self.verify)
+                client = httpx.AsyncClient(transport=transport, headers=self.headers, timeout=self.timeout)
+                self._async_clients[loop] = client
+            return client
+
+    @staticmethod
+    def _payload(query: str, tbs: Optional[str], num: int) -> Dict[str, Any]:
+        # Same parameters GoogleSerperAPIWrapper sends for a news search
+        payload = {"q": query, "gl": "us", "hl": "en", "num": num}
+        if tbs:
+            payload["tbs"] = tbs
+        return payload
+
+    def news(self, query: str, tbs: Optional[str] = None, num: int = 5) -> Dict[str, Any]:
+        """Runs a news search and returns Serper's JSON response."""
+        response = self.client.post(f"{self.base_url}/news", json=self._payload(query, tbs, num))
+        response.raise_for_status()
+        return response.json()
+
+    async def anews(self, query: str, tbs: Optional[str] = None, num: int = 5) -> Dict[str, Any]:
+        """Async `news`, sharing a connection pool with the other calls on this event loop."""
+        response = await self.async_client().post(f"{self.base_url}/news", json=self._payload(query, tbs, num))
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        """Closes the async pool of the running event loop."""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+serper_client = SerperClient()
@@ -0,0 +1,429 @@
+"""
+Pluggable news search providers with hedged requests.
+
+A provider takes a query and a time window (Serper's `tbs`, e.g. "qdr:d")
+and returns news items normalized to the fields `research_sources` are built
+from: title, snippet, link, date and source. Live providers (Serper) answer
+authoritatively, even with no results; fallbacks ("stale_cache", "archive")
+only count when they find something.
+
+HedgedSearch sends each query to the primary provider. If it has not
+answered by SEARCH_HEDGE_PERCENTILE of its recent latencies, or fails, the
+same query goes to the next provider, and the first good answer wins. One
+slow search no longer holds up the whole research phase, at the cost of a
+few extra requests for the slowest tail of searches.
+"""
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from langchain_community.utilities import GoogleSerperAPIWrapper
+
+from archive import ArticleArchive, article_archive
+from backends import get_backend, rate_limiter
+from cache import absolute_source_date, parse_source_date
+from cancellation import current_token
+from config import (
+    ENABLE_ARCHIVE,
+    ENABLE_SEARCH_HEDGING,
+    SEARCH_CLIENT,
+    SEARCH_HEDGE_DEFAULT_DELAY,
+    SEARCH_HEDGE_MIN_DELAY,
+    SEARCH_HEDGE_MIN_SAMPLES,
+    SEARCH_HEDGE_PERCENTILE,
+    SEARCH_HEDGE_WINDOW,
+    SEARCH_HEDGE_WORKERS,
+    SEARCH_PROVIDERS,
+    SEARCH_WINDOWS,
+    SERPER_API_KEY,
+)
+from search_client import serper_client
+from tracing import annotate
+
+NEWS_FIELDS = ("title", "snippet", "link", "date", "source")
+
+# Age limits of Serper's time windows, applied to archived articles
+_WINDOW_AGES = {
+    "qdr:h": timedelta(hours=1),
+    "qdr:d": timedelta(days=1),
+    "qdr:w": timedelta(weeks=1),
+    "qdr:m": timedelta(days=31),
+    "qdr:y": timedelta(days=366),
+}
+
+# With SEARCH_CLIENT = "langchain": one wrapper per time window (tbs), e.g. "qdr:d" for the past day
+_searches: Dict[str, GoogleSerperAPIWrapper] = {}
+
+
+def _langchain_search(tbs: str) -> GoogleSerperAPIWrapper:
+    if tbs not in _searches:
+        _searches[tbs] = GoogleSerperAPIWrapper(api_key=SERPER_API_KEY, k=5, type="news", tbs=tbs)
+    return _searches[tbs]
+
+
+def _serper_news(query: str, tbs: str) -> Dict[str, Any]:
+    if SEARCH_CLIENT == "langchain":
+        return _langchain_search(tbs).results(query)
+    return serper_client.news(query, tbs=tbs)
+
+
+async def _aserper_news(query: str, tbs: str) -> Dict[str, Any]:
+    if SEARCH_CLIENT == "langchain":
+        return await _langchain_search(tbs).aresults(query)
+    return await serper_client.anews(query, tbs=tbs)
+
+
+async def in_executor(fn: Callable[..., Any], *args) -> Any:
+    """Runs a blocking call on the default executor, in the caller's context (trace span, cancel token)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, contextvars.copy_context().run, fn, *args)
+
+
+def normalize_item(item: Dict[str, Any]) -> Dict[str, str]:
+    """A news item with exactly the fields research uses, whatever the provider."""
+    return {field: str(item.get(field) or "") for field in NEWS_FIELDS}
+
+
+def stale_cache_key(query: str, tbs: str) -> str:
+    return f"search-stale:{tbs}|{query.strip().lower()}"
+
+
+class SerperProvider:
+    """Serper news search, drawing from the shared "serper" rate-limit bucket."""
+
+    name = "serper"
+    live = True
+
+    def __call__(self, query: str, tbs: str) -> List[Dict[str, str]]:
+        waited = time.perf_counter()
+        rate_limiter.wait("serper", cancel_token=current_token())
+        annotate(rate_limit_wait_ms=round((time.perf_counter() - waited) * 1000, 3))
+        return [normalize_item(item) for item in _serper_news(query, tbs).get("news", [])[:5]]
+
+    async def acall(self, query: str, tbs: str) -> List[Dict[str, str]]:
+        """`__call__` for async callers, over the event loop's pooled client."""
+        waited = time.perf_counter()
+        await in_executor(partial(rate_limiter.wait, "serper", cancel_token=current_token()))
+        annotate(rate_limit_wait_ms=round((time.perf_counter() - waited) * 1000, 3))
+        return [normalize_item(item) for item in (await _aserper_news(query, tbs)).get("news", [])[:5]]
+
+
+class StaleCacheProvider:
+    """
+    The last live results for the same query and window, kept for
+    SEARCH_STALE_TTL after the search cache has expired them, minus any that
+    have since aged out of the window.
+    """
+
+    name = "stale_cache"
+    live = False
+
+    @staticmethod
+    def store(query: str, tbs: str, items: List[Dict[str, str]], ttl: float):
+        """Keeps live results, with relative dates resolved against the time of the search."""
+        fetched_at = datetime.now()
+        entry = {
+            "fetched_at": fetched_at.isoformat(),
+            "items": [{**item, "date": absolute_source_date(item["date"], fetched_at)} for item in items],
+        }
+        get_backend().set(stale_cache_key(query, tbs), json.dumps(entry), ttl=ttl)
+
+    def __call__(self, query: str, tbs: str) -> List[Dict[str, str]]:
+        cached = get_backend().get(stale_cache_key(query, tbs))
+        if not cached:
+            return []
+        entry = json.loads(cached)
+        fetched_at = datetime.fromisoformat(entry["fetched_at"])
+        cutoff = datetime.now() - _WINDOW_AGES.get(tbs, _WINDOW_AGES["qdr:m"])
+        # Everything in a search older than the window is out of it too
+        if fetched_at < cutoff:
+            return []
+        items = []
+        for item in entry["items"]:
+            published = parse_source_date(item["date"], fetched_at)
+            if published is None or published >= cutoff:
+                items.append(item)
+        return items
+
+
+class ArchiveProvider:
+    """Sources of archived articles matching the query, from runs inside the time window."""
+
+    name = "archive"
+    live = False
+
+    def __init__(self, archive: ArticleArchive = article_archive):
+        self.archive = archive
+
+    def __call__(self, query: str, tbs: str) -> List[Dict[str, str]]:
+        cutoff = (datetime.now() - _WINDOW_AGES.get(tbs, _WINDOW_AGES["qdr:m"])).isoformat()
+        items: List[Dict[str, str]] = []
+        seen = set()
+        for hit in self.archive.search(query, limit=5):
+            if hit["created_at"] < cutoff:
+                continue
+            article = self.archive.get(hit["id"]) or {}
+            # Relative dates ("2 hours ago") were relative to the archived run
+            fetched_at = datetime.fromisoformat(hit["created_at"])
+            for source in article.get("research_sources", []):
+                if source.get("link") in seen:
+                    continue
+                seen.add(source.get("link"))
+                items.append(normalize_item({**source, "date": absolute_source_date(source.get("date"), fetched_at)}))
+        return items[:5]
+
+
+class CallableProvider:
+    """Any `search(query, tbs)` callable returning news items, e.g. fakes.FakeSearch."""
+
+    def __init__(self, name: str, search: Callable[..., List[Dict[str, Any]]], live: bool = True):
+        self.name = name
+        self.search = search
+        self.live = live
+
+    def __call__(self, query: str, tbs: str) -> List[Dict[str, str]]:
+        return [normalize_item(item) for item in self.search(query, tbs)[:5]]
+
+
+PROVIDERS: Dict[str, Callable[[], Any]] = {
+    "serper": SerperProvider,
+    "stale_cache": StaleCacheProvider,
+    "archive": ArchiveProvider,
+}
+
+
+def register_provider(name: str, factory: Callable[[], Any]):
+    """Makes a provider available by name in SEARCH_PROVIDERS."""
+    PROVIDERS[name] = factory
+
+
+def make_providers(names: Sequence[str] = SEARCH_PROVIDERS) -> List[Any]:
+    providers = []
+    for name in (name.strip() for name in names):
+        if not name or (name == "archive" and not ENABLE_ARCHIVE):
+            continue
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown search provider '{name}': use one of {', '.join(PROVIDERS)}")
+        providers.append(PROVIDERS[name]())
+    if not providers:
+        raise ValueError("SEARCH_PROVIDERS names no search provider")
+    return providers
+
+
+class LatencyTracker:
+    """Rolling window of a provider's recent successful call latencies."""
+
+    def __init__(self, window: int = SEARCH_HEDGE_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class HedgedSearch:
+    """
+    News search callable over `providers`, primary first, hedging slow or
+    failed searches with the next provider. Thread-safe; losing calls finish
+    in the background and still count towards the latency statistics.
+    """
+
+    def __init__(
+        self,
+        providers: Sequence[Any],
+        hedging: bool = ENABLE_SEARCH_HEDGING,
+        percentile: float = SEARCH_HEDGE_PERCENTILE,
+        min_samples: int = SEARCH_HEDGE_MIN_SAMPLES,
+        default_delay: float = SEARCH_HEDGE_DEFAULT_DELAY,
+        min_delay: float = SEARCH_HEDGE_MIN_DELAY,
+        workers: int = SEARCH_HEDGE_WORKERS,
+    ):
+        self.providers = list(providers)
+        self.hedging = hedging and len(self.providers) > 1
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.latency = {provider.name: LatencyTracker() for provider in self.providers}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search") if self.hedging else None
+        self._counts = {"searches": 0, "hedged": 0, "hedge_wins": 0, "failed": 0}
+        self._wins = {provider.name: 0 for provider in self.providers}
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary before hedging."""
+        primary = self.latency[self.providers[0].name]
+        if len(primary) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, primary.percentile(self.percentile))
+
+    def _timed(self, provider, query: str, tbs: str) -> List[Dict[str, str]]:
+        start = time.perf_counter()
+        items = provider(query, tbs)
+        self.latency[provider.name].record(time.perf_counter() - start)
+        return items
+
+    async def _atimed(self, provider, query: str, tbs: str) -> List[Dict[str, str]]:
+        start = time.perf_counter()
+        acall = getattr(provider, "acall", None)
+        items = await acall(query, tbs) if acall is not None else await in_executor(provider, query, tbs)
+        self.latency[provider.name].record(time.perf_counter() - start)
+        return items
+
+    def _providers(self, live_only: bool) -> List[Any]:
+        providers = [provider for provider in self.providers if provider.live] if live_only else self.providers
+        if not providers:
+            raise ValueError("SEARCH_PROVIDERS names no live search provider")
+        return providers
+
+    def _count(self, provider, launched: int):
+        with self._lock:
+            self._counts["searches"] += 1
+            self._counts["hedged"] += launched > 1
+            self._counts["hedge_wins"] += provider is not self.providers[0]
+            self._wins[provider.name] += 1
+
+    def search(self, query: str, tbs: str = SEARCH_WINDOWS[0], live_only: bool = False) -> Tuple[List[Dict[str, str]], Any]:
+        """
+        The first good answer for `query` and the provider that gave it.
+        With `live_only`, fallbacks are skipped, for callers that must see
+        current results (cache revalidation).
+        """
+        providers = self._providers(live_only)
+        if not self.hedging or len(providers) == 1:
+            provider = providers[0]
+            try:
+                items = self._timed(provider, query, tbs)
+            except Exception:
+                with self._lock:
+                    self._counts["failed"] += 1
+                raise
+            self._count(provider, 1)
+            annotate(search_provider=provider.name)
+            return items, provider
+
+        delay = self.hedge_delay()
+        pending = {}
+        errors = []
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            provider = providers[launched]
+            launched += 1
+            # Copy the context so provider calls annotate the caller's search span
+            future = self._pool.submit(contextvars.copy_context().run, self._timed, provider, query, tbs)
+            pending[future] = provider
+            return time.monotonic() + delay
+
+        next_hedge = launch()
+        while pending:
+            timeout = max(0.0, next_hedge - time.monotonic()) if launched < len(providers) else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    items = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if items or provider.live:
+                    self._count(provider, launched)
+                    annotate(search_provider=provider.name, hedged=launched > 1, hedge_delay_ms=round(delay * 1000, 1))
+                    return items, provider
+            # Hedge when the wait ran out, or straight away when a call ended without an answer
+            if launched < len(providers) and (done or time.monotonic() >= next_hedge):
+                next_hedge = launch()
+
+        with self._lock:
+            self._counts["failed"] += bool(errors)
+        if errors:
+            raise errors[0]
+        return [], providers[-1]
+
+    async def asearch(
+        self, query: str, tbs: str = SEARCH_WINDOWS[0], live_only: bool = False
+    ) -> Tuple[List[Dict[str, str]], Any]:
+        """
+        `search` for async callers. Providers with an `acall` (Serper, over
+        the pooled async client) are awaited; the others run on the default
+        executor.
+        """
+        providers = self._providers(live_only)
+        hedging = self.hedging and len(providers) > 1
+        loop = asyncio.get_running_loop()
+        delay = self.hedge_delay()
+        pending = {}
+        errors = []
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            provider = providers[launched]
+            launched += 1
+            pending[asyncio.ensure_future(self._atimed(provider, query, tbs))] = provider
+            return loop.time() + delay
+
+        next_hedge = launch()
+        while pending:
+            can_hedge = hedging and launched < len(providers)
+            timeout = max(0.0, next_hedge - loop.time()) if can_hedge else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                provider = pending.pop(task)
+                try:
+                    items = task.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if items or provider.live or not hedging:
+                    self._count(provider, launched)
+                    annotate(search_provider=provider.name, hedged=launched > 1, hedge_delay_ms=round(delay * 1000, 1))
+                    return items, provider
+            if can_hedge and (done or loop.time() >= next_hedge):
+                next_hedge = launch()
+
+        with self._lock:
+            self._counts["failed"] += bool(errors)
+        if errors:
+            raise errors[0]
+        return [], providers[-1]
+
+    def __call__(self, query: str, tbs: str = SEARCH_WINDOWS[0]) -> List[Dict[str, str]]:
+        return self.search(query, tbs)[0]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hedging counts, wins and recent latencies per provider."""
+        with self._lock:
+            report: Dict[str, Any] = {**self._counts, "hedge_delay_s": round(self.hedge_delay(), 4)}
+            wins = dict(self._wins)
+        report["providers"] = {}
+        for provider in self.providers:
+            tracker = self.latency[provider.name]
+            report["providers"][provider.name] = {
+                "wins": wins[provider.name],
+                "p50_s": round(tracker.percentile(0.5) or 0.0, 4),
+                "p95_s": round(tracker.percentile(0.95) or 0.0, 4),
+            }
+        return report
+
+
+hedged_search = HedgedSearch(make_providers())
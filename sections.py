@@ -0,0 +1,96 @@
+"""
+Section-level pipelining of writing, editing and fact-checking.
+
+The writer's output is streamed and cut into sections at "## " headings.
+Each finished section is handed to the editor (and optionally to the
+fact-checker once its edit is done) while the writer is still producing the
+next one, so end-to-end latency approaches the slowest stage instead of the
+sum of all stages. Results are collected in section order.
+"""
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from config import PIPELINE_WORKERS
+
+_SECTION_HEADING = re.compile(r"^## ", re.MULTILINE)
+
+
+class SectionSplitter:
+    """Cuts streamed markdown into sections, each starting at a "## " heading."""
+
+    def __init__(self):
+        self.text = ""
+        self._start = 0
+
+    def feed(self, chunk: str) -> List[str]:
+        """Adds streamed text and returns the sections it completed."""
+        self.text += chunk
+        sections = []
+        for match in _SECTION_HEADING.finditer(self.text, self._start + 1):
+            section = self.text[self._start:match.start()]
+            if section.strip():
+                sections.append(section)
+                self._start = match.start()
+        return sections
+
+    def close(self) -> List[str]:
+        """Returns the last section once the stream has ended."""
+        section = self.text[self._start:]
+        self._start = len(self.text)
+        return [section] if section.strip() else []
+
+
+def split_sections(text: str) -> List[str]:
+    """Cuts finished markdown into sections, as SectionSplitter does for a stream."""
+    splitter = SectionSplitter()
+    return splitter.feed(text) + splitter.close()
+
+
+class SectionPipeline:
+    """
+    Edits (and optionally fact-checks) sections concurrently as they arrive.
+    One pipeline serves one run at a time; `start` resets it for a new run.
+    """
+
+    def __init__(self, workers: int = PIPELINE_WORKERS):
+        self.workers = workers
+        self._edit_pool: Optional[ThreadPoolExecutor] = None
+        self._check_pool: Optional[ThreadPoolExecutor] = None
+        self.edits: List[Future] = []
+        self.checks: List[Future] = []
+
+    def start(self, edit: Callable[[int, str], Any], fact_check: Optional[Callable[[int, Any], Any]] = None):
+        self.shutdown()
+        self._edit = edit
+        self._fact_check = fact_check
+        self._edit_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="section-edit")
+        if fact_check is not None:
+            self._check_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="section-check")
+        self.edits, self.checks = [], []
+
+    def submit(self, section: str):
+        index = len(self.edits)
+        edit = self._edit_pool.submit(self._edit, index, section)
+        self.edits.append(edit)
+        if self._check_pool is not None:
+            # Waits on the edit from a separate pool, so it cannot starve editing
+            self.checks.append(self._check_pool.submit(lambda: self._fact_check(index, edit.result())))
+
+    @property
+    def fact_checking(self) -> bool:
+        return self._check_pool is not None
+
+    def edited(self) -> List[Any]:
+        """Edit results in section order; waits for outstanding edits."""
+        return [future.result() for future in self.edits]
+
+    def checked(self) -> List[Any]:
+        """Fact-check results in section order; waits for outstanding checks."""
+        return [future.result() for future in self.checks]
+
+    def shutdown(self):
+        for pool in (self._edit_pool, self._check_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._edit_pool = self._check_pool = None
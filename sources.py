@@ -0,0 +1,138 @@
+import hashlib
+import re
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from config import TITLE_SIMILARITY_THRESHOLD, TRACKING_PARAMS, TRACKING_PARAM_PREFIXES
+from tools import estimate_tokens, format_news_results
+
+_HOST_PREFIXES = ("www.", "m.", "amp.", "mobile.")
+_TITLE_SUFFIX = re.compile(r"\s+[-|–—]\s+[^-|–—]{2,40}$")
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalizes an article link so that copies of the same article compare equal:
+    lower-cased host without www./m./amp. prefixes or default ports, no
+    tracking parameters or fragment, sorted query string and no trailing slash.
+    """
+    if not url:
+        return ""
+    parts = urlsplit(url.strip())
+    if not parts.netloc:
+        return url.strip()
+
+    host = (parts.hostname or "").lower()
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS
+        and not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+    )
+    path = re.sub(r"/(amp/?)?$", "", parts.path) or "/"
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def source_id(canonical_url: str) -> str:
+    """Stable short ID for a source, derived from its canonical URL."""
+    return "S-" + hashlib.sha1(canonical_url.encode()).hexdigest()[:6]
+
+
+def _title_terms(title: str) -> set:
+    # Drop a trailing " - Publisher" so syndicated copies compare equal
+    title = _TITLE_SUFFIX.sub("", title or "")
+    return set(re.findall(r"\w+", title.lower()))
+
+
+def _similar_titles(a: set, b: set) -> bool:
+    union = a | b
+    return bool(union) and len(a & b) / len(union) >= TITLE_SIMILARITY_THRESHOLD
+
+
+def build_source_table(search_results: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Merges the news items of every query into one table of unique sources.
+
+    Items are deduplicated by canonical URL and then by near-identical title.
+    Each source keeps a stable ID (from its canonical URL), the link of the
+    first copy found, and the list of queries that found it.
+    Returns the table and statistics about what was merged.
+    """
+    table: List[Dict[str, Any]] = []
+    by_url: Dict[str, Dict[str, Any]] = {}
+    titles: List[Tuple[set, Dict[str, Any]]] = []
+    raw_items = url_duplicates = title_duplicates = 0
+
+    for sr in search_results:
+        for item in sr.get("items", []):
+            raw_items += 1
+            canonical = canonicalize_url(item.get("link", ""))
+            terms = _title_terms(item.get("title", ""))
+
+            existing = by_url.get(canonical) if canonical else None
+            if existing is not None:
+                url_duplicates += 1
+            else:
+                existing = next((source for other, source in titles if _similar_titles(terms, other)), None)
+                if existing is not None:
+                    title_duplicates += 1
+
+            if existing is not None:
+                if sr["query"] not in existing["queries"]:
+                    existing["queries"].append(sr["query"])
+                continue
+
+            # The canonical URL only identifies the source; citations keep the link as published
+            source = {
+                "id": source_id(canonical or item.get("title", "")),
+                "title": item.get("title", "No title"),
+                "link": item.get("link", ""),
+                "date": item.get("date", "No date"),
+                "snippet": item.get("snippet", "No summary"),
+                "source": item.get("source", ""),
+                "queries": [sr["query"]],
+            }
+            table.append(source)
+            if canonical:
+                by_url[canonical] = source
+            titles.append((terms, source))
+
+    stats = {
+        "raw_items": raw_items,
+        "unique_sources": len(table),
+        "url_duplicates": url_duplicates,
+        "title_duplicates": title_duplicates,
+    }
+    return table, stats
+
+
+def format_source_table(table: List[Dict[str, Any]]) -> str:
+    """Formats the source table for prompts; sources are cited by their IDs."""
+    if not table:
+        return "No recent news articles were found."
+    lines = []
+    for source in table:
+        publisher = f"{source['source']}, " if source.get("source") else ""
+        lines.append(
+            f"[{source['id']}] **{source['title']}** ({publisher}{source['date']})\n"
+            f"   Summary: {source['snippet']}\n"
+            f"   Link: {source['link']}\n"
+        )
+    return "\n".join(lines)
+
+
+def per_query_tokens(search_results: List[Dict[str, Any]]) -> int:
+    """Token count of the previous per-query prompt layout, used to report savings."""
+    formatted = ""
+    for sr in search_results:
+        formatted += f"\n\nQuery: {sr['query']}\n"
+        formatted += f"Results:\n{format_news_results(sr['query'], sr['items']) if sr['items'] else sr['results']}\n"
+        formatted += "-" * 50
+    return estimate_tokens(formatted)
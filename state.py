@@ -1,4 +1,6 @@
-from typing import TypedDict, Optional, List, Dict, Any
+from typing import Annotated, TypedDict, Optional, List, Dict, Any
+
+from variants import merge_variants
 
 class EnhancedAgentState(TypedDict):
     """
@@ -8,10 +10,13 @@ class EnhancedAgentState(TypedDict):
     
     # Input
     topic: str
+    search_queries: Optional[List[str]]  # queries planned ahead, e.g. by batch.py
     
     # Research phase
+    search_window: Optional[str]  # Serper time window (tbs) of the latest research attempt
     research_report: Optional[str]
-    research_sources: Optional[List[Dict[str, str]]]
+    research_sources: Optional[List[Dict[str, Any]]]  # unique sources with stable IDs
+    research_quality: Optional[Dict[str, Any]]  # quality signals and routing verdict (see quality.py)
     
     # Writing phase  
     blog_post: Optional[str]
@@ -25,6 +30,11 @@ class EnhancedAgentState(TypedDict):
     fact_check_report: Optional[str]
     verified_claims: Optional[List[Dict[str, Any]]]
     
+    # Variants (see variants.py)
+    variant: Optional[Dict[str, str]]  # the length and tone of one variant branch
+    variants: Annotated[Optional[Dict[str, Dict[str, Any]]], merge_variants]  # finished variants by name
+    
     # Metadata
     generation_timestamp: Optional[str]
-    agent_notes: Optional[Dict[str, str]]
\ No newline at end of file
+    agent_notes: Optional[Dict[str, str]]
+    run_metadata: Optional[Dict[str, Any]]  # per-stage statistics (search, deduplication, ...)
\ No newline at end of file
@@ -0,0 +1,85 @@
+import re
+
+import pytest
+
+from agents import EDITOR_PROMPT, FACT_CHECKER_PROMPT, edit_text, fact_checker_node
+from budget import PromptTooLarge, Section, fit_prompt
+from config import MAX_TOKENS
+from fakes import FakeLLM
+from tools import estimate_tokens
+
+_ARTICLE_PATTERNS = [
+    r"Original Article:\n(.*?)\n\nTopic:",
+    r"Article to fact-check:\n(.*?)\n\nResearch Sources:",
+    r"Article section to fact-check[^\n]*\n(.*?)\n\nResearch Sources:",
+]
+
+
+def echo_article(prompt: str) -> str:
+    """Answers editor and fact-checker prompts with the article they were given."""
+    for pattern in _ARTICLE_PATTERNS:
+        match = re.search(pattern, prompt, re.DOTALL)
+        if match:
+            return match.group(1)
+    return ""
+
+
+def make_draft(sections: int, paragraphs: int, words: int = 40) -> str:
+    parts = ["# A long article"]
+    for s in range(sections):
+        parts.append(f"## Section {s + 1}")
+        for p in range(paragraphs):
+            parts.append(" ".join(f"s{s}p{p}w{w}" for w in range(words)))
+    return "\n\n".join(parts)
+
+
+def paragraphs(text: str):
+    return [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+
+def test_whole_section_is_kept_and_research_gives_way():
+    draft = make_draft(4, 10)
+    research = make_draft(10, 20)
+    assert estimate_tokens(draft) + estimate_tokens(research) > MAX_TOKENS
+
+    prompt, report = fit_prompt(
+        "fact_checker",
+        FACT_CHECKER_PROMPT,
+        [
+            Section.from_markdown("edited_post", "draft", draft, whole=True),
+            Section.from_markdown("research_report", "research", research),
+        ],
+    )
+
+    assert estimate_tokens(prompt) <= MAX_TOKENS
+    assert all(paragraph in prompt for paragraph in paragraphs(draft))
+    assert [trim["section"] for trim in report["trimmed"]] == ["research_report"]
+
+
+def test_whole_section_over_budget_raises():
+    with pytest.raises(PromptTooLarge):
+        fit_prompt(
+            "editor",
+            EDITOR_PROMPT,
+            [Section.from_markdown("blog_post", "draft", make_draft(1, 500), whole=True)],
+            topic="t",
+        )
+
+
+def test_long_draft_rewrite_keeps_every_paragraph():
+    draft = make_draft(6, 40)
+    assert estimate_tokens(draft) > MAX_TOKENS
+
+    edit = edit_text(draft, "t", FakeLLM(responder=echo_article), mode="rewrite")
+
+    assert paragraphs(edit["text"]) == paragraphs(draft)
+    assert edit["metadata"]["section_rewrites"] == 7
+
+
+def test_long_draft_fact_check_keeps_every_paragraph():
+    draft = make_draft(6, 40)
+    state = {"topic": "t", "edited_post": draft, "research_report": make_draft(3, 10), "agent_notes": {}}
+
+    result = fact_checker_node(state, FakeLLM(responder=echo_article))
+
+    assert paragraphs(result["final_post"]) == paragraphs(draft)
@@ -0,0 +1,102 @@
+import pytest
+
+from config import ROUTE_PROBE_EVERY
+from fakes import FakeLLM, Latency
+from routing import ModelRouter, RouteStats
+
+TIERS = {
+    "fast": {"model": "fake-fast", "cost_per_1k_tokens": 0.0001},
+    "standard": {"model": "fake-standard", "cost_per_1k_tokens": 0.01},
+}
+
+
+def make_router(standard_latency: float, latency_budget: float = 0.05, cost_budget: float = float("inf")):
+    models = {
+        "fake-fast": FakeLLM(latency={"default": Latency(0.0)}, model="fake-fast"),
+        "fake-standard": FakeLLM(latency={"default": Latency(standard_latency)}, model="fake-standard"),
+    }
+    routes = {
+        "writer": {
+            "tier": "standard",
+            "temperature": None,
+            "latency_budget": latency_budget,
+            "cost_budget": cost_budget,
+            "fallback": "fast",
+        },
+    }
+    router = ModelRouter(
+        temperature=0.3,
+        routes=routes,
+        tiers=TIERS,
+        model_factory=lambda model, temperature: models[model],
+        # alpha 1: the average is the latest call, so one probe is enough to recover
+        stats=RouteStats(alpha=1.0),
+        rate_limiter=None,
+    )
+    return router, models
+
+
+def calls(model: FakeLLM) -> int:
+    return len(model.log.calls)
+
+
+def test_route_within_budget_stays_on_primary():
+    router, models = make_router(standard_latency=0.0)
+    for _ in range(ROUTE_PROBE_EVERY * 2):
+        router.for_step("writer").invoke("Write a post")
+    assert calls(models["fake-standard"]) == ROUTE_PROBE_EVERY * 2
+    assert calls(models["fake-fast"]) == 0
+
+
+def test_slow_primary_falls_back_to_faster_tier():
+    router, models = make_router(standard_latency=0.1, latency_budget=0.05)
+    router.for_step("writer").invoke("Write a post")
+    assert router.over_budget("writer", "standard")
+
+    for _ in range(ROUTE_PROBE_EVERY - 2):
+        router.for_step("writer").invoke("Write a post")
+    assert calls(models["fake-standard"]) == 1
+    assert calls(models["fake-fast"]) == ROUTE_PROBE_EVERY - 2
+
+
+def test_expensive_primary_falls_back_to_cheaper_tier():
+    router, models = make_router(standard_latency=0.0, latency_budget=10, cost_budget=0.00001)
+    router.for_step("writer").invoke("Write a post " * 50)
+    assert router.over_budget("writer", "standard")
+
+    router.for_step("writer").invoke("Write a post")
+    assert calls(models["fake-fast"]) == 1
+
+
+def test_probe_restores_primary_once_it_is_fast_again():
+    router, models = make_router(standard_latency=0.1, latency_budget=0.05)
+    for _ in range(ROUTE_PROBE_EVERY - 1):
+        router.for_step("writer").invoke("Write a post")
+    assert calls(models["fake-standard"]) == 1
+
+    # The primary recovers; the next probe sees it and routing returns to it
+    models["fake-standard"].latency = {"default": Latency(0.0)}
+    router.for_step("writer").invoke("Write a post")
+    assert calls(models["fake-standard"]) == 2
+    assert not router.over_budget("writer", "standard")
+
+    fast_calls = calls(models["fake-fast"])
+    for _ in range(3):
+        router.for_step("writer").invoke("Write a post")
+    assert calls(models["fake-standard"]) == 5
+    assert calls(models["fake-fast"]) == fast_calls
+
+
+def test_probes_keep_fallback_while_primary_stays_slow():
+    router, models = make_router(standard_latency=0.1, latency_budget=0.05)
+    for _ in range(ROUTE_PROBE_EVERY * 3):
+        router.for_step("writer").invoke("Write a post")
+    # The first call, then every ROUTE_PROBE_EVERY-th call as a probe
+    assert calls(models["fake-standard"]) == 1 + 3
+    assert router.over_budget("writer", "standard")
+
+
+def test_unknown_route_is_rejected():
+    router, _ = make_router(standard_latency=0.0)
+    with pytest.raises(KeyError):
+        router.for_step("nope")
@@ -1,38 +1,111 @@
-from langchain_community.utilities import GoogleSerperAPIWrapper
+import hashlib
+import json
+from typing import Dict, List
+
 from langchain_core.tools import Tool
-from config import SERPER_API_KEY
+from backends import get_backend
+from config import SEARCH_CACHE_TTL, SEARCH_PROVIDERS, SEARCH_STALE_TTL, SEARCH_WINDOWS
+from search_providers import StaleCacheProvider, hedged_search, in_executor
+from tracing import span
+
+
+def _search_cache_key(query: str, tbs: str) -> str:
+    return "search:" + hashlib.sha1(f"{tbs}|{query.strip().lower()}".encode()).hexdigest()
+
+
+def search_news(query: str, tbs: str = SEARCH_WINDOWS[0], live_only: bool = False) -> List[Dict[str, str]]:
+    """
+    Runs a news search over the time window `tbs` and returns news items
+    (at most 5) with a title, snippet, link, date and source.
+
+    Searches go to the providers in SEARCH_PROVIDERS, Serper first, with slow
+    or failed searches hedged by the next provider (see search_providers.py).
+    Live results are cached in the shared backend for SEARCH_CACHE_TTL
+    seconds, and kept for SEARCH_STALE_TTL as the "stale_cache" fallback.
+    With `live_only`, only live providers are asked (see pipeline.revalidate).
+    """
+    cache_key = _search_cache_key(query, tbs)
+    with span("cache.get", "cache", cache="search") as lookup:
+        cached = get_backend().get(cache_key)
+        lookup.set(hit=cached is not None)
+    if cached is not None:
+        return json.loads(cached)
+
+    news_items, provider = hedged_search.search(query, tbs, live_only=live_only)
+    # Fallback answers are not cached, so the next search asks the live provider again
+    if provider.live:
+        _store_results(query, tbs, news_items)
+    return news_items
+
+
+def _store_results(query: str, tbs: str, news_items: List[Dict[str, str]]):
+    get_backend().set(_search_cache_key(query, tbs), json.dumps(news_items), ttl=SEARCH_CACHE_TTL)
+    if news_items and "stale_cache" in SEARCH_PROVIDERS:
+        StaleCacheProvider.store(query, tbs, news_items, ttl=SEARCH_STALE_TTL)
+
+
+async def asearch_news(query: str, tbs: str = SEARCH_WINDOWS[0], live_only: bool = False) -> List[Dict[str, str]]:
+    """
+    `search_news` for async callers, with the same cache, providers and
+    hedging. Serper is called over the event loop's pooled client
+    (SerperClient.anews, or the LangChain wrapper's `aresults`); the shared
+    cache, rate limiter and providers without an async call run on the
+    default executor.
+    """
+    cache_key = _search_cache_key(query, tbs)
+    with span("cache.get", "cache", cache="search") as lookup:
+        cached = await in_executor(get_backend().get, cache_key)
+        lookup.set(hit=cached is not None)
+    if cached is not None:
+        return json.loads(cached)
+
+    news_items, provider = await hedged_search.asearch(query, tbs, live_only=live_only)
+    if provider.live:
+        await in_executor(_store_results, query, tbs, news_items)
+    return news_items
+
+
+def format_news_results(query: str, news_items: List[Dict[str, str]]) -> str:
+    """
+    Formats raw news items into the numbered text block used in prompts.
+    """
+    if not news_items:
+        return f"No recent news articles found for query: '{query}'"
+
+    formatted_results = []
+    for i, item in enumerate(news_items, start=1):
+        title = item.get("title", "No title")
+        snippet = item.get("snippet", "No summary")
+        link = item.get("link", "No URL")
+        date = item.get("date", "No date")
+        formatted_results.append(
+            f"{i}. **{title}**\n"
+            f"   Date: {date}\n"
+            f"   Summary: {snippet}\n"
+            f"   Link: {link}\n"
+        )
+
+    return "\n".join(formatted_results)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for Gemini prompts (about 4 characters per token).
+    """
+    return (len(text) + 3) // 4
+
 
 def get_news_search_tool() -> Tool:
     """
     Creates and returns a tool for searching recent news.
     """
-    search = GoogleSerperAPIWrapper(api_key=SERPER_API_KEY, k=5, type="news", tbs="qdr:d")
 
     def news_search_tool_func(query: str) -> str:
         """
         Performs a news search and formats the results.
         """
         try:
-            results = search.results(query)
-            news_items = results.get("news", [])[:5]
-
-            if not news_items:
-                return f"No recent news articles found for query: '{query}'"
-
-            formatted_results = []
-            for i, item in enumerate(news_items, start=1):
-                title = item.get("title", "No title")
-                snippet = item.get("snippet", "No summary")
-                link = item.get("link", "No URL")
-                date = item.get("date", "No date")
-                formatted_results.append(
-                    f"{i}. **{title}**\n"
-                    f"   Date: {date}\n"
-                    f"   Summary: {snippet}\n"
-                    f"   Link: {link}\n"
-                )
-
-            return "\n".join(formatted_results)
+            return format_news_results(query, search_news(query))
         except Exception as e:
             return f"Error searching for '{query}': {str(e)}"
 
@@ -42,4 +115,4 @@ def get_news_search_tool() -> Tool:
         description="Search for the most recent news (past 24 hours) on a topic. Returns titles, summaries, dates, and links."
     )
 
-news_search_tool = get_news_search_tool()
\ No newline at end of file
+news_search_tool = get_news_search_tool()
@@ -0,0 +1,513 @@
+"""
+Span-level tracing of graph runs.
+
+A run is traced when the caller (the Streamlit session, an API request, a
+batch topic) starts a trace for it with `tracer.start_trace` and passes it to
+`create_enhanced_graph` / `cached_generation`. The trace has a root span for
+the run and child spans for each node, each LLM call, each news search and
+each cache lookup, carrying attributes such as prompt size, model tier and
+result count, so a slow run shows whether the time went to Gemini, Serper,
+the cache or the UI.
+
+Sampling keeps the overhead low: only TRACE_SAMPLE_RATE of the runs are
+traced, and the others are not instrumented at all. Finished traces are
+exported on a background thread, either as JSON lines (TRACE_PATH) or as
+OTLP/HTTP JSON to a collector (TRACE_OTLP_ENDPOINT). Summarize a trace file with:
+    python tracing.py summary traces/traces.jsonl
+"""
+import argparse
+import contextvars
+import json
+import os
+import queue
+import random
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import httpx
+
+from config import (
+    TRACE_EXPORT_BATCH,
+    TRACE_EXPORT_QUEUE,
+    TRACE_EXPORT_TIMEOUT,
+    TRACE_EXPORTER,
+    TRACE_OTLP_ENDPOINT,
+    TRACE_PATH,
+    TRACE_SAMPLE_RATE,
+    TRACE_SERVICE_NAME,
+)
+
+# The span that work on this thread (or task) belongs to
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    def __init__(self, trace: "Trace", name: str, kind: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        # Under the trace lock, so an export never copies attributes mid-update
+        with self.trace._lock:
+            self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end_ns is None else round((self.end_ns - self.start_ns) / 1e6, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": dict(self.attributes),
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is being traced."""
+
+    def set(self, **attributes):
+        pass
+
+    def end(self, error: Optional[BaseException] = None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans of one run, exported when the run finishes."""
+
+    def __init__(self, tracer: "Tracer", name: str = "run", attributes: Optional[Dict[str, Any]] = None):
+        self.tracer = tracer
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(self, name, "run", None, dict(attributes or {}))
+        self.spans: List[Span] = [self.root]
+        self._open_nodes: List[Span] = []
+        self._lock = threading.Lock()
+
+    def current(self) -> Span:
+        """
+        The span new spans are children of: the span active on this thread,
+        else the innermost running node (for work on the node's own worker
+        threads), else the root.
+        """
+        span = _current_span.get()
+        if span is not None and span.trace is self:
+            return span
+        with self._lock:
+            return self._open_nodes[-1] if self._open_nodes else self.root
+
+    def start_span(self, name: str, kind: str = "internal", **attributes) -> Span:
+        """Starts a child of the current span; the caller ends it."""
+        span = Span(self, name, kind, self.current().span_id, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes) -> Iterator[Span]:
+        """Times the block as a child of the current span, and makes it the current span."""
+        span = self.start_span(name, kind, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def wrap(self, name: str, node: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """Returns `node` recording a span per call."""
+
+        def traced_node(state):
+            with self.span(name, "node") as span:
+                with self._lock:
+                    self._open_nodes.append(span)
+                try:
+                    output = node(state)
+                finally:
+                    with self._lock:
+                        self._open_nodes.remove(span)
+                span.set(**_output_attributes(output or {}))
+                return output
+
+        return traced_node
+
+    def finish(self, error: Optional[BaseException] = None):
+        """Ends the run and queues the trace for export. A failed node fails the run."""
+        if self.root.end_ns is not None:
+            return
+        if error is None:
+            failed = next((s for s in self.spans if s.kind == "node" and s.error), None)
+            if failed is not None:
+                self.root.error = failed.error
+        self.root.end(error)
+        self.tracer.submit(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Copies every span, attributes included, while no span can annotate itself
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+            attributes = dict(self.root.attributes)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": datetime.fromtimestamp(self.root.start_ns / 1e9).isoformat(),
+            "duration_ms": self.root.duration_ms,
+            "status": "error" if self.root.error else "ok",
+            "attributes": attributes,
+            "spans": spans,
+        }
+
+
+def _output_attributes(output: Dict[str, Any]) -> Dict[str, Any]:
+    attributes: Dict[str, Any] = {"output_keys": sorted(output)}
+    if output.get("research_sources") is not None:
+        attributes["sources"] = len(output["research_sources"])
+    if output.get("research_quality"):
+        attributes["verdict"] = output["research_quality"]["verdict"]
+    if output.get("search_window"):
+        attributes["search_window"] = output["search_window"]
+    return attributes
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", trace: Optional[Trace] = None, **attributes) -> Iterator[Any]:
+    """
+    Times the block as a span of `trace`, or of the trace active on this
+    thread; does nothing (yielding a no-op span) when neither exists.
+    """
+    if trace is None:
+        current = _current_span.get()
+        trace = current.trace if current is not None else None
+    if trace is None:
+        yield NOOP_SPAN
+        return
+    with trace.span(name, kind, **attributes) as active:
+        yield active
+
+
+def annotate(**attributes):
+    """Adds attributes to the span active on this thread, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def traced_consumer(items: Iterable[Any], trace: Optional[Trace], name: str = "render") -> Iterator[Any]:
+    """
+    Yields from `items`, recording the time the consumer spends on each item
+    (e.g. the UI rendering a node's output) as a "ui" span.
+    """
+    for item in items:
+        if trace is None:
+            yield item
+            continue
+        span = trace.start_span(name, "ui", node=next(iter(item), None) if isinstance(item, dict) else None)
+        try:
+            yield item
+        finally:
+            span.end()
+
+
+class TracedLLM:
+    """Chat model (or router) recording a span per call."""
+
+    def __init__(self, llm, trace: Trace, route: Optional[str] = None):
+        self.llm = llm
+        self.trace = trace
+        self.route = route
+
+    def for_step(self, route: str) -> "TracedLLM":
+        for_step = getattr(self.llm, "for_step", None)
+        if for_step is None:
+            return self
+        return TracedLLM(for_step(route), self.trace, route)
+
+    def invoke(self, prompt, **kwargs):
+        with self.trace.span("llm.invoke", "llm", route=self.route, prompt_chars=len(str(prompt))) as span:
+            response = self.llm.invoke(prompt, **kwargs)
+            span.set(response_chars=len(str(getattr(response, "content", response))))
+            return response
+
+    def stream(self, prompt, **kwargs):
+        from routing import stream_chunks  # routing annotates spans, so it imports this module
+
+        span = self.trace.start_span("llm.stream", "llm", route=self.route, prompt_chars=len(str(prompt)))
+        chunks = stream_chunks(self.llm, prompt, **kwargs)
+        count, chars = 0, 0
+        try:
+            while True:
+                # The span is current only while the model is producing, not while the caller consumes
+                token = _current_span.set(span)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    _current_span.reset(token)
+                if count == 0:
+                    span.set(first_chunk_ms=round((time.time_ns() - span.start_ns) / 1e6, 3))
+                count += 1
+                chars += len(str(getattr(chunk, "content", chunk)))
+                yield chunk
+        except BaseException as e:
+            span.end(e)
+            raise
+        finally:
+            span.set(chunks=count, response_chars=chars)
+            span.end()
+
+
+class TracedSearch:
+    """News search callable recording a span per query."""
+
+    def __init__(self, search, trace: Trace):
+        self.search = search
+        self.trace = trace
+
+    def __call__(self, query: str, **options):
+        with self.trace.span("search", "search", query=query, tbs=options.get("tbs")) as span:
+            items = self.search(query, **options)
+            span.set(result_count=len(items))
+            return items
+
+
+class JsonFileExporter:
+    """Appends each trace as one JSON line to `path`."""
+
+    def __init__(self, path: str = TRACE_PATH):
+        self.path = path
+
+    def export(self, traces: List[Dict[str, Any]]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as f:
+            for trace in traces:
+                f.write(json.dumps(trace, default=str) + "\n")
+
+
+_OTLP_KINDS = {"run": 2, "llm": 3, "search": 3}  # SERVER and CLIENT; everything else is INTERNAL (1)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(traces: List[Dict[str, Any]], service_name: str = TRACE_SERVICE_NAME) -> Dict[str, Any]:
+    """Converts exported traces into an OTLP/HTTP JSON `ExportTraceServiceRequest`."""
+    spans = []
+    for trace in traces:
+        for span in trace["spans"]:
+            attributes = {**span["attributes"], "newsgen.kind": span["kind"]}
+            spans.append({
+                "traceId": trace["trace_id"],
+                "spanId": span["span_id"],
+                "parentSpanId": span["parent_id"] or "",
+                "name": span["name"],
+                "kind": _OTLP_KINDS.get(span["kind"], 1),
+                "startTimeUnixNano": str(span["start_ns"]),
+                "endTimeUnixNano": str(span["end_ns"] or span["start_ns"]),
+                "attributes": [
+                    {"key": key, "value": _otlp_value(value)}
+                    for key, value in attributes.items() if value is not None
+                ],
+                "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+            })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "newsgen.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+class OTLPExporter:
+    """Sends traces to an OTLP/HTTP collector as JSON."""
+
+    def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT, timeout: float = TRACE_EXPORT_TIMEOUT):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._client: Optional[httpx.Client] = None
+
+    def export(self, traces: List[Dict[str, Any]]):
+        if self._client is None:
+            self._client = httpx.Client(timeout=self.timeout)
+        self._client.post(self.endpoint, json=to_otlp(traces)).raise_for_status()
+
+
+def make_exporter(kind: str = TRACE_EXPORTER):
+    """The exporter configured by TRACE_EXPORTER, or None when tracing is off."""
+    if kind == "file":
+        return JsonFileExporter()
+    if kind == "otlp":
+        return OTLPExporter()
+    if kind:
+        raise ValueError(f"Unknown trace exporter '{kind}' (expected 'file' or 'otlp')")
+    return None
+
+
+class Tracer:
+    """
+    Samples runs for tracing and exports finished traces in batches on a
+    background thread. When the export queue is full, traces are dropped
+    rather than slowing the runs down.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = TRACE_SAMPLE_RATE, queue_size: int = TRACE_EXPORT_QUEUE):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start_trace(self, name: str = "run", **attributes) -> Optional[Trace]:
+        """A new trace for a run, or None when tracing is off or the run is not sampled."""
+        if self.exporter is None or random.random() >= self.sample_rate:
+            return None
+        return Trace(self, name, attributes)
+
+    @contextmanager
+    def trace(self, name: str = "run", **attributes) -> Iterator[Optional[Trace]]:
+        """Starts a trace (None if the run is not sampled) and finishes it when the block exits."""
+        trace = self.start_trace(name, **attributes)
+        try:
+            yield trace
+        except BaseException as e:
+            if trace is not None:
+                trace.finish(e)
+            raise
+        finally:
+            if trace is not None:
+                trace.finish()
+
+    def submit(self, trace: Trace):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._export_loop, daemon=True, name="trace-export")
+                self._worker.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _export_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < TRACE_EXPORT_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.exporter.export([trace.to_dict() for trace in batch])
+                self.exported += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"Trace export error: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout: float = TRACE_EXPORT_TIMEOUT) -> bool:
+        """Waits until queued traces are exported; False if that takes longer than `timeout`."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+tracer = Tracer(make_exporter())
+
+
+def summarize(traces: List[Dict[str, Any]], slowest: int = 5) -> Dict[str, Any]:
+    """Run durations and, per span kind, where the time of the slowest runs went."""
+    durations = sorted(t["duration_ms"] for t in traces if t["duration_ms"] is not None)
+
+    def breakdown(trace: Dict[str, Any]) -> Dict[str, Any]:
+        kinds: Dict[str, Dict[str, float]] = {}
+        for span in trace["spans"]:
+            if span["kind"] == "run" or span["duration_ms"] is None:
+                continue
+            stats = kinds.setdefault(span["kind"], {"spans": 0, "total_ms": 0.0})
+            stats["spans"] += 1
+            stats["total_ms"] = round(stats["total_ms"] + span["duration_ms"], 3)
+        return {
+            "trace_id": trace["trace_id"],
+            "name": trace["name"],
+            "duration_ms": trace["duration_ms"],
+            "status": trace["status"],
+            "attributes": trace["attributes"],
+            "by_kind": kinds,
+        }
+
+    ranked = sorted(traces, key=lambda t: t["duration_ms"] or 0, reverse=True)
+    return {
+        "traces": len(traces),
+        "errors": sum(1 for t in traces if t["status"] == "error"),
+        "p50_ms": statistics.median(durations) if durations else None,
+        "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))] if durations else None,
+        "slowest": [breakdown(trace) for trace in ranked[:slowest]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect exported traces.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary = subparsers.add_parser("summary", help="run durations and where the slowest runs spent their time")
+    summary.add_argument("path", nargs="?", default=TRACE_PATH)
+    summary.add_argument("--slowest", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        traces = [json.loads(line) for line in f if line.strip()]
+    print(json.dumps(summarize(traces, args.slowest), indent=2))
+
+
+if __name__ == "__main__":
+    main()
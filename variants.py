@@ -0,0 +1,84 @@
+"""
+Several versions of one article from a single research run.
+
+A variant is a target length and tone, named "short", "formal" or
+"long:executive" (see ARTICLE_LENGTHS and ARTICLE_TONES). When a run asks
+for variants, the graph researches the topic once and then fans out one
+`variant` branch per variant, each running the writer, editor and
+fact-checker with the variant's instructions. The branches run in parallel,
+so N versions cost one research phase plus the slowest writing chain instead
+of N full runs. Each finished branch is merged into the state's `variants`.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.prompts import PromptTemplate
+
+from config import ARTICLE_LENGTHS, ARTICLE_TONES, DEFAULT_ARTICLE_LENGTH, DEFAULT_ARTICLE_TONE, MAX_ARTICLE_VARIANTS
+
+_VARIANT_BLOCK = """
+This version of the article has a target length and tone. Keep to them; they take precedence over
+any other length or tone guidance above:
+{variant_instructions}
+"""
+
+
+def parse_variant(name: str) -> Dict[str, str]:
+    """A variant from its name: a length, a tone, or "length:tone"."""
+    length, tone = DEFAULT_ARTICLE_LENGTH, DEFAULT_ARTICLE_TONE
+    for part in name.strip().lower().split(":"):
+        part = part.strip()
+        if part in ARTICLE_LENGTHS:
+            length = part
+        elif part in ARTICLE_TONES:
+            tone = part
+        else:
+            raise ValueError(
+                f"Unknown article variant '{name}': use a length ({', '.join(ARTICLE_LENGTHS)}), "
+                f"a tone ({', '.join(ARTICLE_TONES)}) or 'length:tone'"
+            )
+    return {"name": name.strip().lower(), "length": length, "tone": tone}
+
+
+def parse_variants(names: Optional[Iterable[str]]) -> List[Dict[str, str]]:
+    """
+    Variants from their names, without duplicates. An empty list means a
+    single article without variants.
+    """
+    variants: Dict[str, Dict[str, str]] = {}
+    for name in names or []:
+        if not isinstance(name, str):
+            raise ValueError(f"Article variants are given by name, e.g. \"short\" or \"long:formal\", got {name!r}")
+        variant = parse_variant(name)
+        variants.setdefault(variant["name"], variant)
+    if len(variants) > MAX_ARTICLE_VARIANTS:
+        raise ValueError(f"At most {MAX_ARTICLE_VARIANTS} article variants per run, got {len(variants)}")
+    return list(variants.values())
+
+
+def variant_instructions(variant: Dict[str, str]) -> str:
+    return (
+        f"- Length: {ARTICLE_LENGTHS[variant['length']]}\n"
+        f"- Tone: {ARTICLE_TONES[variant['tone']]}"
+    )
+
+
+def for_variant(
+    template: PromptTemplate, variant: Optional[Dict[str, str]]
+) -> Tuple[PromptTemplate, Dict[str, str]]:
+    """
+    `template` with the variant's instructions appended, and the field that
+    fills them in. Without a variant, the template is returned unchanged.
+    """
+    if not variant:
+        return template, {}
+    return (
+        PromptTemplate.from_template(template.template + _VARIANT_BLOCK),
+        {"variant_instructions": variant_instructions(variant)},
+    )
+
+
+def merge_variants(
+    current: Optional[Dict[str, Dict[str, Any]]], update: Optional[Dict[str, Dict[str, Any]]]
+) -> Dict[str, Dict[str, Any]]:
+    """State reducer collecting the output of the parallel variant branches."""
+    return {**(current or {}), **(update or {})}